@@ -0,0 +1,170 @@
+"""
+Autor: Raul Perez
+Comparacion de tiempos entre la clase Matriz con listas anidadas (la
+version original, copiada abajo como MatrizListas) y la clase Matriz con
+NumPy de raul_perez_1.py, y entre los almacenamientos que escoge Matriz
+(constante, diagonal, dispersa) y guardar todo como denso
+
+Uso: python benchmark_matriz.py [n]   (por default n = 500)
+"""
+
+import contextlib
+import io
+import random
+import sys
+from time import perf_counter
+import numpy as np
+
+# raul_perez_1 imprime sus ejemplos al importarse
+with contextlib.redirect_stdout(io.StringIO()):
+    from raul_perez_1 import Densa, Matriz
+
+
+class MatrizListas:
+    """
+    La clase Matriz original, con listas anidadas, solo para comparar
+    """
+
+    def __init__(self, n=1, m=1, llenado='ceros'):
+        self.matriz = []
+        self.n = n # filas
+        self.m = m # columnas
+        self.llenado = llenado
+        self.llenar()
+
+    def llenar(self):
+        if self.llenado == 'unos':
+            self.matriz = [ [1 for i in range(self.m)] for j in range(self.n) ]
+        elif self.llenado == 'diag':
+            for i in range(self.n):
+                self.matriz.append([])
+                for j in range(self.m):
+                    self.matriz[i].append( 0 if i!=j else 1 )
+        else:
+            self.matriz = [ [0 for i in range(self.m)] for j in range(self.n) ]
+
+    def __add__(self, matriz_b):
+        matriz_r = MatrizListas(self.n, self.m)
+        matriz_r.matriz = [ [self.matriz[i][j]+matriz_b.matriz[i][j] for i in range(self.n)] for j in range(self.m) ]
+        return matriz_r
+
+    def __mul__(self, matriz_b):
+        matriz_r = MatrizListas(self.n, matriz_b.m)
+        for i in range(self.n):
+            matriz_r.matriz[i] = [ [ sum( [ self.matriz[i][k] * matriz_b.matriz[k][j] for k in range(self.m) ] ) ] for j in range(matriz_b.m) ]
+        return matriz_r
+
+    def __rmul__(self, escalar):
+        matriz_r = MatrizListas(self.n, self.m)
+        matriz_r.matriz = [ [ escalar*self.matriz[i][j] for i in range(self.n) ] for j in range(self.m) ]
+        return matriz_r
+
+    def quitarFila(self, indice):
+        del self.matriz[indice]
+        self.n -= 1
+
+    def quitarColumna(self, indice):
+        for i in range(0, self.n):
+            del self.matriz[i][indice]
+        self.m -= 1
+
+
+def mide(funcion, preparacion=None, repeticiones=3):
+    """
+    Mejor tiempo en segundos de varias llamadas a funcion
+    @param preparacion: Funcion que devuelve los argumentos de cada
+                        llamada, su tiempo no se cuenta
+    """
+    mejor = float('inf')
+    for _ in range(repeticiones):
+        argumentos = preparacion() if preparacion is not None else ()
+        inicio = perf_counter()
+        funcion(*argumentos)
+        mejor = min(mejor, perf_counter() - inicio)
+    return mejor
+
+
+def aleatoria(clase, n, semilla):
+    """
+    Matriz de n x n con enteros aleatorios entre -9 y 9
+    """
+    generador = random.Random(semilla)
+    valores = [[generador.randint(-9, 9) for _ in range(n)] for _ in range(n)]
+    if clase is Matriz:
+        return Matriz.desde_arreglo(np.array(valores, dtype=np.int64))
+    matriz = MatrizListas(n, n)
+    matriz.matriz = valores
+    return matriz
+
+
+def compara(n=500):
+    """
+    Imprime el tiempo de cada operacion con las dos clases
+    """
+    print("{:<16}{:>14}{:>14}{:>10}".format('operacion (n={})'.format(n),
+                                            'listas (s)', 'numpy (s)',
+                                            'veces'))
+    for clase in (MatrizListas, Matriz):
+        a, b = aleatoria(clase, n, 1), aleatoria(clase, n, 2)
+        copia = lambda: (aleatoria(clase, n, 3),)
+        pruebas = [('diag', lambda: clase(n, n, 'diag'), None),
+                   ('suma', lambda: a + b, None),
+                   ('escalar', lambda: 3 * a, None),
+                   ('producto', lambda: a * b, None),
+                   ('quitarFila', lambda c: c.quitarFila(0), copia),
+                   ('quitarFila/2', lambda c: c.quitarFila(n // 2), copia),
+                   ('quitarColumna', lambda c: c.quitarColumna(0), copia),
+                   ('quitarColumna/2', lambda c: c.quitarColumna(n // 2),
+                    copia)]
+        tiempos = {nombre: mide(funcion, preparacion,
+                                1 if clase is MatrizListas and
+                                nombre == 'producto' else 3)
+                   for (nombre, funcion, preparacion) in pruebas}
+        if clase is MatrizListas:
+            tiempos_listas = tiempos
+    for (nombre, tiempo) in tiempos.items():
+        print("{:<16}{:>14.5f}{:>14.5f}{:>10.1f}".format(
+            nombre, tiempos_listas[nombre], tiempo,
+            tiempos_listas[nombre] / tiempo))
+
+
+def densa(matriz):
+    """
+    La misma matriz pero con almacenamiento denso
+    """
+    return Matriz.desde_almacenamiento(Densa(matriz.datos.densa()))
+
+
+def compara_almacenamientos(n=2000, densidad=0.002):
+    """
+    Imprime el tiempo de algunas operaciones con el almacenamiento que
+    escoge Matriz y con todo denso
+    """
+    generador = np.random.default_rng(0)
+    valores = generador.integers(1, 10, (n, n))
+    dispersa = Matriz.desde_arreglo(
+        valores * (generador.random((n, n)) < densidad))
+    llena = Matriz.desde_arreglo(valores)
+    diagonal, unos = Matriz(n, n, 'diag'), Matriz(n, n, 'unos')
+    pruebas = [('diag * densa', diagonal, llena, lambda a, b: a * b),
+               ('dispersa * densa', dispersa, llena, lambda a, b: a * b),
+               ('unos * densa', unos, llena, lambda a, b: a * b),
+               ('diag + diag', diagonal, diagonal, lambda a, b: a + b),
+               ('dispersa + dispersa', dispersa, dispersa,
+                lambda a, b: a + b),
+               ('escalar * diag', diagonal, None, lambda a, b: 3 * a)]
+    print("\n{:<22}{:>14}{:>14}{:>10}".format(
+        'operacion (n={})'.format(n), 'densa (s)', 'auto (s)', 'veces'))
+    for (nombre, a, b, operacion) in pruebas:
+        a_densa = densa(a)
+        b_densa = densa(b) if b is not None else None
+        t_densa = mide(lambda: operacion(a_densa, b_densa))
+        t_auto = mide(lambda: operacion(a, b))
+        print("{:<22}{:>14.5f}{:>14.5f}{:>10.1f}".format(
+            nombre, t_densa, t_auto, t_densa / t_auto))
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    compara(n)
+    compara_almacenamientos(4 * n)
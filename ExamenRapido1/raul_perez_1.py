@@ -85,14 +85,244 @@ print(lista_div)
 # >>> print(d)
 # {1:5, 'a':3, 13:1, 'hola':1}
 
-def histograma(lista, imprime=False):
-    lista_dic = {elemento:lista.count(elemento) for elemento in lista} 
-    
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+import os
+import zlib
+import numpy as np
+
+def trozos(iterable, tamano):
+    """
+    Parte cualquier iterable en listas de a lo mas `tamano` elementos
+    """
+    iterador = iter(iterable)
+    trozo = list(islice(iterador, tamano))
+    while trozo:
+        yield trozo
+        trozo = list(islice(iterador, tamano))
+
+def combina_histogramas(parciales):
+    """
+    Suma conteos parciales (de varios trozos o trabajadores). Las llaves
+    quedan en el orden en que aparecieron por primera vez
+    """
+    total = Counter()
+    for parcial in parciales:
+        total.update(parcial)
+    return total
+
+def imprime_histograma(conteo, total, ancho=60):
+    """
+    Una barra de asteriscos por llave. Si algun conteo pasa de `ancho`
+    las barras se escalan para que la mas larga mida `ancho`
+    """
+    maximo = max(conteo.values(), default=0)
+    escala = ancho / maximo if maximo > ancho else 1
+    for llave, valor in conteo.items():
+        asteriscos = '*'*int(round(valor*escala))
+        porcentaje = int(valor/total*100)
+        print("{}\t{}\t({} -> {})".format(llave, asteriscos, valor, porcentaje))
+
+class MisraGries:
+    """
+    Resumen de Misra-Gries para los elementos frecuentes con memoria
+    acotada: guarda a lo mas k contadores. Todo elemento que aparece mas
+    de n/(k+1) veces queda entre los candidatos, y cada conteo guardado es
+    menor que el real por a lo mas n/(k+1)
+    """
+
+    def __init__(self, k=100):
+        self.k = k
+        self.contadores = {}
+        self.n = 0
+
+    def actualiza(self, iterable):
+        contadores, k = self.contadores, self.k
+        for elemento in iterable:
+            self.n += 1
+            if elemento in contadores:
+                contadores[elemento] += 1
+            elif len(contadores) < k:
+                contadores[elemento] = 1
+            else:
+                for llave in list(contadores):
+                    contadores[llave] -= 1
+                    if contadores[llave] == 0:
+                        del contadores[llave]
+        return self
+
+    def combina(self, otro):
+        """
+        Junta dos resumenes con el mismo k (cada uno de un trozo del flujo)
+        sin perder las garantias
+        """
+        suma = Counter(self.contadores)
+        suma.update(otro.contadores)
+        if len(suma) > self.k:
+            corte = sorted(suma.values(), reverse=True)[self.k]
+            suma = {llave: valor - corte for llave, valor in suma.items()
+                    if valor > corte}
+        resultado = MisraGries(self.k)
+        resultado.contadores = dict(suma)
+        resultado.n = self.n + otro.n
+        return resultado
+
+class CountMin:
+    """
+    Bosquejo Count-Min: una tabla de profundidad x ancho contadores. La
+    estimacion de un conteo nunca es menor que el real y, con probabilidad
+    1 - exp(-profundidad), lo pasa por a lo mas e * n / ancho. Se usa un
+    hash estable (crc32 de repr) para poder combinar bosquejos de
+    distintos procesos
+    """
+    PRIMO = 2 ** 61 - 1
+
+    def __init__(self, ancho=2048, profundidad=5, semilla=0):
+        generador = np.random.default_rng(semilla)
+        self.ancho = ancho
+        self.semilla = semilla
+        self.a = generador.integers(1, self.PRIMO, profundidad).tolist()
+        self.b = generador.integers(0, self.PRIMO, profundidad).tolist()
+        self.tabla = np.zeros((profundidad, ancho), dtype=np.int64)
+        self.n = 0
+
+    def columnas(self, elemento):
+        h = zlib.crc32(repr(elemento).encode())
+        return [(a * h + b) % self.PRIMO % self.ancho
+                for a, b in zip(self.a, self.b)]
+
+    def actualiza(self, iterable, tamano=100000):
+        for trozo in trozos(iterable, tamano):
+            conteo = Counter(trozo)
+            cuantos = np.fromiter(conteo.values(), dtype=np.int64,
+                                  count=len(conteo))
+            columnas = np.array([self.columnas(e) for e in conteo]).T
+            for fila in range(len(self.a)):
+                self.tabla[fila] += np.bincount(columnas[fila],
+                                                weights=cuantos,
+                                                minlength=self.ancho
+                                                ).astype(np.int64)
+            self.n += len(trozo)
+        return self
+
+    def estima(self, elemento):
+        filas = range(len(self.a))
+        return int(min(self.tabla[filas, self.columnas(elemento)]))
+
+    def combina(self, otro):
+        """
+        Suma dos bosquejos creados con los mismos parametros
+        """
+        resultado = CountMin(self.ancho, len(self.a), self.semilla)
+        resultado.tabla = self.tabla + otro.tabla
+        resultado.n = self.n + otro.n
+        return resultado
+
+
+MODOS_RESUMEN = ('misragries', 'countmin')
+
+def resume(iterable, max_elementos, modo='misragries', tamano=100000):
+    """
+    Resumen con memoria acotada de un flujo, en una sola pasada. Los
+    candidatos a frecuentes siempre salen de Misra-Gries; con
+    modo='countmin' tambien se llena un bosquejo Count-Min para estimar
+    sus conteos
+    @return: Una tupla (MisraGries, CountMin o None)
+    """
+    if modo not in MODOS_RESUMEN:
+        raise ValueError("Modo desconocido: {}".format(modo))
+    resumen = MisraGries(max_elementos)
+    bosquejo = CountMin() if modo == 'countmin' else None
+    for trozo in trozos(iterable, tamano):
+        resumen.actualiza(trozo)
+        if bosquejo is not None:
+            bosquejo.actualiza(trozo, tamano)
+    return resumen, bosquejo
+
+def conteos_resumen(resumen, bosquejo=None):
+    """
+    Conteos de los candidatos de un resumen: los de Misra-Gries (cotas
+    inferiores) o, si hay bosquejo, los estimados por Count-Min (cotas
+    superiores, normalmente mucho mas cerca del real)
+    """
+    if bosquejo is None:
+        return Counter(resumen.contadores)
+    return Counter({elemento: bosquejo.estima(elemento)
+                    for elemento in resumen.contadores})
+
+def histograma(lista, imprime=False, top=None, max_elementos=None,
+               modo='misragries'):
+    """
+    Cuenta las ocurrencias de cada elemento en una sola pasada, asi que
+    `lista` puede ser cualquier iterable (un generador, un archivo...)
+    @param top: Si se da, solo se regresan los `top` mas frecuentes
+    @param max_elementos: Si se da, se usa un resumen de Misra-Gries con
+                          ese numero de contadores (memoria acotada) y los
+                          conteos son aproximados
+    @param modo: Con max_elementos, 'misragries' (los conteos son cotas
+                 inferiores) o 'countmin' (los conteos se estiman con un
+                 bosquejo Count-Min y son cotas superiores)
+    @return: Un diccionario elemento -> ocurrencias, en el orden en que
+             aparecieron por primera vez (o de mayor a menor con top)
+    """
+    if max_elementos is None:
+        conteo = Counter()
+        conteo.update(lista)
+        total = sum(conteo.values())
+    else:
+        resumen, bosquejo = resume(lista, max_elementos, modo)
+        conteo, total = conteos_resumen(resumen, bosquejo), resumen.n
+    lista_dic = dict(conteo.most_common(top) if top is not None else conteo)
+
+    if imprime:
+        imprime_histograma(lista_dic, total)
+
+    return lista_dic
+
+def en_procesos(funcion, iterable, tamano_trozo, n_trabajadores, *argumentos):
+    """
+    Aplica `funcion` a cada trozo del iterable en un proceso distinto y
+    genera los resultados en orden. Hay a lo mas 2 * n_trabajadores trozos
+    pendientes a la vez
+    """
+    with ProcessPoolExecutor(n_trabajadores) as ejecutor:
+        pendientes = deque()
+        for trozo in trozos(iterable, tamano_trozo):
+            pendientes.append(ejecutor.submit(funcion, trozo, *argumentos))
+            if len(pendientes) > 2 * n_trabajadores:
+                yield pendientes.popleft().result()
+        while pendientes:
+            yield pendientes.popleft().result()
+
+def histograma_paralelo(iterable, imprime=False, top=None,
+                        tamano_trozo=100000, n_trabajadores=None,
+                        max_elementos=None, modo='misragries'):
+    """
+    Como histograma pero cada trozo se cuenta en un proceso distinto y
+    los conteos parciales se combinan. Solo hay unos cuantos trozos en
+    memoria a la vez, aunque el iterable sea enorme. Con max_elementos
+    cada proceso regresa un resumen (ver histograma) y se combinan los
+    resumenes
+    """
+    n_trabajadores = n_trabajadores or os.cpu_count()
+    if max_elementos is None:
+        total = combina_histogramas(en_procesos(
+            Counter, iterable, tamano_trozo, n_trabajadores))
+        n = sum(total.values())
+    else:
+        resumen, bosquejo = resume((), max_elementos, modo)
+        for (parcial, bosquejo_parcial) in en_procesos(
+                resume, iterable, tamano_trozo, n_trabajadores,
+                max_elementos, modo, tamano_trozo):
+            resumen = resumen.combina(parcial)
+            if bosquejo is not None:
+                bosquejo = bosquejo.combina(bosquejo_parcial)
+        total, n = conteos_resumen(resumen, bosquejo), resumen.n
+    lista_dic = dict(total.most_common(top) if top is not None else total)
+
     if imprime:
-        for llave, valor in lista_dic.items():
-            asteriscos = '*'*valor
-            porcentaje = int(valor/len(lista)*100)
-            print("{}\t{}\t({} -> {})".format(llave, asteriscos, valor, porcentaje))
+        imprime_histograma(lista_dic, n)
 
     return lista_dic
 
@@ -130,25 +360,143 @@ print(dic2)
 
 import math
 
-def es_primo(numero):
-    if numero==2:
-        return True
-    elif numero%2 == 0:
+# Bases de Miller-Rabin, con ellas la prueba es exacta para todo numero
+# menor que 3.3 * 10**24
+BASES_MILLER_RABIN = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41)
+
+def miller_rabin(numero):
+    """
+    Prueba de primalidad de Miller-Rabin con BASES_MILLER_RABIN
+    """
+    if numero < 2:
         return False
-    
-    for x in range(3, int(numero**(1/2)), 2):
-        if numero%x == 0:
+    for p in BASES_MILLER_RABIN:
+        if numero % p == 0:
+            return numero == p
+    d, s = numero - 1, 0
+    while d % 2 == 0:
+        d, s = d // 2, s + 1
+    for a in BASES_MILLER_RABIN:
+        x = pow(a, d, numero)
+        if x == 1 or x == numero - 1:
+            continue
+        for _ in range(s - 1):
+            x = x * x % numero
+            if x == numero - 1:
+                break
+        else:
             return False
-    
     return True
 
+class CribaPrimos:
+    """
+    Criba de Eratostenes segmentada que crece sola conforme llegan
+    consultas mas grandes. Guarda un bit por numero impar (self.bits) para
+    saber si un numero es primo y la lista ordenada de primos (self.primos)
+    para encontrar el siguiente primo con busqueda binaria. Mas alla de
+    limite_maximo ya no se criba y se usa Miller-Rabin.
+    """
+    # Numeros por segmento de la criba (multiplo de 16)
+    SEGMENTO = 2 ** 20
+
+    def __init__(self, limite_maximo=10 ** 8):
+        self.limite_maximo = limite_maximo
+        # Se empieza con los impares de 1 a 15: 3, 5, 7, 11 y 13
+        self.limite = 15
+        self.bits = np.packbits([0, 1, 1, 1, 0, 1, 1, 0], bitorder='little')
+        self.primos = np.array([2, 3, 5, 7, 11, 13], dtype=np.int64)
+
+    def extiende(self, hasta):
+        """
+        Criba los numeros de self.limite + 1 hasta `hasta` (al menos el
+        doble de lo que ya estaba, para que crecer cueste O(1) amortizado,
+        pero sin pasar de limite_maximo por doblar)
+        """
+        if hasta <= self.limite:
+            return
+        hasta = max(hasta, min(2 * self.limite, self.limite_maximo))
+        hasta = -(-(hasta + 1) // 16) * 16 - 1
+        raiz = math.isqrt(hasta)
+        self.extiende(raiz)
+        base = self.primos[1:np.searchsorted(self.primos, raiz, 'right')]
+        bits, primos = [self.bits], [self.primos]
+        for inicio in range(self.limite + 1, hasta + 1, self.SEGMENTO):
+            # El segmento son los impares inicio + 1, inicio + 3, ...
+            primero = inicio + 1
+            tamano = min(self.SEGMENTO, hasta + 1 - inicio) // 2
+            ultimo = primero + 2 * (tamano - 1)
+            segmento = np.ones(tamano, dtype=bool)
+            for p in base.tolist():
+                if p * p > ultimo:
+                    break
+                multiplo = max(p * p, -(-primero // p) * p)
+                if multiplo % 2 == 0:
+                    multiplo += p
+                segmento[(multiplo - primero) // 2::p] = False
+            bits.append(np.packbits(segmento, bitorder='little'))
+            primos.append(primero + 2 * np.flatnonzero(segmento))
+        self.bits = np.concatenate(bits)
+        self.primos = np.concatenate(primos)
+        self.limite = hasta
+
+    def es_primo(self, numero):
+        if numero <= self.limite:
+            if numero < 3 or numero % 2 == 0:
+                return numero == 2
+            k = numero // 2
+            return bool(self.bits[k >> 3] >> (k & 7) & 1)
+        return miller_rabin(numero)
+
+    def primo_siguiente(self, numero):
+        """
+        El primo mas chico que es mayor que numero
+        """
+        if numero + self.SEGMENTO <= self.limite_maximo:
+            # Se extiende mientras numero no quede antes del ultimo primo
+            # cribado (no basta con numero < self.limite)
+            indice = np.searchsorted(self.primos, numero, 'right')
+            while (indice == len(self.primos) and
+                   self.limite < self.limite_maximo):
+                self.extiende(min(max(numero, self.limite) + self.SEGMENTO,
+                                  self.limite_maximo))
+                indice = np.searchsorted(self.primos, numero, 'right')
+            if indice < len(self.primos):
+                return int(self.primos[indice])
+        candidato = numero + 1 + numero % 2
+        while not miller_rabin(candidato):
+            candidato += 2
+        return candidato
+
+    def primos_siguientes(self, numeros):
+        """
+        El primo siguiente de cada numero de un arreglo, en una sola
+        busqueda binaria vectorizada
+        @param numeros: Un arreglo (o secuencia) de enteros
+        @return: Un ndarray de enteros con la misma forma
+        """
+        numeros = np.asarray(numeros, dtype=np.int64)
+        resultado = np.empty_like(numeros)
+        criba = numeros + self.SEGMENTO <= self.limite_maximo
+        if criba.any():
+            self.extiende(int(numeros[criba].max()) + self.SEGMENTO)
+            resultado[criba] = self.primos[np.searchsorted(
+                self.primos, numeros[criba], 'right')]
+        for k in np.flatnonzero(~criba.ravel()):
+            resultado.flat[k] = self.primo_siguiente(int(numeros.flat[k]))
+        return resultado
+
+CRIBA = CribaPrimos()
+
+def es_primo(numero):
+    return CRIBA.es_primo(numero)
+
 def primo_siguiente(numero):
-    for x in range(numero+1, numero+1000):
-        if es_primo(x):
-            return x
+    return CRIBA.primo_siguiente(numero)
 
 def numeros_primos( funcion, numero):
-    return [funcion(x) for x in range(numero)]    
+    if funcion is primo_siguiente:
+        return CRIBA.primos_siguientes(np.arange(numero)).tolist()
+    return [funcion(x) for x in range(numero)]
 
 lista_primos = numeros_primos(math.sqrt, 100)
 print(lista_primos)   
@@ -244,88 +592,484 @@ figura(4, 3)
 # >>> E = 3*B + C
 # error "Si no son de la misma dimension las matrices no se pueden sumar"
 
+import numbers
+
+# Fraccion de elementos distintos de cero por debajo de la cual un
+# resultado se guarda como matriz dispersa (CSR)
+UMBRAL_DISPERSA = 0.1
+# Fraccion de elementos distintos de cero por arriba de la cual el producto
+# de una dispersa por una densa se hace convirtiendola a densa (con BLAS)
+UMBRAL_PRODUCTO_DISPERSO = 0.005
+
+
+def producto_blas(a, b):
+    """
+    Producto de dos arreglos con np.matmul. BLAS solo multiplica
+    flotantes, los enteros se multiplican como float64 y se regresan a
+    enteros (exacto hasta 2**53)
+    """
+    producto = np.matmul(a.astype(np.float64, copy=False),
+                         b.astype(np.float64, copy=False))
+    if a.dtype.kind in 'iub' and b.dtype.kind in 'iub':
+        producto = np.rint(producto).astype(np.int64)
+    return producto
+
+
+class Densa:
+    """
+    Almacenamiento denso: un ndarray de n x m
+    """
+    nombre = 'densa'
+
+    def __init__(self, arreglo):
+        self.arreglo = arreglo
+        self.forma = arreglo.shape
+        self.dtype = arreglo.dtype
+
+    def densa(self):
+        return self.arreglo
+
+    def escala(self, escalar):
+        return Densa(escalar * self.arreglo)
+
+    def por_filas(self, diagonal):
+        return Densa(diagonal[:, None] * self.arreglo)
+
+    def por_columnas(self, diagonal):
+        return Densa(self.arreglo * diagonal[None, :])
+
+    def derecha(self, b):
+        return producto_blas(self.arreglo, b)
+
+    def izquierda(self, a):
+        return producto_blas(a, self.arreglo)
+
+    def suma_en(self, arreglo):
+        arreglo += self.arreglo
+
+    def quita_fila(self, indice):
+        # Siempre en un arreglo nuevo: self.arreglo puede ser el de quien
+        # llamo a desde_arreglo o uno que ya se regreso con Matriz.matriz
+        return Densa(np.delete(self.arreglo, indice, axis=0))
+
+    def quita_columna(self, indice):
+        return Densa(np.delete(self.arreglo, indice, axis=1))
+
+
+class Constante:
+    """
+    Matriz con todos sus elementos iguales, solo guarda el valor
+    """
+    nombre = 'constante'
+
+    def __init__(self, n, m, valor):
+        self.forma = (n, m)
+        self.valor = valor
+        self.dtype = np.asarray(valor).dtype
+
+    def densa(self):
+        return np.full(self.forma, self.valor, dtype=self.dtype)
+
+    def escala(self, escalar):
+        return Constante(*self.forma, escalar * self.valor)
+
+    def por_filas(self, diagonal):
+        return Densa(np.repeat((diagonal * self.valor)[:, None],
+                               self.forma[1], axis=1))
+
+    def por_columnas(self, diagonal):
+        return Densa(np.repeat((diagonal * self.valor)[None, :],
+                               self.forma[0], axis=0))
+
+    def derecha(self, b):
+        # Todas las filas del producto son valor * (suma de columnas de b)
+        return np.repeat(self.valor * b.sum(axis=0, keepdims=True),
+                         self.forma[0], axis=0)
+
+    def izquierda(self, a):
+        return np.repeat(self.valor * a.sum(axis=1, keepdims=True),
+                         self.forma[1], axis=1)
+
+    def suma_en(self, arreglo):
+        arreglo += self.valor
+
+    def quita_fila(self, indice):
+        return Constante(self.forma[0] - 1, self.forma[1], self.valor)
+
+    def quita_columna(self, indice):
+        return Constante(self.forma[0], self.forma[1] - 1, self.valor)
+
+
+class Diagonal:
+    """
+    Matriz cuadrada diagonal, solo guarda la diagonal
+    """
+    nombre = 'diagonal'
+
+    def __init__(self, diagonal):
+        self.diagonal = diagonal
+        self.forma = (len(diagonal), len(diagonal))
+        self.dtype = diagonal.dtype
+
+    def densa(self):
+        return np.diag(self.diagonal)
+
+    def escala(self, escalar):
+        return Diagonal(escalar * self.diagonal)
+
+    def por_filas(self, diagonal):
+        return Diagonal(diagonal * self.diagonal)
+
+    def por_columnas(self, diagonal):
+        return Diagonal(self.diagonal * diagonal)
+
+    def derecha(self, b):
+        return self.diagonal[:, None] * b
+
+    def izquierda(self, a):
+        return a * self.diagonal[None, :]
+
+    def suma_en(self, arreglo):
+        indices = np.arange(self.forma[0])
+        arreglo[indices, indices] += self.diagonal
+
+    def dispersa(self):
+        indices = np.arange(self.forma[0])
+        return CSR.desde_coo(indices, indices, self.diagonal, self.forma)
+
+    def quita_fila(self, indice):
+        return self.dispersa().quita_fila(indice)
+
+    def quita_columna(self, indice):
+        return self.dispersa().quita_columna(indice)
+
+
+class CSR:
+    """
+    Matriz dispersa en formato CSR (compressed sparse row): los valores
+    distintos de cero de cada fila estan en datos[indptr[i]:indptr[i + 1]]
+    y sus columnas en indices[indptr[i]:indptr[i + 1]]
+    """
+    nombre = 'dispersa'
+
+    def __init__(self, datos, indices, indptr, forma):
+        self.datos = datos
+        self.indices = indices
+        self.indptr = indptr
+        self.forma = forma
+        self.dtype = datos.dtype
+
+    @classmethod
+    def desde_coo(cls, filas, columnas, datos, forma):
+        """
+        Crea la matriz a partir de tripletas (fila, columna, valor), sumando
+        las repetidas y quitando los ceros
+        """
+        orden = np.lexsort((columnas, filas))
+        filas, columnas, datos = filas[orden], columnas[orden], datos[orden]
+        if len(datos):
+            inicios = np.flatnonzero(np.r_[True, (np.diff(filas) != 0) |
+                                           (np.diff(columnas) != 0)])
+            filas, columnas = filas[inicios], columnas[inicios]
+            datos = np.add.reduceat(datos, inicios)
+        no_cero = datos != 0
+        filas, columnas, datos = filas[no_cero], columnas[no_cero], datos[no_cero]
+        indptr = np.zeros(forma[0] + 1, dtype=np.intp)
+        np.cumsum(np.bincount(filas, minlength=forma[0]), out=indptr[1:])
+        return cls(datos, columnas.astype(np.intp), indptr, forma)
+
+    @classmethod
+    def desde_densa(cls, arreglo):
+        filas, columnas = np.nonzero(arreglo)
+        indptr = np.zeros(arreglo.shape[0] + 1, dtype=np.intp)
+        np.cumsum(np.bincount(filas, minlength=arreglo.shape[0]),
+                  out=indptr[1:])
+        return cls(arreglo[filas, columnas], columnas, indptr, arreglo.shape)
+
+    @classmethod
+    def ceros(cls, n, m, dtype=np.int64):
+        return cls(np.zeros(0, dtype=dtype), np.zeros(0, dtype=np.intp),
+                   np.zeros(n + 1, dtype=np.intp), (n, m))
+
+    def filas(self):
+        """
+        La fila de cada elemento guardado
+        """
+        return np.repeat(np.arange(self.forma[0]), np.diff(self.indptr))
+
+    def densa(self):
+        arreglo = np.zeros(self.forma, dtype=self.dtype)
+        arreglo[self.filas(), self.indices] = self.datos
+        return arreglo
+
+    def transpuesta(self):
+        return CSR.desde_coo(self.indices, self.filas(), self.datos,
+                             self.forma[::-1])
+
+    def escala(self, escalar):
+        return CSR(escalar * self.datos, self.indices, self.indptr,
+                   self.forma)
+
+    def por_filas(self, diagonal):
+        return CSR(self.datos * diagonal[self.filas()], self.indices,
+                   self.indptr, self.forma)
+
+    def por_columnas(self, diagonal):
+        return CSR(self.datos * diagonal[self.indices], self.indices,
+                   self.indptr, self.forma)
+
+    def derecha(self, b):
+        # Por arriba de UMBRAL_PRODUCTO_DISPERSO es mas rapido BLAS
+        if len(self.datos) >= UMBRAL_PRODUCTO_DISPERSO * np.prod(self.forma):
+            return producto_blas(self.densa(), b)
+        # Cada elemento guardado aporta datos[k] * b[indices[k]] a su fila,
+        # se suman por trozos de filas para no crear arreglos enormes
+        producto = np.zeros((self.forma[0], b.shape[1]),
+                            dtype=np.result_type(self.dtype, b.dtype))
+        indptr, n = self.indptr, self.forma[0]
+        por_trozo = max(1, 2 ** 20 // max(1, b.shape[1]))
+        inicio = 0
+        while inicio < n:
+            fin = int(np.searchsorted(indptr, indptr[inicio] + por_trozo,
+                                      'right')) - 1
+            fin = min(n, max(inicio + 1, fin))
+            primero, ultimo = indptr[inicio], indptr[fin]
+            if ultimo > primero:
+                inicios = indptr[inicio:fin + 1] - primero
+                no_vacias = np.flatnonzero(np.diff(inicios))
+                aportes = (self.datos[primero:ultimo, None] *
+                           b[self.indices[primero:ultimo]])
+                producto[inicio + no_vacias] = np.add.reduceat(
+                    aportes, inicios[no_vacias], axis=0)
+            inicio = fin
+        return producto
+
+    def izquierda(self, a):
+        return self.transpuesta().derecha(a.T).T
+
+    def suma_en(self, arreglo):
+        arreglo[self.filas(), self.indices] += self.datos
+
+    def suma_dispersa(self, otra):
+        filas = np.concatenate((self.filas(), otra.filas()))
+        columnas = np.concatenate((self.indices, otra.indices))
+        datos = np.concatenate((self.datos, otra.datos))
+        return CSR.desde_coo(filas, columnas, datos, self.forma)
+
+    def quita_fila(self, indice):
+        inicio, fin = self.indptr[indice], self.indptr[indice + 1]
+        datos = np.concatenate((self.datos[:inicio], self.datos[fin:]))
+        indices = np.concatenate((self.indices[:inicio], self.indices[fin:]))
+        indptr = np.concatenate((self.indptr[:indice + 1],
+                                 self.indptr[indice + 2:] - (fin - inicio)))
+        return CSR(datos, indices, indptr, (self.forma[0] - 1, self.forma[1]))
+
+    def quita_columna(self, indice):
+        quedan = self.indices != indice
+        indices = self.indices[quedan]
+        indices[indices > indice] -= 1
+        acumulado = np.concatenate(([0], np.cumsum(quedan)))
+        return CSR(self.datos[quedan], indices, acumulado[self.indptr],
+                   (self.forma[0], self.forma[1] - 1))
+
+
+def compacta(almacenamiento):
+    """
+    Si un resultado denso es casi todo ceros lo guarda como CSR
+    """
+    if isinstance(almacenamiento, Densa):
+        arreglo = almacenamiento.arreglo
+        if arreglo.size and \
+                np.count_nonzero(arreglo) < UMBRAL_DISPERSA * arreglo.size:
+            return CSR.desde_densa(arreglo)
+    return almacenamiento
+
+
+def suma_almacenamientos(a, b):
+    """
+    Suma de dos almacenamientos de la misma forma, solo se usa un arreglo
+    denso si alguno de los dos no tiene la misma estructura que el otro
+    """
+    if isinstance(a, Constante) and isinstance(b, Constante):
+        return Constante(*a.forma, a.valor + b.valor)
+    if isinstance(a, Diagonal) and isinstance(b, Diagonal):
+        return Diagonal(a.diagonal + b.diagonal)
+    if isinstance(a, CSR) and isinstance(b, CSR):
+        return a.suma_dispersa(b)
+    if not isinstance(a, Densa) and isinstance(b, Densa):
+        a, b = b, a
+    resultado = a.densa().astype(np.result_type(a.dtype, b.dtype))
+    b.suma_en(resultado)
+    return compacta(Densa(resultado))
+
+
 class Matriz:
+    """
+    Matriz de n x m. Los datos se guardan en el almacenamiento que les
+    conviene y que se escoge solo: 'unos' es una constante, 'diag' una
+    diagonal, 'ceros' y los resultados casi todos ceros son dispersos (CSR)
+    y lo demas es un ndarray denso. Las operaciones usan el algoritmo de
+    cada caso (por ejemplo diagonal por densa es escalar las filas) y solo
+    se convierte a densa cuando hace falta. El producto de densas usa BLAS.
+    """
 
     def __init__(self, n=1, m=1, llenado='ceros'):
-        self.matriz = []
         self.n = n # filas
         self.m = m # columnas
         self.llenado = llenado
         self.llenar()
-    
+
+    @classmethod
+    def desde_almacenamiento(cls, datos, llenado='ceros'):
+        matriz_r = cls.__new__(cls)
+        matriz_r.datos = datos
+        matriz_r.n, matriz_r.m = datos.forma
+        matriz_r.llenado = llenado
+        return matriz_r
+
+    @classmethod
+    def desde_arreglo(cls, arreglo, llenado='ceros'):
+        """
+        Crea una matriz con un arreglo de dos dimensiones, sin copiarlo
+        (salvo que sea casi todo ceros y se guarde como dispersa)
+        """
+        return cls.desde_almacenamiento(compacta(Densa(arreglo)), llenado)
+
+    @property
+    def matriz(self):
+        """
+        Los elementos como ndarray de n x m, el arreglo mismo de la matriz,
+        asi que A.matriz[i, j] = v y A.matriz[i][j] = v la modifican. Si el
+        almacenamiento no es denso antes se convierte a denso (para solo
+        leer sin convertir esta datos.densa())
+        """
+        if not isinstance(self.datos, Densa):
+            self.datos = Densa(np.array(self.datos.densa()))
+        return self.datos.arreglo
+
+    @matriz.setter
+    def matriz(self, arreglo):
+        self.datos = Densa(np.asarray(arreglo))
+        self.n, self.m = self.datos.forma
+
+    @property
+    def almacenamiento(self):
+        """
+        'densa', 'constante', 'diagonal' o 'dispersa'
+        """
+        return self.datos.nombre
+
     def __str__(self):
-        matriz_str = ''
-        for i in range(self.n):
-            matriz_str += str(self.matriz[i]) + '\n'
-        matriz_str = matriz_str.replace('[', '').replace(']', '').replace(',', '')
-        return matriz_str
+        return ''.join(' '.join(str(valor) for valor in fila) + '\n'
+                       for fila in self.datos.densa().tolist())
 
     def llenar(self):
         if self.llenado == 'unos':
-            self.matriz = [ [1 for i in range(self.m)] for j in range(self.n) ]  
+            self.datos = Constante(self.n, self.m, np.int64(1))
         elif self.llenado == 'diag':
             try:
                 if self.n != self.m:
                     raise Exception("No se puede crear crear la diagonal, no es una matriz cuadrada")
-                for i in range(self.n):
-                    self.matriz.append([])
-                    for j in range(self.m):
-                        self.matriz[i].append( 0 if i!=j else 1 )
+                self.datos = Diagonal(np.ones(self.n, dtype=np.int64))
             except Exception as e:
                 print("Error: {}, se llenara con ceros".format(e))
                 self.llenado = 'ceros'
                 self.llenar()
-                
         else:
-            self.matriz = [ [0 for i in range(self.m)] for j in range(self.n) ]
+            self.datos = CSR.ceros(self.n, self.m)
 
     def __add__(self, matriz_b):
         try:
             if self.n != matriz_b.n or self.m != matriz_b.m:
                 raise Exception("Deben ser del mismo tamaño")
 
-            matriz_r = Matriz(self.n, self.m)
-            matriz_r.matriz = [ [self.matriz[i][j]+matriz_b.matriz[i][j] for i in range(self.n)] for j in range(self.m) ]    
-            
-            return matriz_r
+            return Matriz.desde_almacenamiento(suma_almacenamientos(
+                self.datos, matriz_b.datos))
 
         except Exception as e:
             print("Error: {}".format(e))
             return None
-    
+
+    def __iadd__(self, matriz_b):
+        """
+        A += B suma en el mismo arreglo de A si es densa y el tipo lo
+        permite
+        """
+        try:
+            if self.n != matriz_b.n or self.m != matriz_b.m:
+                raise Exception("Deben ser del mismo tamaño")
+
+            if isinstance(self.datos, Densa) and \
+                    np.can_cast(matriz_b.datos.dtype, self.datos.dtype):
+                matriz_b.datos.suma_en(self.datos.arreglo)
+            else:
+                self.datos = suma_almacenamientos(self.datos, matriz_b.datos)
+            return self
+
+        except Exception as e:
+            print("Error: {}".format(e))
+            return None
+
     def __mul__(self, matriz_b):
+        if isinstance(matriz_b, numbers.Number):
+            return self.__rmul__(matriz_b)
         try:
             if self.m != matriz_b.n:
                 raise Exception("El numero de filas de 'a' debe ser igual al numero de columnas de 'b'")
 
-            matriz_r = Matriz(self.n, matriz_b.m)
-            
-            for i in range(self.n):
-                matriz_r.matriz[i] = [ [ sum( [ self.matriz[i][k] * matriz_b.matriz[k][j] for k in range(self.m) ] ) ] for j in range(matriz_b.m) ] 
-            
-            return matriz_r
+            a, b = self.datos, matriz_b.datos
+            if isinstance(a, Diagonal):
+                producto = b.por_filas(a.diagonal)
+            elif isinstance(b, Diagonal):
+                producto = a.por_columnas(b.diagonal)
+            elif isinstance(b, Densa):
+                producto = Densa(a.derecha(b.arreglo))
+            elif isinstance(a, Densa):
+                producto = Densa(b.izquierda(a.arreglo))
+            else:
+                producto = Densa(a.derecha(b.densa()))
+            return Matriz.desde_almacenamiento(compacta(producto))
 
         except Exception as e:
             print("Error: {}".format(e))
             return None
 
     def __rmul__(self, escalar):
-        matriz_r = Matriz(self.n, self.m)
-        matriz_r.matriz = [ [ escalar*self.matriz[i][j] for i in range(self.n) ] for j in range(self.m) ]
-        return matriz_r
+        return Matriz.desde_almacenamiento(self.datos.escala(escalar))
+
+    def __imul__(self, escalar):
+        """
+        A *= escalar multiplica en el mismo arreglo de A si es densa y el
+        tipo lo permite
+        """
+        if not isinstance(escalar, numbers.Number):
+            return self * escalar
+        if isinstance(self.datos, Densa) and \
+                np.can_cast(np.result_type(self.datos.dtype, escalar),
+                            self.datos.dtype):
+            np.multiply(self.datos.arreglo, escalar, out=self.datos.arreglo)
+        else:
+            self.datos = self.datos.escala(escalar)
+        return self
 
     def quitarFila(self, indice):
         try:
-            del self.matriz[indice]
+            if not -self.n <= indice < self.n:
+                raise IndexError("la fila no existe")
+            self.datos = self.datos.quita_fila(indice % self.n)
             self.n -= 1
             if self.n == 0: self.m = 0
         except Exception as e:
             print("Error al eliminar la fila con indice {}: {}".format(indice, e))
 
     def quitarColumna(self, indice):
-        for i in range(0, self.n):
-            del self.matriz[i][indice]
-        self.m -= 1
-        if self.m == 0: self.n = 0
+        try:
+            if not -self.m <= indice < self.m:
+                raise IndexError("la columna no existe")
+            self.datos = self.datos.quita_columna(indice % self.m)
+            self.m -= 1
+            if self.m == 0: self.n = 0
+        except Exception as e:
+            print("Error al eliminar la columna con indice {}: {}".format(indice, e))
 
 print(5 * Matriz(3, 3, 'diag'))
\ No newline at end of file
@@ -0,0 +1,141 @@
+"""
+Autor: Raul Perez
+Pruebas de regresion de raul_perez_1.py (se corren con pytest)
+"""
+
+from raul_perez_1 import Matriz
+
+
+def test_escribir_en_matriz_de_ceros_y_unos():
+    for llenado in ('ceros', 'unos', 'diag'):
+        a = Matriz(3, 3, llenado)
+        a.matriz[0, 1] = 7
+        a.matriz[2][0] = 5
+        assert a.matriz[0, 1] == 7
+        assert a.matriz[2][0] == 5
+        assert a.almacenamiento == 'densa'
+        assert (a + Matriz(3, 3)).matriz[0, 1] == 7
+
+
+def test_histograma_con_count_min():
+    from collections import Counter
+    from raul_perez_1 import histograma, histograma_paralelo
+    flujo = [k % 7 if k % 3 else k for k in range(30000)]
+    real = Counter(flujo)
+    aproximado = histograma(iter(flujo), top=7, max_elementos=20,
+                            modo='countmin')
+    assert set(aproximado) == set(range(7))
+    assert all(real[e] <= c <= real[e] + 100 for e, c in aproximado.items())
+    paralelo = histograma_paralelo(flujo, top=7, tamano_trozo=5000,
+                                   n_trabajadores=2, max_elementos=20,
+                                   modo='countmin')
+    assert set(paralelo) == set(range(7))
+    assert all(real[e] <= c for e, c in paralelo.items())
+
+
+def test_primo_siguiente_despues_del_ultimo_primo_cribado():
+    from raul_perez_1 import CribaPrimos, miller_rabin, primo_siguiente
+    assert CribaPrimos().primo_siguiente(13) == 17
+    assert CribaPrimos().primo_siguiente(14) == 17
+    for numero in (1048681, 1048686):
+        siguiente = primo_siguiente(numero)
+        assert siguiente > numero and miller_rabin(siguiente)
+        assert not any(miller_rabin(k) for k in range(numero + 1, siguiente))
+
+
+def test_la_criba_no_se_pasa_del_limite_maximo_al_doblar():
+    from raul_perez_1 import CribaPrimos
+    criba = CribaPrimos(limite_maximo=3 * 2 ** 20)
+    criba.extiende(2 * 2 ** 20)
+    criba.extiende(2 * 2 ** 20 + 100)
+    assert criba.limite <= criba.limite_maximo + 15
+    assert criba.primos_siguientes([10, 2 ** 20]).tolist() == [
+        11, criba.primo_siguiente(2 ** 20)]
+
+
+def test_quitar_fila_o_columna_no_cambia_el_arreglo_original():
+    import numpy as np
+    x = np.arange(16).reshape(4, 4) + 1
+    original = x.copy()
+    a = Matriz.desde_arreglo(x)
+    vista = a.matriz
+    a.quitarFila(1)
+    a.quitarColumna(2)
+    assert (x == original).all()
+    assert (vista == original).all()
+    assert (a.matriz == np.delete(np.delete(original, 1, 0), 2, 1)).all()
+
+
+def matrices_de_prueba(n, m):
+    import numpy as np
+    generador = np.random.default_rng(n * 10 + m)
+    dispersa = np.zeros((n, m), dtype=np.int64)
+    dispersa[0, m - 1] = 4
+    matrices = [Matriz(n, m, 'ceros'), Matriz(n, m, 'unos'),
+                Matriz.desde_arreglo(generador.integers(-5, 5, (n, m))),
+                Matriz.desde_arreglo(dispersa)]
+    if n == m:
+        matrices.append(Matriz(n, m, 'diag'))
+    return matrices
+
+
+def test_operaciones_de_todos_los_almacenamientos_igual_que_numpy():
+    import numpy as np
+    for (n, m, k) in ((3, 3, 3), (2, 4, 3), (4, 4, 2)):
+        izquierdas = matrices_de_prueba(n, m)
+        derechas = matrices_de_prueba(m, k)
+        assert {a.almacenamiento for a in izquierdas} >= {
+            'densa', 'constante', 'dispersa'}
+        for a in izquierdas:
+            x = a.datos.densa()
+            assert (a.n, a.m) == x.shape == (n, m)
+            assert ((3 * a).datos.densa() == 3 * x).all()
+            assert ((a * 2).datos.densa() == 2 * x).all()
+            for b in matrices_de_prueba(n, m):
+                suma = a + b
+                assert (suma.n, suma.m) == (n, m)
+                assert (suma.datos.densa() == x + b.datos.densa()).all()
+            for b in derechas:
+                producto = a * b
+                assert (producto.n, producto.m) == (n, k)
+                assert (producto.datos.densa() ==
+                        x @ b.datos.densa()).all()
+            for i in range(-n, n):
+                c = Matriz.desde_almacenamiento(a.datos)
+                c.quitarFila(i)
+                assert (c.n, c.m) == (n - 1, m)
+                assert (c.datos.densa() == np.delete(x, i, 0)).all()
+            for j in range(-m, m):
+                c = Matriz.desde_almacenamiento(a.datos)
+                c.quitarColumna(j)
+                assert (c.n, c.m) == (n, m - 1)
+                assert (c.datos.densa() == np.delete(x, j, 1)).all()
+
+
+def test_criba_igual_que_division_por_tentativa():
+    import numpy as np
+    from raul_perez_1 import CribaPrimos, miller_rabin, numeros_primos, \
+        primo_siguiente
+
+    def es_primo_tentativa(numero):
+        return numero > 1 and all(numero % d for d in range(2, int(
+            numero ** 0.5) + 1))
+
+    def siguiente_tentativa(numero):
+        numero += 1
+        while not es_primo_tentativa(numero):
+            numero += 1
+        return numero
+
+    criba = CribaPrimos(limite_maximo=2 ** 21)
+    numeros = list(range(3000)) + [2 ** 20 - 3, 2 ** 21 - 20, 2 ** 21 + 7]
+    esperados = [siguiente_tentativa(numero) for numero in numeros]
+    assert [criba.primo_siguiente(numero) for numero in numeros] == esperados
+    assert criba.primos_siguientes(np.array(numeros)).tolist() == esperados
+    assert [criba.es_primo(numero) for numero in range(3000)] == \
+        [es_primo_tentativa(numero) for numero in range(3000)]
+    assert numeros_primos(primo_siguiente, 100) == \
+        [siguiente_tentativa(numero) for numero in range(100)]
+    # Mas alla de la criba: un primo de Mersenne y un pseudoprimo de Fermat
+    assert miller_rabin(2 ** 61 - 1) and not miller_rabin(341)
+    assert criba.primo_siguiente(10 ** 12) == 10 ** 12 + 39
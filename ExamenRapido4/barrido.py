@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+barrido.py
+----------
+Barrido de hiperparámetros para los algoritmos genéticos.
+
+Cada ensayo (una configuración de la rejilla con un número de repetición)
+se corre en un grupo de procesos y su resultado se agrega a un archivo de
+resultados en formato JSON, una línea por ensayo. Si el barrido se
+interrumpe, al volver a correrlo se saltan los ensayos que ya están en el
+archivo. Opcionalmente se hace reducción sucesiva (successive halving):
+todas las configuraciones empiezan con pocas repeticiones y solo las
+mejores pasan a la siguiente ronda con más repeticiones. También se puede
+dar un filtro que descarta, al final de cada ronda, las configuraciones
+cuyo resumen no lo cumple (por ejemplo un costo promedio máximo).
+"""
+
+import json
+import os
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import product
+import numpy as np
+
+__author__ = 'Raul Perez'
+
+
+def configuraciones(rejilla):
+    """
+    Todas las combinaciones de una rejilla de parámetros
+    @param rejilla: Un diccionario parámetro -> lista de valores
+    @return: Una lista de diccionarios parámetro -> valor
+    """
+    nombres = sorted(rejilla)
+    return [dict(zip(nombres, valores))
+            for valores in product(*(rejilla[nombre] for nombre in nombres))]
+
+
+def clave(configuracion):
+    """
+    Texto que identifica a una configuración en el archivo de resultados
+    """
+    return json.dumps(configuracion, sort_keys=True)
+
+
+def semilla_ensayo(configuracion, repeticion):
+    """
+    Semilla fija para un ensayo, para que el barrido sea reproducible
+    """
+    return (zlib.crc32(clave(configuracion).encode()) + repeticion) % 2 ** 32
+
+
+def lee_resultados(archivo):
+    """
+    Lee los resultados ya guardados
+    @param archivo: Ruta del archivo de resultados (puede no existir)
+    @return: Un diccionario (clave, repeticion) -> resultado
+    """
+    resultados = {}
+    if not os.path.exists(archivo):
+        return resultados
+    with open(archivo) as entrada:
+        for linea in entrada:
+            try:
+                resultado = json.loads(linea)
+            except ValueError:
+                continue    # Línea incompleta de un barrido interrumpido
+            llave = (clave(resultado['configuracion']),
+                     resultado['repeticion'])
+            resultados[llave] = resultado
+    return resultados
+
+
+def corre_ensayos(funcion, pendientes, archivo, resultados, n_trabajadores):
+    """
+    Corre los ensayos pendientes en un grupo de procesos y guarda cada
+    resultado en cuanto termina
+    @param funcion: Función (configuracion, semilla) -> diccionario de
+                    métricas, que se pueda serializar
+    @param pendientes: Lista de tuplas (configuracion, repeticion)
+    @param archivo: Ruta del archivo de resultados
+    @param resultados: Diccionario de resultados, se actualiza
+    @param n_trabajadores: Número de procesos
+    """
+    if not pendientes:
+        return
+    with ProcessPoolExecutor(n_trabajadores) as ejecutor, \
+            open(archivo, 'a') as salida:
+        futuros = {ejecutor.submit(funcion, configuracion,
+                                   semilla_ensayo(configuracion, repeticion)):
+                   (configuracion, repeticion)
+                   for (configuracion, repeticion) in pendientes}
+        for futuro in as_completed(futuros):
+            configuracion, repeticion = futuros[futuro]
+            resultado = {'configuracion': configuracion,
+                         'repeticion': repeticion}
+            resultado.update(futuro.result())
+            salida.write(json.dumps(resultado, sort_keys=True) + '\n')
+            salida.flush()
+            resultados[(clave(configuracion), repeticion)] = resultado
+
+
+def resume(resultados, configuracion, repeticiones, metricas):
+    """
+    Estadísticas de las primeras repeticiones de una configuración
+    @return: Un diccionario metrica -> (media, desviación, p50, p90)
+    """
+    llave = clave(configuracion)
+    filas = [resultados[(llave, r)] for r in range(repeticiones)]
+    resumen = {}
+    for metrica in metricas:
+        valores = np.array([fila[metrica] for fila in filas], dtype=float)
+        resumen[metrica] = (valores.mean(), valores.std(),
+                            np.percentile(valores, 50),
+                            np.percentile(valores, 90))
+    return resumen
+
+
+def barrido(funcion, rejilla, archivo, repeticiones=2, n_trabajadores=None,
+            rondas=1, reduccion=2, metricas=('costo', 'tiempo'),
+            filtro=None):
+    """
+    Barrido de hiperparámetros en paralelo y reanudable
+    @param funcion: Función (configuracion, semilla) -> diccionario con
+                    al menos las métricas, a nivel de módulo para que los
+                    procesos la puedan usar
+    @param rejilla: Un diccionario parámetro -> lista de valores
+    @param archivo: Ruta del archivo de resultados (se agrega al final)
+    @param repeticiones: Repeticiones por configuración en la primera ronda
+    @param n_trabajadores: Número de procesos (None para todos los núcleos)
+    @param rondas: Número de rondas de reducción sucesiva (1 para correr
+                   todas las configuraciones con las mismas repeticiones)
+    @param reduccion: En cada ronda solo sigue 1 de cada `reduccion`
+                      configuraciones, con `reduccion` veces más
+                      repeticiones
+    @param metricas: Métricas a resumir, las configuraciones se ordenan
+                     por la media de la primera y luego de la segunda...
+    @param filtro: Función resumen -> bool, o None. Al final de cada ronda
+                   se descartan las configuraciones para las que da False
+                   (antes de escoger las que pasan a la siguiente)
+    @return: Una lista de tuplas (configuracion, repeticiones, resumen)
+             de las configuraciones de la última ronda que pasan el
+             filtro, de la mejor a la peor, donde resumen es el de la
+             función resume
+    """
+    resultados = lee_resultados(archivo)
+    vivas = configuraciones(rejilla)
+    for ronda in range(rondas):
+        n_rep = repeticiones * reduccion ** ronda
+        pendientes = [(configuracion, r) for configuracion in vivas
+                      for r in range(n_rep)
+                      if (clave(configuracion), r) not in resultados]
+        corre_ensayos(funcion, pendientes, archivo, resultados,
+                      n_trabajadores)
+        tabla = [(configuracion, n_rep,
+                  resume(resultados, configuracion, n_rep, metricas))
+                 for configuracion in vivas]
+        tabla.sort(key=lambda fila: tuple(fila[2][metrica][0]
+                                          for metrica in metricas))
+        if filtro is not None:
+            tabla = [fila for fila in tabla if filtro(fila[2])]
+        if ronda < rondas - 1:
+            vivas = [configuracion for (configuracion, _, _)
+                     in tabla[:max(1, -(-len(tabla) // reduccion))]]
+    return tabla
+
+
+def formatea_tabla(tabla, metricas=('costo', 'tiempo')):
+    """
+    Tabla alineada con los resultados de barrido
+    @return: Una cadena con un renglón por configuración
+    """
+    parametros = sorted(tabla[0][0]) if tabla else []
+    encabezado = ['{:>12}'.format(parametro[:12]) for parametro in parametros]
+    encabezado.append('{:>4}'.format('rep'))
+    for metrica in metricas:
+        encabezado.extend('{:>12}'.format(metrica[:6] + sufijo)
+                          for sufijo in ('_media', '_desv', '_p50', '_p90'))
+    lineas = [' '.join(encabezado)]
+    for (configuracion, n_rep, resumen) in tabla:
+        renglon = ['{:>12}'.format(configuracion[parametro])
+                   for parametro in parametros]
+        renglon.append('{:>4}'.format(n_rep))
+        for metrica in metricas:
+            renglon.extend('{:>12.4f}'.format(valor)
+                           for valor in resumen[metrica])
+        lineas.append(' '.join(renglon))
+    return '\n'.join(lineas)
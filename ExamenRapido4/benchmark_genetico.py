@@ -0,0 +1,278 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+benchmark_genetico.py
+---------------------
+Pruebas de rendimiento de los algoritmos genéticos con las n reinas.
+
+Hay dos niveles:
+  - micro: tiempo por llamada de la ruleta, la cruza, la mutación, el
+    reemplazo generacional, una generación completa y el costo, para cada
+    motor, y la aceleración de cada motor contra el de listas.
+  - macro: tiempo hasta encontrar una solución de costo 0 para 8, 16, 32,
+    64 y 100 reinas, con los parámetros de la tabla de genetico_nreinas,
+    y el número de estados evaluados (lo que cuenta si el costo es caro).
+    El porcentaje de éxito solo sirve para comparar la calidad de los
+    motores con muchas repeticiones (--repeticiones 30 o más); con las 3
+    de default es sobre todo ruido de las semillas.
+
+Todo se corre con semillas fijas. Los resultados se pueden guardar como
+línea base en JSON y comparar contra ella, marcando las regresiones que
+pasen de un umbral. Por ejemplo:
+
+    python benchmark_genetico.py micro --guarda base.json
+    python benchmark_genetico.py micro --compara base.json --umbral 0.15
+"""
+
+import argparse
+import json
+import sys
+from time import perf_counter
+import numpy as np
+import genetico
+import genetico_compacto
+import genetico_vectorizado
+from genetico_nreinas import ProblemaNreinas
+
+__author__ = 'Raul Perez'
+
+# Motores a comparar, los motores nuevos se agregan aquí
+MOTORES = {
+    'listas': genetico.GeneticoPermutaciones,
+    'compacto': genetico_compacto.GeneticoPermutacionesCompacto,
+    'vectorizado': genetico_vectorizado.GeneticoPermutacionesVectorizado,
+}
+
+# n reinas -> (población, generaciones, prob. de mutación), de la tabla
+# de genetico_nreinas.py
+PARAMETROS_MACRO = {
+    8: (50, 25, 0.10),
+    16: (100, 150, 0.05),
+    32: (150, 300, 0.005),
+    64: (200, 400, 0.005),
+    100: (150, 500, 0.005),
+}
+
+
+class ProblemaContado(ProblemaNreinas):
+    """
+    Las n reinas contando el número de estados que evalúa el motor. Todos
+    los motores evalúan con costo_lote, así que solo se cuenta ahí: costo
+    lo usan también el criterio de paro por costo objetivo y quien revisa
+    el resultado, y esas llamadas no son del motor.
+    """
+    evaluaciones = 0
+
+    def costo_lote(self, estados):
+        self.evaluaciones += len(estados)
+        return super().costo_lote(estados)
+
+
+def mide(funcion, preparacion=None, repeticiones=5, llamadas=20):
+    """
+    Tiempo por llamada de una función, sin contar su preparación
+    @param funcion: La función a medir
+    @param preparacion: Función sin argumentos que devuelve la tupla de
+                        argumentos para cada llamada (no se mide), o None
+    @param repeticiones: Se toma el mejor de este número de mediciones
+    @param llamadas: Llamadas por medición
+    @return: Segundos por llamada
+    """
+    mejor = float('inf')
+    for _ in range(repeticiones):
+        total = 0.0
+        for _ in range(llamadas):
+            argumentos = preparacion() if preparacion is not None else ()
+            t_inicial = perf_counter()
+            funcion(*argumentos)
+            total += perf_counter() - t_inicial
+        mejor = min(mejor, total / llamadas)
+    return mejor
+
+
+def micro_motor(nombre, motor, n_reinas=100, n_poblacion=200, semilla=0):
+    """
+    Micro pruebas de un motor
+    @return: Un diccionario nombre de la prueba -> segundos por llamada
+    """
+    semilla_problema, semilla_ag = genetico.semillas_derivadas(semilla, 2)
+    algoritmo = motor(ProblemaNreinas(n_reinas, semilla_problema),
+                      n_poblacion, 0.01, aleatorio=semilla_ag)
+    parejas = algoritmo.seleccion()
+    resultados = {'seleccion': mide(algoritmo.seleccion),
+                  'cruza': mide(algoritmo.cruza, lambda: (parejas,)),
+                  'mutacion': mide(algoritmo.mutacion,
+                                   lambda: (algoritmo.cruza(parejas),)),
+                  'reemplazo': mide(algoritmo.reemplazo_generacional,
+                                    lambda: (algoritmo.cruza(
+                                        algoritmo.seleccion()),)),
+                  'generacion': mide(lambda: algoritmo.busqueda(1))}
+    if hasattr(algoritmo, 'ruleta_acumulada'):
+        acumulado = list(np.cumsum([a for (a, _) in algoritmo.poblacion]))
+        cadena1 = algoritmo.poblacion[0][1]
+        cadena2 = algoritmo.poblacion[1][1]
+        resultados['ruleta'] = mide(lambda: algoritmo.ruleta_acumulada(
+            acumulado, 0, algoritmo.aleatorio), llamadas=1000)
+        resultados['cruza_individual'] = mide(
+            lambda: algoritmo.cruza_individual(cadena1, cadena2),
+            llamadas=200)
+    return {nombre + '.' + prueba: tiempo
+            for (prueba, tiempo) in resultados.items()}
+
+
+def micro_problema(n_reinas=100, n_estados=200, semilla=0):
+    """
+    Micro pruebas de la función de costo de las n reinas
+    @return: Un diccionario nombre de la prueba -> segundos por llamada
+    """
+    problema = ProblemaNreinas(n_reinas, semilla)
+    estados = [problema.estado_aleatorio() for _ in range(n_estados)]
+    arreglo = np.array(estados)
+    return {'nreinas.costo': mide(lambda: problema.costo(estados[0]),
+                                  llamadas=200),
+            'nreinas.costo_lote': mide(lambda: problema.costo_lote(arreglo))}
+
+
+def micro(semilla=0):
+    """
+    Todas las micro pruebas
+    """
+    resultados = micro_problema(semilla=semilla)
+    for (nombre, motor) in MOTORES.items():
+        resultados.update(micro_motor(nombre, motor, semilla=semilla))
+    return resultados
+
+
+def macro(tamanos=(8, 16, 32, 64, 100), repeticiones=3, semilla=0):
+    """
+    Tiempo hasta la solución de costo 0 con cada motor
+    @param tamanos: Números de reinas a probar
+    @param repeticiones: Corridas por motor y tamaño (con semillas fijas)
+    @return: Un diccionario nombre de la prueba -> segundos promedio
+             (también se guardan el porcentaje de éxito, las
+             generaciones y los estados evaluados promedio, que no se
+             comparan como tiempos)
+    """
+    resultados = {}
+    for n_reinas in tamanos:
+        n_poblacion, n_generaciones, prob_muta = PARAMETROS_MACRO[n_reinas]
+        semillas = genetico.semillas_derivadas(semilla + n_reinas,
+                                               2 * repeticiones)
+        for (nombre, motor) in MOTORES.items():
+            tiempo, exitos, generaciones, evaluaciones = 0.0, 0, 0, 0
+            for r in range(repeticiones):
+                problema = ProblemaContado(n_reinas, semillas[2 * r])
+                algoritmo = motor(problema, n_poblacion, prob_muta,
+                                  aleatorio=semillas[2 * r + 1])
+                t_inicial = perf_counter()
+                estado = algoritmo.busqueda(n_generaciones, costo_objetivo=0)
+                tiempo += perf_counter() - t_inicial
+                evaluaciones += problema.evaluaciones
+                exitos += ProblemaNreinas(n_reinas).costo(estado) == 0
+                generaciones += algoritmo.paro[1]
+            prueba = '{}.reinas_{}'.format(nombre, n_reinas)
+            resultados[prueba] = tiempo / repeticiones
+            resultados[prueba + '.exito'] = exitos / repeticiones
+            resultados[prueba + '.generaciones'] = generaciones / repeticiones
+            resultados[prueba + '.evaluaciones'] = evaluaciones / repeticiones
+    return resultados
+
+
+def aceleraciones(resultados, referencia='listas'):
+    """
+    Cuántas veces más rápido que el motor de referencia es cada motor en
+    cada micro prueba que tienen en común
+    @return: Un diccionario 'motor.prueba' -> tiempo de referencia / tiempo
+    """
+    razones = {}
+    for (prueba, tiempo) in resultados.items():
+        motor, _, nombre = prueba.partition('.')
+        base = resultados.get(referencia + '.' + nombre)
+        if (motor in MOTORES and motor != referencia and base and tiempo
+                and es_tiempo(prueba)):
+            razones[prueba] = base / tiempo
+    return razones
+
+
+def es_tiempo(prueba):
+    return not prueba.endswith(('.exito', '.generaciones', '.evaluaciones'))
+
+
+def compara(resultados, base, umbral):
+    """
+    Compara los tiempos contra una línea base
+    @param umbral: Fracción de aumento que se considera regresión
+    @return: Una lista de tuplas (prueba, base, actual, razón) con las
+             regresiones
+    """
+    regresiones = []
+    for (prueba, actual) in sorted(resultados.items()):
+        if not es_tiempo(prueba) or prueba not in base:
+            continue
+        razon = actual / base[prueba] if base[prueba] > 0 else 1.0
+        if razon > 1 + umbral:
+            regresiones.append((prueba, base[prueba], actual, razon))
+    return regresiones
+
+
+def imprime(resultados, base=None):
+    for (prueba, valor) in sorted(resultados.items()):
+        if not es_tiempo(prueba):
+            print("{:<40} {:>12.3f}".format(prueba, valor))
+            continue
+        linea = "{:<40} {:>12.6f} seg".format(prueba, valor)
+        if base is not None and base.get(prueba):
+            linea += "  ({:+.1f}% contra la base)".format(
+                100 * (valor / base[prueba] - 1))
+        print(linea)
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(
+        description="Pruebas de rendimiento del AG con las n reinas")
+    parser.add_argument('nivel', choices=('micro', 'macro', 'todo'))
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--reinas', type=int, nargs='+',
+                        default=sorted(PARAMETROS_MACRO),
+                        choices=sorted(PARAMETROS_MACRO))
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--guarda', metavar='JSON',
+                        help="guarda los resultados como línea base")
+    parser.add_argument('--compara', metavar='JSON',
+                        help="compara contra una línea base")
+    parser.add_argument('--umbral', type=float, default=0.10,
+                        help="aumento relativo que cuenta como regresión")
+    opciones = parser.parse_args(argumentos)
+
+    resultados = {}
+    if opciones.nivel in ('micro', 'todo'):
+        resultados.update(micro(opciones.semilla))
+    if opciones.nivel in ('macro', 'todo'):
+        resultados.update(macro(opciones.reinas, opciones.repeticiones,
+                                opciones.semilla))
+
+    base = None
+    if opciones.compara:
+        with open(opciones.compara) as archivo:
+            base = json.load(archivo)
+    imprime(resultados, base)
+    razones = aceleraciones(resultados)
+    if razones:
+        print("\nAceleración contra el motor de listas:")
+        for (prueba, razon) in sorted(razones.items()):
+            print("{:<40} {:>11.2f}x".format(prueba, razon))
+    if opciones.guarda:
+        with open(opciones.guarda, 'w') as archivo:
+            json.dump(resultados, archivo, indent=2, sort_keys=True)
+
+    if base is not None:
+        regresiones = compara(resultados, base, opciones.umbral)
+        for (prueba, anterior, actual, razon) in regresiones:
+            print("REGRESIÓN {}: {:.6f} -> {:.6f} seg ({:.2f}x)".format(
+                prueba, anterior, actual, razon))
+        return 1 if regresiones else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+busqueda_local.py
+-----------------
+Búsquedas locales para problemas de permutaciones: mínimos conflictos,
+recocido simulado y búsqueda tabú.
+
+Usan la misma interfaz genetico.Problema que el algoritmo genético. Los
+vecinos son los intercambios de dos posiciones y su costo se obtiene del
+evaluador incremental del problema (genetico.EvaluadorIncremental), así
+que con un problema que tenga un evaluador rápido, como las n reinas,
+cada paso cuesta O(1) en lugar de recalcular el costo completo. Si el
+evaluador sabe qué posiciones están en conflicto (en_conflicto), las
+búsquedas solo mueven esas.
+
+Todas devuelven el mejor estado encontrado, como genetico.Genetico.busqueda.
+"""
+
+import math
+import genetico
+
+__author__ = 'Raul Perez'
+
+
+def evaluador(problema, estado=None):
+    """
+    Evaluador incremental de un estado
+    @param problema: Un objeto genetico.Problema
+    @param estado: El estado inicial, si es None se usa uno aleatorio
+    @return: Un objeto genetico.EvaluadorIncremental
+    """
+    if estado is None:
+        estado = problema.estado_aleatorio()
+    fabrica = getattr(problema, 'evaluador_incremental', None)
+    if fabrica is None:
+        return genetico.EvaluadorIncremental(problema, estado)
+    return fabrica(estado)
+
+
+def siguiente_conflicto(evaluador, pendientes, aleatorio):
+    """
+    Saca de pendientes la siguiente posición que siga en conflicto. Si la
+    lista se acaba se vuelve a llenar, en orden aleatorio, con las
+    posiciones en conflicto del estado actual (una pasada de O(n)).
+    @param evaluador: Un objeto genetico.EvaluadorIncremental
+    @param pendientes: Una lista de posiciones, se modifica en su lugar
+    @param aleatorio: Un generador de números aleatorios
+    @return: Un entero, o una posición al azar si no hay conflictos
+    """
+    while True:
+        if not pendientes:
+            pendientes.extend(evaluador.conflictos())
+            if not pendientes:
+                return aleatorio.randrange(len(evaluador.estado))
+            aleatorio.shuffle(pendientes)
+        i = pendientes.pop()
+        if evaluador.en_conflicto(i):
+            return i
+
+
+def minimos_conflictos(problema, estado=None, max_pasos=None, muestras=32,
+                       costo_objetivo=0, aleatorio=None):
+    """
+    Mínimos conflictos por intercambios. En cada pasada se recorren las
+    posiciones en conflicto y cada una se intercambia con la mejor de
+    `muestras` posiciones al azar, si el costo no sube (los movimientos
+    laterales ayudan a salir de las mesetas).
+    @param problema: Un objeto genetico.Problema con estados que sean
+                     permutaciones
+    @param estado: Estado inicial (None para uno aleatorio)
+    @param max_pasos: Número máximo de posiciones a mover (por default
+                      50 veces el tamaño del estado)
+    @param muestras: Candidatos por posición en conflicto
+    @param costo_objetivo: Se detiene al llegar a este costo o menos
+    @param aleatorio: Semilla o generador (ver genetico.genera_aleatorio)
+    @return: El estado final, como tupla
+    """
+    aleatorio = genetico.genera_aleatorio(aleatorio)
+    actual = evaluador(problema, estado)
+    n = len(actual.estado)
+    max_pasos = 50 * n if max_pasos is None else max_pasos
+    randrange = aleatorio.randrange
+    pasos = 0
+    while actual.costo > costo_objetivo and pasos < max_pasos:
+        pendientes = actual.conflictos()
+        aleatorio.shuffle(pendientes)
+        for i in pendientes[:max_pasos - pasos]:
+            pasos += 1
+            if not actual.en_conflicto(i):
+                continue
+            # El costo puede no ser entero (como en el agente viajero), así
+            # que se toma el mejor candidato y se acepta si delta <= 0
+            mejor_delta, mejor_j = float('inf'), None
+            for _ in range(muestras):
+                j = randrange(n)
+                delta = actual.delta_intercambio(i, j)
+                if delta < mejor_delta:
+                    mejor_delta, mejor_j = delta, j
+                    if delta < 0:
+                        break
+            if mejor_delta <= 0:
+                actual.intercambia(i, mejor_j)
+                if actual.costo <= costo_objetivo:
+                    break
+    return tuple(actual.estado)
+
+
+def recocido_simulado(problema, estado=None, max_pasos=None,
+                      temperatura=None, temperatura_final=1e-3,
+                      costo_objetivo=0, aleatorio=None):
+    """
+    Recocido simulado con enfriamiento geométrico. En cada paso se propone
+    intercambiar una posición en conflicto con otra al azar; se acepta si
+    mejora, o con probabilidad exp(-delta / T) si no.
+    @param problema: Un objeto genetico.Problema con estados que sean
+                     permutaciones
+    @param estado: Estado inicial (None para uno aleatorio)
+    @param max_pasos: Número de pasos (por default 200 veces el tamaño
+                      del estado)
+    @param temperatura: Temperatura inicial, por default el promedio del
+                        aumento de costo de 100 intercambios al azar
+    @param temperatura_final: Fracción de la temperatura inicial a la que
+                              se llega en el último paso
+    @param costo_objetivo: Se detiene al llegar a este costo o menos
+    @param aleatorio: Semilla o generador (ver genetico.genera_aleatorio)
+    @return: El mejor estado encontrado, como tupla
+    """
+    aleatorio = genetico.genera_aleatorio(aleatorio)
+    actual = evaluador(problema, estado)
+    n = len(actual.estado)
+    max_pasos = 200 * n if max_pasos is None else max_pasos
+    if temperatura is None:
+        aumentos = [max(0, actual.delta_intercambio(aleatorio.randrange(n),
+                                                    aleatorio.randrange(n)))
+                    for _ in range(100)]
+        temperatura = sum(aumentos) / len(aumentos) or 1.0
+    enfriamiento = temperatura_final ** (1.0 / max(1, max_pasos))
+
+    # El mejor estado solo se copia justo antes de empeorar desde él
+    mejor_costo, mejor_estado, en_mejor = actual.costo, None, True
+    pendientes = []
+    for _ in range(max_pasos):
+        if actual.costo <= costo_objetivo:
+            break
+        i = siguiente_conflicto(actual, pendientes, aleatorio)
+        j = aleatorio.randrange(n)
+        delta = actual.delta_intercambio(i, j)
+        if delta > 0 and aleatorio.random() >= math.exp(-delta / temperatura):
+            temperatura *= enfriamiento
+            continue
+        if delta > 0 and en_mejor:
+            mejor_estado = tuple(actual.estado)
+        actual.intercambia(i, j)
+        if actual.costo < mejor_costo or (en_mejor and delta == 0):
+            mejor_costo, en_mejor = actual.costo, True
+        else:
+            en_mejor = False
+        temperatura *= enfriamiento
+    if en_mejor or mejor_estado is None:
+        return tuple(actual.estado)
+    return mejor_estado
+
+
+def busqueda_tabu(problema, estado=None, max_pasos=None, tenencia=10,
+                  muestras=32, costo_objetivo=0, aleatorio=None):
+    """
+    Búsqueda tabú sobre intercambios. En cada paso se toma una posición en
+    conflicto, se evalúan `muestras` intercambios de ella con posiciones
+    al azar y se hace el mejor que no sea tabú, aunque empeore. Una
+    posición que se movió es tabú durante `tenencia` pasos, salvo que el
+    movimiento lleve a un costo mejor que el mejor conocido.
+    @param problema: Un objeto genetico.Problema con estados que sean
+                     permutaciones
+    @param estado: Estado inicial (None para uno aleatorio)
+    @param max_pasos: Número de pasos (por default 20 veces el tamaño
+                      del estado)
+    @param tenencia: Pasos que una posición queda prohibida
+    @param muestras: Intercambios evaluados por paso
+    @param costo_objetivo: Se detiene al llegar a este costo o menos
+    @param aleatorio: Semilla o generador (ver genetico.genera_aleatorio)
+    @return: El mejor estado encontrado, como tupla
+    """
+    aleatorio = genetico.genera_aleatorio(aleatorio)
+    actual = evaluador(problema, estado)
+    n = len(actual.estado)
+    max_pasos = 20 * n if max_pasos is None else max_pasos
+    prohibido_hasta = [0] * n
+    pendientes = []
+
+    mejor_costo, mejor_estado, en_mejor = actual.costo, None, True
+    for paso in range(1, max_pasos + 1):
+        if actual.costo <= costo_objetivo:
+            break
+        i = siguiente_conflicto(actual, pendientes, aleatorio)
+        elegido, elegido_delta = None, None
+        for _ in range(muestras):
+            j = aleatorio.randrange(n)
+            if i == j:
+                continue
+            delta = actual.delta_intercambio(i, j)
+            tabu = prohibido_hasta[i] >= paso or prohibido_hasta[j] >= paso
+            if tabu and actual.costo + delta >= mejor_costo:
+                continue
+            if elegido is None or delta < elegido_delta:
+                elegido, elegido_delta = (i, j), delta
+        if elegido is None:
+            continue
+        if elegido_delta > 0 and en_mejor:
+            mejor_estado = tuple(actual.estado)
+        i, j = elegido
+        actual.intercambia(i, j)
+        prohibido_hasta[i] = prohibido_hasta[j] = paso + tenencia
+        if actual.costo < mejor_costo or (en_mejor and elegido_delta == 0):
+            mejor_costo, en_mejor = actual.costo, True
+        else:
+            en_mejor = False
+    if en_mejor or mejor_estado is None:
+        return tuple(actual.estado)
+    return mejor_estado
+
+
+if __name__ == "__main__":
+
+    import sys
+    from time import time
+    from genetico_nreinas import ProblemaNreinas
+
+    n_reinas = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    problema = ProblemaNreinas(n_reinas, 0)
+    busquedas = [('Mínimos conflictos', minimos_conflictos),
+                 ('Recocido simulado', recocido_simulado),
+                 ('Búsqueda tabú', busqueda_tabu)]
+    for (nombre, busqueda) in busquedas:
+        t_inicial = time()
+        solucion = busqueda(problema, aleatorio=1)
+        print("{} con {} reinas: costo {} en {:.2f} segundos".format(
+            nombre, n_reinas, problema.costo(solucion), time() - t_inicial))
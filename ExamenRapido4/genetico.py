@@ -5,15 +5,119 @@ genetico.py
 ------------
 Este modulo incluye el algoritmo genérico para algoritmos genéticos,
 así como un algoritmo genético adaptado a problemas de permutaciones,
-como el problema de las n-reinas o el agente viajero.
+como el problema de las n-reinas (genetico_nreinas.py) o el agente
+viajero (problema_tsp.py).
 """
 
+import heapq
+import numbers
+import os
+import pickle
 import random
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor
+from bisect import bisect_right
+from itertools import accumulate, chain, repeat
+from operator import itemgetter
+from time import perf_counter, time
 
 __author__ = 'Raul Perez'
 
+def genera_aleatorio(fuente=None):
+    """
+    Generador de números aleatorios a partir de lo que se inyecte
+    @param fuente: None (el módulo random global, como siempre), un entero
+                   (semilla), un random.Random o un numpy.random.Generator
+    @return: Un objeto con la interfaz de random.Random
+    """
+    if fuente is None:
+        return random
+    if isinstance(fuente, numbers.Integral):
+        return random.Random(int(fuente))
+    if hasattr(fuente, 'bit_generator'):
+        return random.Random(int(fuente.integers(2 ** 63)))
+    return fuente
+
+
+def semillas_derivadas(semilla, n_semillas):
+    """
+    Semillas independientes derivadas de una sola, para dar a cada proceso
+    (o a cada isla, o al problema y al algoritmo) su propio flujo
+    @param semilla: Un entero, o None para semillas al azar
+    @param n_semillas: Número de semillas
+    @return: Una lista de n_semillas enteros de 64 bits
+    """
+    generador = random.Random(semilla)
+    return [generador.getrandbits(64) for _ in range(n_semillas)]
+
+
+# Problemas ya deserializados en cada proceso trabajador, por clave. Se
+# guardan a lo más _MAX_PROBLEMAS y se olvidan los usados hace más tiempo,
+# para que un grupo de procesos compartido por muchos algoritmos no crezca
+# sin límite
+_PROBLEMAS_TRABAJADOR = OrderedDict()
+_MAX_PROBLEMAS = 8
+
+
+def _registra_problema(clave, datos):
+    """
+    Inicializador de los procesos trabajadores, deserializa el problema
+    una sola vez por proceso.
+    """
+    _PROBLEMAS_TRABAJADOR[clave] = pickle.loads(datos)
+    _PROBLEMAS_TRABAJADOR.move_to_end(clave)
+    while len(_PROBLEMAS_TRABAJADOR) > _MAX_PROBLEMAS:
+        _PROBLEMAS_TRABAJADOR.popitem(last=False)
+
+
+def _olvida_problema(clave):
+    """
+    Quita un problema del registro de este proceso
+    """
+    _PROBLEMAS_TRABAJADOR.pop(clave, None)
+
+
+def _costos_trozo(clave, datos, estados):
+    """
+    Calcula el costo de un trozo de estados dentro de un proceso trabajador
+    @param clave: Identificador del problema en _PROBLEMAS_TRABAJADOR
+    @param datos: El problema serializado, o None si se espera que el
+                  trabajador ya lo tenga registrado
+    @param estados: Una secuencia de estados
+    @return: Una lista con el costo de cada estado, o None si datos es None
+             y el trabajador no tiene el problema (hay que volver a mandar
+             el trozo con el problema serializado)
+    """
+    problema = _PROBLEMAS_TRABAJADOR.get(clave)
+    if problema is None:
+        if datos is None:
+            return None
+        _registra_problema(clave, datos)
+        problema = _PROBLEMAS_TRABAJADOR[clave]
+    else:
+        _PROBLEMAS_TRABAJADOR.move_to_end(clave)
+    costo_lote = getattr(problema, 'costo_lote', None)
+    if costo_lote is None:
+        return [problema.costo(tuple(estado)) for estado in estados]
+    return [float(costo) for costo in costo_lote(estados)]
+
 
 class Problema:
+    # Generador de números aleatorios del problema, los problemas pueden
+    # recibir uno propio (ver genera_aleatorio) para ser reproducibles
+    aleatorio = random
+
+    def __getstate__(self):
+        """
+        El módulo random no se puede serializar, si es el generador se
+        omite y al deserializar queda el atributo de la clase
+        """
+        estado = self.__dict__.copy()
+        if estado.get('aleatorio') is random:
+            del estado['aleatorio']
+        return estado
+
     def estado_aleatorio(self):
         """
         Devuelve un estado aleatorio con distribución uniforme
@@ -30,14 +134,233 @@ class Problema:
         """
         raise NotImplementedError("Falta desarrollar el método")
 
+    def costo_lote(self, estados):
+        """
+        Calcula el costo de muchos estados a la vez
+        @param estados: Un arreglo de dos dimensiones (o una lista de tuplas)
+                        con un estado por renglón
+        @return: Una secuencia con el costo de cada estado
+        Por default llama a costo con cada estado, los problemas pueden
+        redefinirlo para evaluar toda la población en una sola llamada.
+        """
+        return [self.costo(tuple(estado)) for estado in estados]
+
+    def evaluador_incremental(self, estado):
+        """
+        Devuelve un objeto que mantiene un estado y su costo, y que permite
+        conocer el cambio de costo al intercambiar dos posiciones sin
+        recalcularlo todo (ver EvaluadorIncremental).
+        @param estado: Una tupla con un estado válido
+        @return: Un objeto de la clase EvaluadorIncremental
+        Por default usa la versión genérica, que recalcula el costo completo.
+        """
+        return EvaluadorIncremental(self, estado)
+
+
+class EvaluadorIncremental:
+    """
+    Estado mutable con su costo, para movimientos por intercambio.
+    Esta versión genérica funciona con cualquier problema pero recalcula
+    el costo completo, los problemas pueden dar versiones más rápidas.
+    """
+    def __init__(self, problema, estado):
+        """
+        @param problema: Objeto de la clase Problema
+        @param estado: Una tupla con un estado válido
+        """
+        self.problema = problema
+        self.estado = list(estado)
+        self.costo = problema.costo(tuple(self.estado))
+
+    def delta_intercambio(self, i, j):
+        """
+        Cambio en el costo si se intercambian las posiciones i y j
+        @param i: Entero, una posición del estado
+        @param j: Entero, otra posición del estado
+        @return: Un número con costo(nuevo estado) - costo(estado actual)
+        """
+        estado = self.estado
+        estado[i], estado[j] = estado[j], estado[i]
+        costo = self.problema.costo(tuple(estado))
+        estado[i], estado[j] = estado[j], estado[i]
+        return costo - self.costo
+
+    def intercambia(self, i, j):
+        """
+        Intercambia las posiciones i y j y actualiza el costo
+        @param i: Entero, una posición del estado
+        @param j: Entero, otra posición del estado
+        @return: El nuevo costo del estado
+        """
+        self.costo += self.delta_intercambio(i, j)
+        self.estado[i], self.estado[j] = self.estado[j], self.estado[i]
+        return self.costo
+
+    def en_conflicto(self, i):
+        """
+        Indica si vale la pena mover la posición i (por ejemplo, si la
+        reina del renglón i ataca a otra). La versión genérica no lo sabe
+        y siempre dice que sí.
+        @param i: Entero, una posición del estado
+        @return: True o False
+        """
+        return True
+
+    def conflictos(self):
+        """
+        @return: Una lista con las posiciones que están en conflicto
+        """
+        return [i for i in range(len(self.estado)) if self.en_conflicto(i)]
+
+
+class CacheAptitud:
+    """
+    Caché de aptitudes de tamaño acotado, desaloja al usado hace más tiempo
+    (LRU). Sirve cuando el costo es caro y la población ya convergió, pues
+    muchos hijos son copias de individuos que ya se evaluaron.
+    """
+    def __init__(self, tamano=10000):
+        """
+        @param tamano: Número máximo de aptitudes guardadas
+        """
+        if tamano < 1:
+            raise ValueError("El tamaño de la caché debe ser positivo")
+        self.tamano = tamano
+        self.datos = OrderedDict()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def __len__(self):
+        return len(self.datos)
+
+    def busca(self, clave):
+        """
+        @param clave: La clave de un individuo (ver Genetico.clave_cache)
+        @return: La aptitud guardada, o None si no está
+        """
+        aptitud = self.datos.get(clave)
+        if aptitud is None:
+            self.fallos += 1
+        else:
+            self.aciertos += 1
+            self.datos.move_to_end(clave)
+        return aptitud
+
+    def guarda(self, clave, aptitud):
+        """
+        Guarda una aptitud, desalojando la más vieja si la caché está llena
+        """
+        self.datos[clave] = aptitud
+        self.datos.move_to_end(clave)
+        if len(self.datos) > self.tamano:
+            self.datos.popitem(last=False)
+
+    def tasa_aciertos(self):
+        """
+        @return: La fracción de búsquedas que encontraron la aptitud
+        """
+        total = self.aciertos + self.fallos
+        return self.aciertos / total if total else 0.0
+
+    def limpia(self):
+        """
+        Vacía la caché y reinicia los contadores
+        """
+        self.datos.clear()
+        self.aciertos = self.fallos = 0
+
+
+class CriterioParo:
+    """
+    Criterio de paro para Genetico.busqueda. Cualquier función
+    f(genetico, generacion) -> bool sirve como criterio, esta clase solo
+    agrega un nombre y el método inicia, que se llama al empezar la búsqueda.
+    """
+    nombre = 'criterio'
+
+    def inicia(self, genetico):
+        pass
+
+    def __call__(self, genetico, generacion):
+        """
+        @param genetico: El objeto Genetico que está buscando
+        @param generacion: Número de generaciones simuladas hasta ahora
+        @return: True si hay que detener la búsqueda
+        """
+        raise NotImplementedError("Falta desarrollar el criterio")
+
+
+class CostoObjetivo(CriterioParo):
+    """
+    Se detiene cuando el mejor estado tiene un costo menor o igual al
+    objetivo. El costo solo se calcula cuando cambia el mejor individuo.
+    """
+    nombre = 'costo_objetivo'
+
+    def __init__(self, costo):
+        self.costo = costo
+
+    def inicia(self, genetico):
+        self._aptitud = None
+        self._alcanzado = False
+
+    def __call__(self, genetico, generacion):
+        aptitud, cadena = genetico.mejor
+        if aptitud != self._aptitud:
+            self._aptitud = aptitud
+            estado = genetico.cadena_a_estado(cadena)
+            self._alcanzado = genetico.problema.costo(estado) <= self.costo
+        return self._alcanzado
+
+
+class Estancamiento(CriterioParo):
+    """
+    Se detiene si el mejor individuo no mejora en `paciencia` generaciones
+    """
+    nombre = 'estancamiento'
+
+    def __init__(self, paciencia):
+        self.paciencia = paciencia
+
+    def inicia(self, genetico):
+        self._aptitud = genetico.mejor[0]
+        self._generacion = 0
+
+    def __call__(self, genetico, generacion):
+        if genetico.mejor[0] > self._aptitud:
+            self._aptitud = genetico.mejor[0]
+            self._generacion = generacion
+        return generacion - self._generacion >= self.paciencia
+
+
+class TiempoLimite(CriterioParo):
+    """
+    Se detiene cuando han pasado `segundos` de reloj desde que empezó
+    la búsqueda (se revisa al terminar cada generación)
+    """
+    nombre = 'tiempo_limite'
+
+    def __init__(self, segundos):
+        self.segundos = segundos
+
+    def inicia(self, genetico):
+        self._t_inicial = time()
+
+    def __call__(self, genetico, generacion):
+        return time() - self._t_inicial >= self.segundos
+
 
 class Genetico:
     """
     Clase genérica para un algoritmo genético.
     Contiene el algoritmo genético general y las clases abstractas.
     """
+    # Igual que en Problema, se usa si no se inyecta otro generador
+    aleatorio = random
 
-    def __init__(self, problema, n_poblacion):
+    def __init__(self, problema, n_poblacion, n_trabajadores=None,
+                 ejecutor=None, aleatorio=None, cache_aptitud=None,
+                 inicializa=True):
         """
         Inicialización de la clase
         @param problema: Objeto de la clase entorno.Problema el cual debe de
@@ -45,22 +368,118 @@ class Genetico:
                          `estado_aleatorio(self, x), y costo(self, x)
         @param n_poblacion: Entero, tamaño de la población, la cual se
                             mantendrá constante de una generación a otra.
+        @param n_trabajadores: Si se da, la adaptación se calcula en un
+                               grupo de n_trabajadores procesos (el problema
+                               debe poder serializarse con pickle)
+        @param ejecutor: Un concurrent.futures.Executor propio para calcular
+                         la adaptación, en lugar de n_trabajadores
+        @param aleatorio: Semilla o generador de números aleatorios del
+                          algoritmo (ver genera_aleatorio). Para repetir una
+                          corrida hay que fijar también el del problema.
+        @param cache_aptitud: Si se da, las aptitudes se guardan en una
+                              CacheAptitud de ese tamaño (o en el objeto
+                              CacheAptitud que se pase) y los individuos
+                              repetidos no se vuelven a evaluar
+        @param inicializa: False para no generar la población todavía (hay
+                           que llamar después a inicializa_poblacion)
         """
         self.problema = problema
-        self.inicializa_poblacion(n_poblacion)
+        self.observadores = []
+        if cache_aptitud is None or isinstance(cache_aptitud, CacheAptitud):
+            self.cache = cache_aptitud
+        else:
+            self.cache = CacheAptitud(cache_aptitud)
+        self.inicializa_aleatorio(aleatorio)
+        self.inicializa_ejecutor(n_trabajadores, ejecutor)
+        self.n_poblacion = n_poblacion
+        if inicializa:
+            self.inicializa_poblacion(n_poblacion)
+
+    def inicializa_aleatorio(self, aleatorio):
+        """
+        Guarda en self.aleatorio el generador de números aleatorios
+        @param aleatorio: Lo que acepta genera_aleatorio
+        """
+        self.aleatorio = genera_aleatorio(aleatorio)
+
+    def inicializa_ejecutor(self, n_trabajadores=None, ejecutor=None):
+        """
+        Prepara la evaluación en paralelo de la adaptación. El problema se
+        serializa una sola vez y cada proceso lo deserializa una sola vez.
+        @param n_trabajadores: Número de procesos, o None
+        @param ejecutor: Un concurrent.futures.Executor, o None
+        @return: None
+        Internamente guarda self.ejecutor (None si no hay paralelismo)
+        """
+        self.ejecutor = None
+        self._ejecutor_propio = False
+        if ejecutor is None and n_trabajadores is None:
+            return
+        if ejecutor is not None and not isinstance(ejecutor, Executor):
+            raise TypeError("El ejecutor debe ser un "
+                            "concurrent.futures.Executor")
+        self._clave_problema = uuid.uuid4().hex
+        self._problema_serializado = pickle.dumps(self.problema)
+        if ejecutor is None:
+            ejecutor = ProcessPoolExecutor(
+                n_trabajadores, initializer=_registra_problema,
+                initargs=(self._clave_problema, self._problema_serializado))
+            self._ejecutor_propio = True
+        self.ejecutor = ejecutor
+        self.n_trabajadores = (n_trabajadores or
+                               getattr(ejecutor, '_max_workers', None) or
+                               os.cpu_count())
+
+    def agrega_observador(self, observador):
+        """
+        Agrega un observador de la búsqueda (ver instrumentacion.py), un
+        objeto con los métodos inicia(genetico), generacion(genetico,
+        generacion, tiempos) y termina(genetico)
+        """
+        self.observadores.append(observador)
+
+    def cierra(self):
+        """
+        Termina el grupo de procesos si lo creó el propio algoritmo. Con
+        un ejecutor externo el problema se olvida en este proceso (los
+        ejecutores de hilos comparten el registro); en otros procesos lo
+        acaban olvidando por el límite de _MAX_PROBLEMAS.
+        """
+        if self._ejecutor_propio:
+            self.ejecutor.shutdown()
+        elif self.ejecutor is not None:
+            _olvida_problema(self._clave_problema)
+        self.ejecutor = None
+        self._ejecutor_propio = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excepcion):
+        self.cierra()
+
+    def __getstate__(self):
+        estado = self.__dict__.copy()
+        estado['ejecutor'] = None
+        estado['_ejecutor_propio'] = False
+        if estado.get('aleatorio') is random:
+            del estado['aleatorio']
+        return estado
 
     def inicializa_poblacion(self, n_poblacion):
         """
         Inicializa la población para el algoritmo genético
         @param n_poblacion: numero de población
         @return: None
-        Internamente guarda self.npoblacion y self.poblacion
+        Internamente guarda self.npoblacion, self.poblacion y self.mejor
+        (la tupla (aptitud, cadena) del más apto encontrado)
         """
         self.n_poblacion = n_poblacion
         individuos = [self.estado_a_cadena(self.problema.estado_aleatorio())
                       for _ in range(n_poblacion)]
-        self.poblacion = [(self.adaptacion(individuo), individuo)
-                          for individuo in individuos]
+        self.poblacion = list(zip(self.adaptacion_lote(individuos),
+                                  individuos))
+        self.mejor = max(self.poblacion, key=itemgetter(0))
 
     @staticmethod
     def estado_a_cadena(estado):
@@ -82,6 +501,14 @@ class Genetico:
         """
         return tuple(cadena)
 
+    def clave_cache(self, individuo):
+        """
+        Clave con la que se guarda la aptitud de un individuo en la caché
+        @param individuo: Una lista de cromosomas
+        @return: Un objeto inmutable, por default el estado
+        """
+        return self.cadena_a_estado(individuo)
+
     def adaptacion(self, individuo):
         """
         Calcula la adaptación de un individuo al medio, mientras más adaptado
@@ -90,21 +517,198 @@ class Genetico:
         @return un número con la adaptación del individuo
         Por default usa 1 / (costo(estado) + 1)
         """
-        return 1 / (1.0 + self.problema.costo(self.cadena_a_estado(individuo)))
+        if self.cache is None:
+            return 1 / (1.0 + self.problema.costo(
+                self.cadena_a_estado(individuo)))
+        clave = self.clave_cache(individuo)
+        aptitud = self.cache.busca(clave)
+        if aptitud is None:
+            aptitud = 1 / (1.0 + self.problema.costo(
+                self.cadena_a_estado(individuo)))
+            self.cache.guarda(clave, aptitud)
+        return aptitud
+
+    def _adaptacion_redefinida(self):
+        """
+        @return: True si adaptacion está redefinida en una clase más abajo
+                 en la jerarquía que la última que define evalua_lote o
+                 adaptacion_lote, es decir, si la evaluación por lotes no
+                 sabe de esa redefinición
+        """
+        def definido_en(*nombres):
+            return next(clase for clase in type(self).__mro__
+                        if any(nombre in vars(clase) for nombre in nombres))
+
+        clase = definido_en('adaptacion')
+        lote = definido_en('evalua_lote', 'adaptacion_lote')
+        return clase is not lote and issubclass(clase, lote)
+
+    def adaptacion_lote(self, individuos):
+        """
+        Calcula la adaptación de una lista de individuos
+        @param individuos: Una lista de listas de cromosomas
+        @return: Una lista con la adaptación de cada individuo
+        Si hay caché solo se evalúan (con evalua_lote) los individuos que
+        no están en ella, y cada individuo repetido en el lote una sola vez.
+        """
+        if self.cache is None:
+            return self.evalua_lote(individuos)
+        claves = [self.clave_cache(individuo) for individuo in individuos]
+        aptitudes = [self.cache.busca(clave) for clave in claves]
+        faltantes = {}
+        for (k, clave) in enumerate(claves):
+            if aptitudes[k] is None:
+                faltantes.setdefault(clave, k)
+        if faltantes:
+            nuevas = dict(zip(faltantes, map(float, self.evalua_lote(
+                [individuos[k] for k in faltantes.values()]))))
+            # Se llenan antes de guardarlas: si el lote tiene más faltantes
+            # que el tamaño de la caché, las primeras ya se desalojaron
+            for (k, clave) in enumerate(claves):
+                if aptitudes[k] is None:
+                    aptitudes[k] = nuevas[clave]
+            for (clave, aptitud) in nuevas.items():
+                self.cache.guarda(clave, aptitud)
+        return aptitudes
+
+    def evalua_lote(self, individuos):
+        """
+        Calcula la adaptación de una lista de individuos sin usar la caché
+        @param individuos: Una lista de listas de cromosomas
+        @return: Una lista con la adaptación de cada individuo
+        Si el problema tiene costo_lote se evalúan todos en una sola
+        llamada, si no se usa el costo de cada uno. Si una subclase
+        redefine adaptacion sin redefinir este método (o adaptacion_lote)
+        se usa su adaptacion con cada individuo.
+        """
+        if self._adaptacion_redefinida():
+            return [self.adaptacion(individuo) for individuo in individuos]
+        costo_lote = getattr(self.problema, 'costo_lote', None)
+        if costo_lote is None and self.ejecutor is None:
+            return [1 / (1.0 + self.problema.costo(
+                self.cadena_a_estado(individuo))) for individuo in individuos]
+        estados = [self.cadena_a_estado(individuo)
+                   for individuo in individuos]
+        if self.ejecutor is not None:
+            costos = self.costos_en_paralelo(estados)
+        else:
+            costos = costo_lote(estados)
+        return [1 / (1.0 + float(costo)) for costo in costos]
 
-    def busqueda(self, n_generaciones=30):
+    def costos_en_paralelo(self, estados):
+        """
+        Calcula el costo de los estados repartiéndolos por trozos entre
+        los procesos de self.ejecutor. El orden de los resultados es el
+        mismo que el de los estados, por lo que no afecta la semilla.
+        Con cada trozo solo va la clave del problema; los trozos que caen
+        en un trabajador que todavía no lo tiene (uno de un ejecutor
+        externo, o que ya lo olvidó) se vuelven a mandar con el problema
+        serializado, y ese trabajador lo registra.
+        @param estados: Una secuencia de estados (lista o ndarray)
+        @return: Una lista con el costo de cada estado
+        """
+        tamano = max(1, -(-len(estados) // (4 * self.n_trabajadores)))
+        trozos = [estados[k:k + tamano]
+                  for k in range(0, len(estados), tamano)]
+        resultados = list(self.ejecutor.map(_costos_trozo,
+                                            repeat(self._clave_problema),
+                                            repeat(None), trozos))
+        faltantes = [k for (k, costos) in enumerate(resultados)
+                     if costos is None]
+        if faltantes:
+            reenviados = self.ejecutor.map(_costos_trozo,
+                                           repeat(self._clave_problema),
+                                           repeat(self._problema_serializado),
+                                           [trozos[k] for k in faltantes])
+            for (k, costos) in zip(faltantes, reenviados):
+                resultados[k] = costos
+        return list(chain.from_iterable(resultados))
+
+    def busqueda(self, n_generaciones=30, costo_objetivo=None,
+                 paciencia=None, tiempo_limite=None, criterios=()):
         """
         Algoritmo genético general
-        @param n_generaciones: Número de generaciones a simular
+        @param n_generaciones: Número máximo de generaciones a simular
+        @param costo_objetivo: Se detiene al encontrar un estado con este
+                               costo o menor (None para no usarlo)
+        @param paciencia: Se detiene si el mejor no mejora en este número
+                          de generaciones (None para no usarlo)
+        @param tiempo_limite: Se detiene después de estos segundos de reloj
+                              (None para no usarlo)
+        @param criterios: Otros criterios de paro, funciones
+                          f(genetico, generacion) -> bool u objetos
+                          CriterioParo
         @return: Un estado del problema
+        Al terminar, self.paro es una tupla (nombre del criterio que detuvo
+        la búsqueda, número de generaciones simuladas); el nombre es
+        'generaciones' si se simularon todas.
         """
-        for _ in range(n_generaciones):
+        criterios = list(criterios)
+        if costo_objetivo is not None:
+            criterios.append(CostoObjetivo(costo_objetivo))
+        if paciencia is not None:
+            criterios.append(Estancamiento(paciencia))
+        if tiempo_limite is not None:
+            criterios.append(TiempoLimite(tiempo_limite))
+        for criterio in criterios:
+            if hasattr(criterio, 'inicia'):
+                criterio.inicia(self)
+        for observador in self.observadores:
+            observador.inicia(self)
+
+        generacion = 0
+        while True:
+            motivo = next((getattr(criterio, 'nombre', None) or
+                           getattr(criterio, '__name__', repr(criterio))
+                           for criterio in criterios
+                           if criterio(self, generacion)), None)
+            if motivo is None and generacion >= n_generaciones:
+                motivo = 'generaciones'
+            if motivo is not None:
+                break
+            generacion += 1
+            if self.observadores:
+                self.generacion_medida(generacion)
+                continue
             indices_parejas = self.seleccion()    # Selección
             hijos = self.cruza(indices_parejas)   # Cruza
             self.mutacion(hijos)                  # Mutación
             self.reemplazo_generacional(hijos)    # Reemplazo generacional
-        mas_apto = max(self.poblacion)
-        return self.cadena_a_estado(mas_apto[1])
+        self.paro = (motivo, generacion)
+        for observador in self.observadores:
+            observador.termina(self)
+        return self.cadena_a_estado(self.mejor[1])
+
+    def generacion_medida(self, generacion):
+        """
+        Simula una generación midiendo el tiempo de cada fase y avisa a
+        los observadores. Solo se usa si hay observadores.
+        @param generacion: Número de la generación que se simula
+        """
+        t_0 = perf_counter()
+        indices_parejas = self.seleccion()
+        t_1 = perf_counter()
+        hijos = self.cruza(indices_parejas)
+        t_2 = perf_counter()
+        self.mutacion(hijos)
+        t_3 = perf_counter()
+        self.reemplazo_generacional(hijos)
+        t_4 = perf_counter()
+        tiempos = {'seleccion': t_1 - t_0, 'cruza': t_2 - t_1,
+                   'mutacion': t_3 - t_2, 'reemplazo': t_4 - t_3}
+        for observador in self.observadores:
+            observador.generacion(self, generacion, tiempos)
+
+    def estadisticas(self):
+        """
+        Métricas de la población actual
+        @return: Una tupla (mejor aptitud, aptitud media, diversidad), donde
+                 la diversidad es la fracción de individuos distintos
+        """
+        aptitudes = [aptitud for (aptitud, _) in self.poblacion]
+        distintos = len({tuple(cadena) for (_, cadena) in self.poblacion})
+        return (self.mejor[0], sum(aptitudes) / len(aptitudes),
+                distintos / len(aptitudes))
 
     def seleccion(self):
         """
@@ -150,27 +754,95 @@ class Genetico:
         @return: None (todo lo cambia internamente)
         Por default usamos solo el elitismo de conservar al mejor, solo si es
         mejor que lo que hemos encontrado hasta el momento.
+        Si hay tantos hijos como población, basta con cambiar al peor hijo
+        por self.mejor cuando este es mejor, sin ordenar nada; si no, se
+        escogen los más aptos con heapq.nlargest.
+        """
+        # La lista nueva se deja a propósito: llenar en su lugar una lista
+        # guardada (reserva[:] = zip(...)) arma de todos modos una
+        # secuencia temporal y sale más lento, y lo que cuesta son las
+        # tuplas. Los arreglos preasignados están en genetico_vectorizado.
+        reemplazo = list(zip(self.adaptacion_lote(individuos), individuos))
+        if len(reemplazo) != self.n_poblacion:
+            reemplazo.append(self.mejor)
+            self.poblacion = heapq.nlargest(self.n_poblacion, reemplazo,
+                                            key=itemgetter(0))
+            self.mejor = self.poblacion[0]
+            return
+        i_peor = i_mejor = 0
+        for (i, (aptitud, _)) in enumerate(reemplazo):
+            if aptitud < reemplazo[i_peor][0]:
+                i_peor = i
+            elif aptitud > reemplazo[i_mejor][0]:
+                i_mejor = i
+        if reemplazo[i_peor][0] < self.mejor[0]:
+            reemplazo[i_peor] = self.mejor
+        if reemplazo[i_mejor][0] > self.mejor[0]:
+            self.mejor = reemplazo[i_mejor]
+        self.poblacion = reemplazo
+
+    def emigrantes(self, n_emigrantes):
+        """
+        Estados de los mejores individuos, para enviarlos a otra población
+        @param n_emigrantes: Número de individuos a enviar
+        @return: Una lista con los estados de los n_emigrantes más aptos
+        """
+        mejores = heapq.nlargest(n_emigrantes, self.poblacion,
+                                 key=itemgetter(0))
+        return [self.cadena_a_estado(cadena) for (_, cadena) in mejores]
+
+    def inmigra(self, estados):
+        """
+        Incorpora individuos de otra población en lugar de los peores
+        @param estados: Una lista de estados
+        @return: None (todo lo cambia internamente)
         """
-        reemplazo = [(self.adaptacion(individuo), individuo)
-                     for individuo in individuos]
-        reemplazo.append(max(self.poblacion))
-        reemplazo.sort(reverse=True)
-        self.poblacion = reemplazo[:self.n_poblacion]
+        if not estados:
+            return
+        cadenas = [self.estado_a_cadena(estado) for estado in estados]
+        self.poblacion.sort(key=itemgetter(0), reverse=True)
+        self.poblacion[-len(cadenas):] = zip(self.adaptacion_lote(cadenas),
+                                             cadenas)
+        self.mejor = max([self.mejor] + self.poblacion[-len(cadenas):],
+                         key=itemgetter(0))
 
 
 class GeneticoPermutaciones(Genetico):
     """
     Clase con un algoritmo genético adaptado a problemas de permutaciones
     """
-    def __init__(self, problema, n_poblacion, prob_muta=0.01):
+    def __init__(self, problema, n_poblacion, prob_muta=0.01,
+                 modo_seleccion='ruleta', operador_cruza='pmx',
+                 n_trabajadores=None, ejecutor=None, aleatorio=None,
+                 cache_aptitud=None, pasos_locales=0, inicializa=True):
         """
         @param prob_muta : Probabilidad de mutación de un cromosoma
                            (0.01 por defualt)
+        @param modo_seleccion: 'ruleta' (una tirada por progenitor) o
+                               'universal' (muestreo estocástico universal,
+                               todas las parejas en una sola pasada)
+        @param operador_cruza: 'pmx' (cruza parcialmente mapeada, la
+                               original), 'ox' (cruza de orden) o 'cx'
+                               (cruza por ciclos)
+        @param pasos_locales: Si es mayor que 0 el algoritmo es memético:
+                              después de la mutación cada hijo se mejora
+                              con este número de pasos de búsqueda local
+                              (ver mejora_local)
         """
+        if modo_seleccion not in ('ruleta', 'universal'):
+            raise ValueError("Modo de selección desconocido: {}".format(
+                modo_seleccion))
+        if operador_cruza not in ('pmx', 'ox', 'cx'):
+            raise ValueError("Operador de cruza desconocido: {}".format(
+                operador_cruza))
         self.prob_muta = prob_muta
+        self.modo_seleccion = modo_seleccion
+        self.operador_cruza = operador_cruza
+        self.pasos_locales = pasos_locales
         self.nombre = ('propuesto por Julio Waissman' +
                        'con prob. de mutación ' + str(prob_muta))
-        super().__init__(problema, n_poblacion)
+        super().__init__(problema, n_poblacion, n_trabajadores, ejecutor,
+                         aleatorio, cache_aptitud, inicializa)
 
     @staticmethod
     def ruleta(poblacion):
@@ -180,49 +852,159 @@ class GeneticoPermutaciones(Genetico):
         @param población: Una lista de  tuplas (aptitud, individuo)
         @return: El indice del individuo seleccionado por ruleta
         """
-        aleatorio = random.random()
-        acumulado = 0
-        suma_aptitudes = 1.0 * sum([x[0] for x in poblacion])
-        for (i, (aptitud, _)) in enumerate(poblacion):
-            acumulado += aptitud / suma_aptitudes
-            if aleatorio <= acumulado:
-                return i
-        raise ValueError("No debe pasar esto")
+        return GeneticoPermutaciones.ruleta_acumulada(
+            list(accumulate(aptitud for (aptitud, _) in poblacion)))
+
+    @staticmethod
+    def ruleta_acumulada(acumulado, excluido=None, aleatorio=random):
+        """
+        Ruleta por búsqueda binaria sobre las aptitudes acumuladas
+        @param acumulado: Una lista con la suma acumulada de las aptitudes
+        @param excluido: Índice que no puede salir (su aptitud se quita de
+                         la ruleta sin copiar nada), o None
+        @param aleatorio: Generador de números aleatorios
+        @return: El indice del individuo seleccionado por ruleta
+        """
+        ultimo = len(acumulado) - 1
+        total = acumulado[-1]
+        if excluido is None:
+            return min(bisect_right(acumulado, aleatorio.random() * total),
+                       ultimo)
+        anterior = acumulado[excluido - 1] if excluido > 0 else 0.0
+        ancho = acumulado[excluido] - anterior
+        tiro = aleatorio.random() * (total - ancho)
+        if tiro >= anterior:
+            tiro += ancho
+        i = min(bisect_right(acumulado, tiro), ultimo)
+        # Por redondeo puede caer justo en el borde del excluido
+        return i if i != excluido else (i + 1) % len(acumulado)
 
-    def seleccion_individual(self):
+    def seleccion_individual(self, acumulado=None):
         """
         Realiza una única pareja por medio de la ruleta
+        @param acumulado: Las aptitudes acumuladas de la población, si no
+                          se dan se calculan
         @return: Una tupla con los pares a unirse
         """
-        i = self.ruleta(self.poblacion)
-        j = self.ruleta(self.poblacion[:i] + self.poblacion[i+1:])
-        return i, j if j < i else j+1
+        if acumulado is None:
+            acumulado = list(accumulate(aptitud
+                                        for (aptitud, _) in self.poblacion))
+        i = self.ruleta_acumulada(acumulado, aleatorio=self.aleatorio)
+        return i, self.ruleta_acumulada(acumulado, i, self.aleatorio)
+
+    def seleccion_universal(self, acumulado):
+        """
+        Muestreo estocástico universal: 2 * n_poblacion punteros igualmente
+        espaciados recorren la ruleta una sola vez, y se revuelven para
+        formar las parejas. Si una pareja repite individuo, el segundo se
+        vuelve a escoger por ruleta.
+        @param acumulado: Las aptitudes acumuladas de la población
+        @return: Una lista con pares de indices
+        """
+        n_punteros = 2 * self.n_poblacion
+        paso = acumulado[-1] / n_punteros
+        puntero = self.aleatorio.random() * paso
+        ultimo = len(acumulado) - 1
+        elegidos, i = [], 0
+        for _ in range(n_punteros):
+            while i < ultimo and acumulado[i] <= puntero:
+                i += 1
+            elegidos.append(i)
+            puntero += paso
+        self.aleatorio.shuffle(elegidos)
+        parejas = []
+        for k in range(0, n_punteros, 2):
+            i, j = elegidos[k], elegidos[k + 1]
+            if i == j:
+                j = self.ruleta_acumulada(acumulado, i, self.aleatorio)
+            parejas.append((i, j))
+        return parejas
 
     def seleccion(self):
         """
-        Selección por ruleta.
+        Selección por ruleta (o por muestreo universal). Las aptitudes
+        acumuladas se calculan una sola vez por generación.
         """
-        return [self.seleccion_individual()
+        acumulado = list(accumulate(aptitud
+                                    for (aptitud, _) in self.poblacion))
+        if self.modo_seleccion == 'universal':
+            return self.seleccion_universal(acumulado)
+        return [self.seleccion_individual(acumulado)
                 for _ in range(self.n_poblacion)]
 
     def cruza_individual(self, cadena1, cadena2):
         """
-        Cruza especial para problemas de permutaciones
+        Cruza especial para problemas de permutaciones, con el operador
+        escogido en self.operador_cruza. Todos devuelven una permutación
+        válida de los valores de los progenitores.
         @param cadena1: Una tupla con un individuo
         @param cadena2: Una tupla con otro individuo
         @return: Un individuo
         """
+        if self.operador_cruza == 'ox':
+            return self.cruza_orden(cadena1, cadena2, self.aleatorio)
+        if self.operador_cruza == 'cx':
+            return self.cruza_ciclos(cadena1, cadena2, self.aleatorio)
+        return self.cruza_pmx(cadena1, cadena2, self.aleatorio)
+
+    @staticmethod
+    def cruza_pmx(cadena1, cadena2, aleatorio=random):
+        """
+        Cruza parcialmente mapeada. El hijo es cadena1 con el segmento
+        [corte1, corte2) tomado de cadena2; si un valor del segmento ya
+        está fuera de él en cadena1, se sigue el mapeo hasta uno libre.
+        Con las posiciones inversas de cadena1 en un diccionario, el que un
+        valor esté fuera del segmento es una comparación, y cada cadena de
+        mapeo se recorre una sola vez, así que el hijo se hace en O(n).
+        """
         hijo = cadena1[:]
         len_cadena = len(hijo)
-        corte1 = random.randint(0, len_cadena - 1)
-        corte2 = random.randint(corte1 + 1, len_cadena)
-        evita = hijo[:corte1] + hijo[corte2:]
+        corte1 = aleatorio.randint(0, len_cadena - 1)
+        corte2 = aleatorio.randint(corte1 + 1, len_cadena)
+        posicion = {valor: i for (i, valor) in enumerate(cadena1)}
         for i in range(corte1, corte2):
-            hijo[i] = cadena2[i]
-            while hijo[i] in evita:
-                hijo[i] = cadena2[cadena1.index(hijo[i])]
+            valor = cadena2[i]
+            k = posicion[valor]
+            while k < corte1 or k >= corte2:
+                valor = cadena2[k]
+                k = posicion[valor]
+            hijo[i] = valor
         return hijo
 
+    @staticmethod
+    def cruza_orden(cadena1, cadena2, aleatorio=random):
+        """
+        Cruza de orden (OX). El hijo conserva el segmento [corte1, corte2)
+        de cadena1, y el resto se llena con los valores faltantes en el
+        orden en que aparecen en cadena2 a partir de corte2.
+        """
+        len_cadena = len(cadena1)
+        corte1 = aleatorio.randint(0, len_cadena - 1)
+        corte2 = aleatorio.randint(corte1 + 1, len_cadena)
+        segmento = cadena1[corte1:corte2]
+        en_segmento = set(segmento)
+        resto = [valor for valor in chain(cadena2[corte2:], cadena2[:corte2])
+                 if valor not in en_segmento]
+        cola = len_cadena - corte2
+        return resto[cola:] + segmento + resto[:cola]
+
+    @staticmethod
+    def cruza_ciclos(cadena1, cadena2, aleatorio=random):
+        """
+        Cruza por ciclos (CX). El hijo toma de cadena1 las posiciones de
+        un ciclo que empieza en una posición al azar, y de cadena2 todas
+        las demás, así cada valor queda en la posición que tenía en alguno
+        de los progenitores.
+        """
+        hijo = cadena2[:]
+        posicion = {valor: i for (i, valor) in enumerate(cadena1)}
+        inicio = i = aleatorio.randrange(len(cadena1))
+        while True:
+            hijo[i] = cadena1[i]
+            i = posicion[cadena2[i]]
+            if i == inicio:
+                return hijo
+
     def mutacion(self, individuos):
         """
         Mutación para individus con permutaciones.
@@ -231,11 +1013,43 @@ class GeneticoPermutaciones(Genetico):
         @return: None, es efecto colateral mutando los individuos
                  en la misma lista
         """
+        aleatorio = self.aleatorio
         for individuo in individuos:
             for i in range(len(individuo)):
-                if random.random() < self.prob_muta:
-                    k = random.randint(0, len(individuo) - 1)
+                if aleatorio.random() < self.prob_muta:
+                    k = aleatorio.randint(0, len(individuo) - 1)
                     individuo[i], individuo[k] = individuo[k], individuo[i]
+        if self.pasos_locales > 0:
+            for individuo in individuos:
+                self.mejora_local(individuo)
+
+    def mejora_local(self, individuo):
+        """
+        Ascenso de colinas por intercambios, con a lo más self.pasos_locales
+        intentos. Cada intento escoge una posición en conflicto y otra al
+        azar, y las intercambia si el costo baja. Usa el evaluador
+        incremental del problema si lo tiene.
+        @param individuo: Una lista de cromosomas, se modifica en su lugar
+        @return: None
+        """
+        estado = self.cadena_a_estado(individuo)
+        evaluador = getattr(self.problema, 'evaluador_incremental', None)
+        evaluador = (evaluador(estado) if evaluador is not None
+                     else EvaluadorIncremental(self.problema, estado))
+        n = len(estado)
+        randrange = self.aleatorio.randrange
+        intentos = self.pasos_locales
+        while intentos > 0 and evaluador.costo > 0:
+            i = randrange(n)
+            if not evaluador.en_conflicto(i):
+                continue
+            intentos -= 1
+            j = randrange(n)
+            if evaluador.delta_intercambio(i, j) < 0:
+                evaluador.intercambia(i, j)
+        for (k, valor) in enumerate(self.estado_a_cadena(evaluador.estado)):
+            if individuo[k] != valor:
+                individuo[k] = valor
 
 
 class ProblemaTonto:
@@ -243,12 +1057,20 @@ class ProblemaTonto:
     Clase de problema tonto, solo para pruebas visuales
     El costo es la suma del primer y último valor
     """
-    def __init__(self, n):
+    def __init__(self, n, aleatorio=None):
         self.n = n
+        self.aleatorio = genera_aleatorio(aleatorio)
+
+    def __getstate__(self):
+        return Problema.__getstate__(self)
+
+    def __setstate__(self, estado):
+        self.__dict__.update(estado)
+        self.__dict__.setdefault('aleatorio', random)
 
     def estado_aleatorio(self):
         lista = list(range(self.n))
-        random.shuffle(lista)
+        self.aleatorio.shuffle(lista)
         return tuple(lista)
 
     def costo(self, estado):
@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+genetico_compacto.py
+--------------------
+Algoritmo genético para permutaciones con individuos compactos.
+
+Cada individuo es un objeto Individuo (con __slots__) que guarda sus genes
+en un array.array de enteros de 16 bits (o de 64 si no caben) en lugar
+de una lista, junto con su aptitud. La aptitud solo se vuelve a calcular
+si los genes cambiaron desde la última vez (bandera sucio), así que el
+estado en forma de tupla solo se construye para los individuos que hay
+que evaluar.
+
+La cruza y la mutación trabajan directamente sobre los genes (listas en
+la cruza, el array en la mutación) y no a través de Individuo.__setitem__:
+el hijo se compara una sola vez con su primer progenitor, y un individuo
+mutado se marca como sucio solo si algún intercambio cambió sus genes.
+
+Con un costo barato como el de las n reinas, una generación cuesta más o
+menos lo mismo que con GeneticoPermutaciones: lo que se ahorra son
+evaluaciones (los hijos iguales a un progenitor no se evalúan, sin
+necesidad de una caché de aptitudes), así que este motor conviene cuando
+el costo es caro. Ver las pruebas macro de benchmark_genetico.py, que
+cuentan los estados evaluados por cada motor.
+"""
+
+from array import array
+import genetico
+
+__author__ = 'Raul Perez'
+
+
+class Individuo:
+    """
+    Cadena de cromosomas compacta con su aptitud en caché. Se comporta como
+    una lista para la cruza y la mutación: len, iteración, lectura y
+    escritura por índice, y copia con [:].
+    """
+    __slots__ = ('genes', 'aptitud', 'sucio')
+
+    def __init__(self, genes, aptitud=None):
+        """
+        @param genes: Un array.array, o una secuencia de enteros
+        @param aptitud: La aptitud si ya se conoce, o None
+        """
+        if not isinstance(genes, array):
+            genes = list(genes)
+            minimo, maximo = min(genes, default=0), max(genes, default=0)
+            genes = array('H' if 0 <= minimo and maximo < 2 ** 16 else 'q',
+                          genes)
+        self.genes = genes
+        self.aptitud = aptitud
+        self.sucio = aptitud is None
+
+    def __len__(self):
+        return len(self.genes)
+
+    def __iter__(self):
+        return iter(self.genes)
+
+    def __getitem__(self, indice):
+        """
+        Con [:] devuelve una copia que conserva la aptitud, con otras
+        rebanadas devuelve una lista.
+        """
+        if isinstance(indice, slice):
+            if indice == slice(None):
+                return self.copia()
+            return self.genes[indice].tolist()
+        return self.genes[indice]
+
+    def __setitem__(self, indice, valor):
+        if self.genes[indice] != valor:
+            self.genes[indice] = valor
+            self.sucio = True
+
+    def __repr__(self):
+        return 'Individuo({})'.format(self.genes.tolist())
+
+    def copia(self):
+        copia = Individuo(array(self.genes.typecode, self.genes),
+                          self.aptitud)
+        copia.sucio = self.sucio
+        return copia
+
+    def estado(self):
+        """
+        @return: Los genes como tupla (solo se construye al pedirla)
+        """
+        return tuple(self.genes)
+
+
+class GeneticoPermutacionesCompacto(genetico.GeneticoPermutaciones):
+    """
+    genetico.GeneticoPermutaciones con individuos de la clase Individuo.
+    Un hijo que sale igual a su progenitor (algo común cuando la población
+    converge) y no se muta, conserva la aptitud y no se vuelve a evaluar.
+    """
+    def __init__(self, problema, n_poblacion, prob_muta=0.01, **opciones):
+        """
+        Los parámetros son los de genetico.GeneticoPermutaciones
+        """
+        super().__init__(problema, n_poblacion, prob_muta, **opciones)
+        self.nombre = ('con individuos compactos ' +
+                       'con prob. de mutación ' + str(prob_muta))
+
+    @staticmethod
+    def estado_a_cadena(estado):
+        return Individuo(estado)
+
+    @staticmethod
+    def cadena_a_estado(cadena):
+        if isinstance(cadena, Individuo):
+            return cadena.estado()
+        return tuple(cadena)
+
+    def cruza_individual(self, cadena1, cadena2):
+        """
+        La cruza se hace directamente sobre los genes, no a través de
+        Individuo.__setitem__: PMX y CX sobre copias de los array.array y OX
+        (que concatena listas) sobre listas. El hijo se compara una sola vez
+        con sus progenitores: si es igual a alguno hereda su aptitud.
+        """
+        genes1, genes2 = cadena1.genes, cadena2.genes
+        if self.operador_cruza == 'ox':
+            genes = array(genes1.typecode, self.cruza_orden(
+                genes1.tolist(), genes2.tolist(), self.aleatorio))
+        else:
+            genes = super().cruza_individual(genes1, genes2)
+        for padre in (cadena1, cadena2):
+            if not padre.sucio and genes == padre.genes:
+                return Individuo(genes, padre.aptitud)
+        return Individuo(genes)
+
+    def mutacion(self, individuos):
+        """
+        La misma mutación por intercambio de GeneticoPermutaciones (con los
+        mismos números aleatorios), pero intercambiando directamente en los
+        genes; el individuo se marca como sucio solo si algo cambió.
+        """
+        aleatorio, prob_muta = self.aleatorio, self.prob_muta
+        for individuo in individuos:
+            genes = individuo.genes
+            len_cadena = len(genes)
+            for i in range(len_cadena):
+                if aleatorio.random() < prob_muta:
+                    k = aleatorio.randint(0, len_cadena - 1)
+                    if genes[i] != genes[k]:
+                        genes[i], genes[k] = genes[k], genes[i]
+                        individuo.sucio = True
+        if self.pasos_locales > 0:
+            for individuo in individuos:
+                self.mejora_local(individuo)
+
+    def clave_cache(self, individuo):
+        return individuo.genes.tobytes()
+
+    def adaptacion(self, individuo):
+        if individuo.sucio:
+            individuo.aptitud = super().adaptacion(individuo)
+            individuo.sucio = False
+        return individuo.aptitud
+
+    def adaptacion_lote(self, individuos):
+        """
+        Solo evalúa (en un solo lote) a los individuos que cambiaron
+        """
+        sucios = [individuo for individuo in individuos if individuo.sucio]
+        if sucios:
+            aptitudes = super().adaptacion_lote(sucios)
+            for (individuo, aptitud) in zip(sucios, aptitudes):
+                individuo.aptitud = aptitud
+                individuo.sucio = False
+        return [individuo.aptitud for individuo in individuos]
+
+
+if __name__ == "__main__":
+
+    import sys
+    from genetico_nreinas import ProblemaNreinas, prueba_genetico
+
+    n_reinas = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    prueba_genetico(GeneticoPermutacionesCompacto(ProblemaNreinas(n_reinas),
+                                                  200, 0.005),
+                    400, verbose=True)
@@ -6,23 +6,46 @@ de las n-reinas para aprender a ajustarlos y probarlos.
 """
 
 from time import time
-from itertools import combinations
-from random import shuffle
+import numpy as np
+import barrido
 import genetico
+from instrumentacion import Registrador
 
 __author__ = 'Raul Perez'
 
 
+def contadores_diagonales(estado):
+    """
+    Cuenta cuantas reinas hay en cada diagonal del tablero
+    @param estado: Una secuencia con la columna de la reina de cada renglón
+    @return: Dos listas de 2n - 1 enteros, la ocupación de las diagonales
+             i + estado[i] y la de las diagonales i - estado[i] + n - 1
+    """
+    n = len(estado)
+    suma = [0] * (2 * n - 1)
+    resta = [0] * (2 * n - 1)
+    for (i, reina) in enumerate(estado):
+        suma[i + reina] += 1
+        resta[i - reina + n - 1] += 1
+    return suma, resta
+
+
 class ProblemaNreinas(genetico.Problema):
     """
     Las N reinas para AG
     """
-    def __init__(self, n=8):
+    def __init__(self, n=8, aleatorio=None):
+        """
+        @param n: Número de reinas
+        @param aleatorio: Semilla o generador para los estados aleatorios
+                          (ver genetico.genera_aleatorio)
+        """
         self.n = n
+        self.aleatorio = genetico.genera_aleatorio(aleatorio)
 
     def estado_aleatorio(self):
         estado = list(range(self.n))
-        shuffle(estado)
+        self.aleatorio.shuffle(estado)
         return tuple(estado)
 
     def costo(self, estado):
@@ -31,79 +54,165 @@ class ProblemaNreinas(genetico.Problema):
         @param estado: Una tupla que describe un estado
         @return: Un valor numérico, mientras más pequeño, mejor es el estado.
         """
-        return sum([1 for (i, j) in combinations(range(self.n), 2)
-                    if abs(estado[i] - estado[j]) == abs(i - j)])
+        suma, resta = contadores_diagonales(estado)
+        return sum(c * (c - 1) // 2 for c in suma + resta if c > 1)
+
+    def costo_lote(self, estados):
+        """
+        Calcula el número de conflictos de muchos estados a la vez. Cada
+        reina se asigna a su diagonal (desplazada por el número de estado)
+        y un solo bincount da la ocupación de todas las diagonales.
+        @param estados: Un arreglo de n_estados x n (o lista de tuplas)
+        @return: Un ndarray de enteros con el costo de cada estado
+        """
+        estados = np.asarray(estados)
+        n_estados, n = estados.shape
+        n_diagonales = 2 * n - 1
+        renglones = np.arange(n)
+        base = (np.arange(n_estados) * 2 * n_diagonales)[:, None]
+        diagonales = np.concatenate(
+            (base + renglones + estados,
+             base + n_diagonales + renglones - estados + n - 1), axis=1)
+        ocupacion = np.bincount(diagonales.ravel(),
+                                minlength=n_estados * 2 * n_diagonales)
+        ocupacion = ocupacion.reshape(n_estados, 2 * n_diagonales)
+        return (ocupacion * (ocupacion - 1) // 2).sum(axis=1)
+
+    def evaluador_incremental(self, estado):
+        return EvaluadorNreinas(self, estado)
+
+
+class EvaluadorNreinas(genetico.EvaluadorIncremental):
+    """
+    Evaluador incremental para las n reinas. Guarda la ocupación de cada
+    diagonal, con lo que el cambio de costo de un intercambio es O(1).
+    """
+    def __init__(self, problema, estado):
+        self.problema = problema
+        self.estado = list(estado)
+        self.suma, self.resta = contadores_diagonales(self.estado)
+        self.costo = sum(c * (c - 1) // 2
+                         for c in self.suma + self.resta if c > 1)
+
+    def _mueve(self, i, j, aplica):
+        """
+        Cambia las reinas de los renglones i y j de columna en los
+        contadores de diagonales y calcula el cambio en el costo.
+        Quitar una reina de una diagonal con c reinas elimina c - 1
+        conflictos, y ponerla en una con c reinas agrega c.
+        @param aplica: Si es False los contadores se dejan como estaban
+        @return: El cambio en el número de conflictos
+        """
+        a, b = self.estado[i], self.estado[j]
+        desplazamiento = len(self.estado) - 1
+        delta = 0
+        for (contador, viejas, nuevas) in (
+                (self.suma, (i + a, j + b), (i + b, j + a)),
+                (self.resta,
+                 (i - a + desplazamiento, j - b + desplazamiento),
+                 (i - b + desplazamiento, j - a + desplazamiento))):
+            for d in viejas:
+                contador[d] -= 1
+                delta -= contador[d]
+            for d in nuevas:
+                delta += contador[d]
+                contador[d] += 1
+            if not aplica:
+                for d in nuevas:
+                    contador[d] -= 1
+                for d in viejas:
+                    contador[d] += 1
+        return delta
+
+    def delta_intercambio(self, i, j):
+        return self._mueve(i, j, False) if i != j else 0
 
+    def intercambia(self, i, j):
+        if i != j:
+            self.costo += self._mueve(i, j, True)
+            self.estado[i], self.estado[j] = self.estado[j], self.estado[i]
+        return self.costo
 
-def prueba_genetico(algo_genetico, n_generaciones, verbose=False):
+    def en_conflicto(self, i):
+        reina = self.estado[i]
+        return (self.suma[i + reina] > 1 or
+                self.resta[i - reina + len(self.estado) - 1] > 1)
+
+
+def prueba_genetico(algo_genetico, n_generaciones, verbose=False,
+                    perfil=False):
     """
     Prueba de los algoritmos genéticos con el problema de las n reinas
     desarrollado para búsquedas locales (tarea 2).
     @param algo_genetico: objeto de la clase genetico.Genetico
     @param n_generaciones: Generaciones (iteraciones) del algortimo
     @param verbose: True si quieres desplegar informacion básica
+    @param perfil: True si quieres desplegar el tiempo de cada fase
     @return: Un estado con la solucion (una permutacion de range(n)
     """
+    if perfil:
+        registrador = Registrador()
+        algo_genetico.agrega_observador(registrador)
     t_inicial = time()
     solucion = algo_genetico.busqueda(n_generaciones)
     t_final = time()
+    if perfil:
+        algo_genetico.observadores.remove(registrador)
+        print(registrador.resumen())
     if verbose:
         print("\nUtilizando el AG: {}".format(algo_genetico.nombre))
         print("Con poblacion de dimensión {}".format(
             algo_genetico.n_poblacion))
-        print("Con {} generaciones".format(n_generaciones))
+        print("Con {} generaciones (se detuvo por: {})".format(
+            algo_genetico.paro[1], algo_genetico.paro[0]))
         print("Costo de la solución encontrada: {}".format(
             algo_genetico.problema.costo(solucion)))
         print("Tiempo de ejecución en segundos: {}".format(
             t_final - t_inicial))
+        if algo_genetico.cache is not None:
+            print("Caché de aptitudes: {} aciertos, {} fallos ({:.1%})".format(
+                algo_genetico.cache.aciertos, algo_genetico.cache.fallos,
+                algo_genetico.cache.tasa_aciertos()))
     return solucion
 
-def prueba_genetico_2():
-    n_reinas = 100 #[8, 16, 32, 64, 100]
-    n_poblacion = [150, 175]
-    generaciones = [500]
-    prob_mutacion = [0.001, 0.005]
-    repeticiones = 2
-    mejores = []
-
-    for np in n_poblacion:
-        for gen in generaciones:
-            for pm in prob_mutacion:
-                tiempo = 0
-                costo = 0
-                for r in range(repeticiones):
-                    alg_gen = genetico.GeneticoPermutaciones(ProblemaNreinas(n_reinas), np, pm)
-                    t_inicial = time()
-                    solucion = alg_gen.busqueda(gen)
-                    t_final = time()
-                    tiempo += t_final - t_inicial
-                    costo += alg_gen.problema.costo(solucion)
-                tiempo /= repeticiones
-                costo /= repeticiones        
-                # guardo los mejores
-                if costo < 0.05:
-                    mejores.append([n_reinas, np, gen, pm, costo, tiempo]) 
-    
-    rep = 10
-    mejores_2 = []
-    # repeticiones con los mejores casos
-    for mejor in mejores:
-        tiempo = 0
-        costo = 0
-        for r in range(rep):
-            alg_gen = genetico.GeneticoPermutaciones(ProblemaNreinas(mejor[0]), mejor[1], mejor[3])
-            t_inicial = time()
-            solucion = alg_gen.busqueda(mejor[2])
-            t_final = time()
-            tiempo += t_final - t_inicial
-            costo += alg_gen.problema.costo(solucion)
-        tiempo /= rep
-        costo /= rep
-        if costo < 0.05:
-            mejores_2.append([mejor[0], mejor[1], mejor[2], mejor[3], costo, tiempo]) 
-    
-    for mejor in mejores_2:
-        print("NReinas = {}, Poblacion = {}, Generaciones = {}, Probabilidad = {}, Costo = {}, Tiempo = {}".format(mejor[1],mejor[2],mejor[3],mejor[4],mejor[5]))
+def ensayo_nreinas(configuracion, semilla):
+    """
+    Un ensayo del barrido de prueba_genetico_2
+    @param configuracion: Diccionario con n_reinas, n_poblacion,
+                          generaciones y prob_mutacion
+    @param semilla: Semilla del generador de números aleatorios
+    @return: Un diccionario con el costo de la solución y el tiempo
+    """
+    semilla_problema, semilla_ag = genetico.semillas_derivadas(semilla, 2)
+    alg_gen = genetico.GeneticoPermutaciones(
+        ProblemaNreinas(configuracion['n_reinas'], semilla_problema),
+        configuracion['n_poblacion'], configuracion['prob_mutacion'],
+        aleatorio=semilla_ag)
+    t_inicial = time()
+    solucion = alg_gen.busqueda(configuracion['generaciones'])
+    t_final = time()
+    return {'costo': alg_gen.problema.costo(solucion),
+            'tiempo': t_final - t_inicial}
+
+
+def prueba_genetico_2(archivo='barrido_nreinas.jsonl'):
+    """
+    Barrido de parámetros del AG para las n reinas. Se corre en paralelo y
+    los resultados se guardan en `archivo`, así que si se interrumpe se
+    puede volver a llamar y continúa donde se quedó. Todas las
+    configuraciones se prueban con 2 repeticiones y solo la mitad mejor
+    pasa a la siguiente ronda, con el doble de repeticiones. Como en el
+    barrido original, después de cada ronda se descartan las
+    configuraciones con costo promedio de 0.05 o más.
+    """
+    rejilla = {'n_reinas': [100],      # [8, 16, 32, 64, 100]
+               'n_poblacion': [150, 175],
+               'generaciones': [500],
+               'prob_mutacion': [0.001, 0.005]}
+    tabla = barrido.barrido(ensayo_nreinas, rejilla, archivo,
+                            repeticiones=2, rondas=3, reduccion=2,
+                            filtro=lambda resumen: resumen['costo'][0] < 0.05)
+    print(barrido.formatea_tabla(tabla))
 
 if __name__ == "__main__":
 
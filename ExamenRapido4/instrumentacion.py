@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+instrumentacion.py
+------------------
+Observadores para medir lo que pasa dentro de genetico.Genetico.busqueda.
+
+Un observador se agrega con genetico.agrega_observador(observador) y
+recibe, en cada generación, el tiempo que tomó cada fase (selección,
+cruza, mutación y reemplazo). Si no hay observadores la búsqueda no mide
+nada, por lo que no cuesta tiempo.
+"""
+
+import csv
+import numpy as np
+
+__author__ = 'Raul Perez'
+
+FASES = ('seleccion', 'cruza', 'mutacion', 'reemplazo')
+COLUMNAS = (('generacion',) + tuple('t_' + fase for fase in FASES) +
+            ('mejor', 'media', 'diversidad'))
+
+
+class Observador:
+    """
+    Observador que no hace nada, para heredar solo lo que se necesite
+    """
+    def inicia(self, genetico):
+        """
+        Se llama al empezar genetico.busqueda
+        """
+        pass
+
+    def generacion(self, genetico, generacion, tiempos):
+        """
+        Se llama al terminar cada generación
+        @param genetico: El objeto Genetico que está buscando
+        @param generacion: Número de la generación (empieza en 1)
+        @param tiempos: Diccionario con los segundos de cada fase
+        """
+        pass
+
+    def termina(self, genetico):
+        """
+        Se llama al terminar genetico.busqueda
+        """
+        pass
+
+
+class Registrador(Observador):
+    """
+    Guarda una traza por generación con los tiempos de cada fase y la
+    mejor aptitud, la aptitud media y la diversidad de la población.
+    """
+    def __init__(self, ruta=None):
+        """
+        @param ruta: Si se da, al terminar la búsqueda se guarda la traza
+                     en este archivo, como CSV o como NPZ según la extensión
+        """
+        self.ruta = ruta
+        self.filas = []
+
+    def generacion(self, genetico, generacion, tiempos):
+        self.filas.append((generacion,) +
+                          tuple(tiempos[fase] for fase in FASES) +
+                          tuple(genetico.estadisticas()))
+
+    def termina(self, genetico):
+        if self.ruta is None:
+            return
+        if self.ruta.endswith('.npz'):
+            self.guarda_npz(self.ruta)
+        else:
+            self.guarda_csv(self.ruta)
+
+    def guarda_csv(self, ruta):
+        """
+        Guarda la traza como CSV, con un renglón por generación
+        """
+        with open(ruta, 'w', newline='') as archivo:
+            escritor = csv.writer(archivo)
+            escritor.writerow(COLUMNAS)
+            escritor.writerows(self.filas)
+
+    def guarda_npz(self, ruta):
+        """
+        Guarda la traza como NPZ comprimido, un arreglo por columna
+        """
+        traza = np.array(self.filas, dtype=float).reshape(-1, len(COLUMNAS))
+        np.savez_compressed(ruta, **{columna: traza[:, k]
+                                     for (k, columna) in enumerate(COLUMNAS)})
+
+    def tiempos_por_fase(self):
+        """
+        @return: Un diccionario con los segundos totales de cada fase
+        """
+        return {fase: sum(fila[k + 1] for fila in self.filas)
+                for (k, fase) in enumerate(FASES)}
+
+    def resumen(self):
+        """
+        Resumen legible de la traza
+        @return: Una cadena con el tiempo y el porcentaje de cada fase, y
+                 las métricas de la última generación
+        """
+        tiempos = self.tiempos_por_fase()
+        total = sum(tiempos.values())
+        lineas = ["Generaciones registradas: {}".format(len(self.filas))]
+        for fase in FASES:
+            porcentaje = 100 * tiempos[fase] / total if total else 0.0
+            lineas.append("  {:<10} {:>10.4f} seg ({:5.1f}%)".format(
+                fase, tiempos[fase], porcentaje))
+        lineas.append("  {:<10} {:>10.4f} seg".format('total', total))
+        if self.filas:
+            _, _, _, _, _, mejor, media, diversidad = self.filas[-1]
+            lineas.append("Aptitud mejor {:.4f}, media {:.4f}, "
+                          "diversidad {:.2f}".format(mejor, media,
+                                                     diversidad))
+        return '\n'.join(lineas)
@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+islas.py
+--------
+Modelo de islas para los algoritmos genéticos de genetico.py.
+
+Cada isla es un objeto genetico.Genetico que evoluciona en su propio
+proceso. Cada cierto número de generaciones las islas envían a sus mejores
+individuos a sus vecinas, de acuerdo a una topología (anillo o completa).
+"""
+
+import multiprocessing
+from time import time
+import genetico
+
+__author__ = 'Raul Perez'
+
+
+def topologia_anillo(isla, n_islas):
+    """
+    Cada isla recibe inmigrantes solo de la isla anterior
+    @param isla: Índice de la isla que recibe
+    @param n_islas: Número total de islas
+    @return: Una lista con los índices de las islas que le envían
+    """
+    return [(isla - 1) % n_islas] if n_islas > 1 else []
+
+
+def topologia_completa(isla, n_islas):
+    """
+    Cada isla recibe inmigrantes de todas las demás
+    """
+    return [otra for otra in range(n_islas) if otra != isla]
+
+
+TOPOLOGIAS = {'anillo': topologia_anillo, 'completa': topologia_completa}
+
+
+def _proceso_isla(conexion, fabrica, semilla):
+    """
+    Ciclo de una isla dentro de su proceso. Con la semilla de la isla se
+    derivan generadores nuevos para el problema y para el algoritmo
+    genético (aunque la fábrica les haya dado una semilla fija, que sería
+    la misma en todas las islas). El algoritmo se crea sin población y sin
+    procesos trabajadores (la isla ya es un proceso), y la población se
+    genera una sola vez, ya con el generador del problema de la isla.
+    Atiende las órdenes ('evoluciona', n_generaciones, n_emigrantes,
+    costo_objetivo, tiempo_limite), ('inmigra', estados) y ('termina',)
+    que le llegan por la conexión.
+    """
+    semilla_problema, semilla_ag = genetico.semillas_derivadas(semilla, 2)
+    algoritmo = fabrica(aleatorio=semilla_ag, n_trabajadores=None,
+                        inicializa=False)
+    algoritmo.problema.aleatorio = genetico.genera_aleatorio(semilla_problema)
+    algoritmo.inicializa_poblacion(algoritmo.n_poblacion)
+    while True:
+        orden = conexion.recv()
+        if orden[0] == 'evoluciona':
+            t_inicial = time()
+            estado = algoritmo.busqueda(orden[1], costo_objetivo=orden[3],
+                                        tiempo_limite=orden[4])
+            conexion.send((estado, algoritmo.problema.costo(estado),
+                           algoritmo.paro[1], time() - t_inicial,
+                           algoritmo.emigrantes(orden[2])))
+        elif orden[0] == 'inmigra':
+            algoritmo.inmigra(orden[1])
+        else:
+            conexion.close()
+            return
+
+
+def busqueda_islas(fabrica, n_islas=4, n_generaciones=500, intervalo=25,
+                   n_migrantes=2, topologia='anillo', tiempo_limite=None,
+                   costo_objetivo=None, semilla=None):
+    """
+    Algoritmo genético con modelo de islas en varios procesos
+    @param fabrica: Una función (que se pueda serializar, por ejemplo un
+                    functools.partial de una clase de genetico) que
+                    devuelve un objeto genetico.Genetico, uno por isla.
+                    Se llama con los argumentos con nombre aleatorio,
+                    n_trabajadores e inicializa de genetico.Genetico
+    @param n_islas: Número de islas (y de procesos)
+    @param n_generaciones: Máximo de generaciones por isla
+    @param intervalo: Generaciones entre cada migración
+    @param n_migrantes: Cuántos de los mejores envía cada isla
+    @param topologia: 'anillo', 'completa' o una función
+                      (isla, n_islas) -> lista de islas que le envían
+    @param tiempo_limite: Segundos de reloj máximos, o None
+    @param costo_objetivo: Si alguna isla llega a este costo se termina,
+                           o None para correr todas las generaciones
+    @param semilla: Semilla para las semillas de cada isla, o None
+    @return: Una tupla (mejor estado, estadísticas), donde estadísticas es
+             una lista con un diccionario por isla con las llaves
+             'generaciones', 'costo', 'costos', 'tiempo' e 'inmigrantes'
+    """
+    if not callable(topologia):
+        topologia = TOPOLOGIAS[topologia]
+    fuentes = [topologia(isla, n_islas) for isla in range(n_islas)]
+    semillas = genetico.semillas_derivadas(semilla, n_islas)
+
+    procesos, conexiones = [], []
+    for isla in range(n_islas):
+        local, remota = multiprocessing.Pipe()
+        proceso = multiprocessing.Process(
+            target=_proceso_isla, args=(remota, fabrica, semillas[isla]),
+            daemon=True)
+        proceso.start()
+        procesos.append(proceso)
+        conexiones.append(local)
+
+    estadisticas = [{'generaciones': 0, 'costo': None, 'costos': [],
+                     'tiempo': 0.0, 'inmigrantes': 0}
+                    for _ in range(n_islas)]
+    mejor_estado, mejor_costo = None, None
+    t_inicial = time()
+    try:
+        generacion = 0
+        while generacion < n_generaciones:
+            n_gen = min(intervalo, n_generaciones - generacion)
+            restante = (None if tiempo_limite is None
+                        else tiempo_limite - (time() - t_inicial))
+            for conexion in conexiones:
+                conexion.send(('evoluciona', n_gen, n_migrantes,
+                               costo_objetivo, restante))
+            emigrantes = []
+            for (conexion, stats) in zip(conexiones, estadisticas):
+                estado, costo, simuladas, tiempo, enviados = conexion.recv()
+                stats['generaciones'] += simuladas
+                stats['costo'] = costo
+                stats['costos'].append(costo)
+                stats['tiempo'] += tiempo
+                emigrantes.append(enviados)
+                if mejor_costo is None or costo < mejor_costo:
+                    mejor_estado, mejor_costo = estado, costo
+            generacion += n_gen
+
+            if costo_objetivo is not None and mejor_costo <= costo_objetivo:
+                break
+            if (tiempo_limite is not None and
+                    time() - t_inicial >= tiempo_limite):
+                break
+            if generacion < n_generaciones:
+                for (isla, conexion) in enumerate(conexiones):
+                    inmigrantes = [estado for otra in fuentes[isla]
+                                   for estado in emigrantes[otra]]
+                    estadisticas[isla]['inmigrantes'] += len(inmigrantes)
+                    conexion.send(('inmigra', inmigrantes))
+    finally:
+        for conexion in conexiones:
+            try:
+                conexion.send(('termina',))
+            except OSError:
+                pass        # la isla ya terminó, por ejemplo por un error
+            conexion.close()
+        for proceso in procesos:
+            proceso.join()
+    return mejor_estado, estadisticas
+
+
+if __name__ == "__main__":
+
+    from functools import partial
+    from genetico_nreinas import ProblemaNreinas
+
+    n_reinas = 64
+    fabrica = partial(genetico.GeneticoPermutaciones,
+                      ProblemaNreinas(n_reinas), 150, 0.005)
+    t_inicial = time()
+    estado, estadisticas = busqueda_islas(fabrica, n_islas=4,
+                                          n_generaciones=400, intervalo=20,
+                                          costo_objetivo=0)
+    print("Mejor costo para las {} reinas: {}".format(
+        n_reinas, ProblemaNreinas(n_reinas).costo(estado)))
+    print("Tiempo total en segundos: {}".format(time() - t_inicial))
+    for (isla, stats) in enumerate(estadisticas):
+        print("Isla {}: {} generaciones, costo {}, {:.2f} seg".format(
+            isla, stats['generaciones'], stats['costo'], stats['tiempo']))
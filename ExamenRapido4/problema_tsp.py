@@ -0,0 +1,385 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+problema_tsp.py
+---------------
+El problema del agente viajero como genetico.Problema.
+
+Las ciudades se leen de un archivo en formato TSPLIB (secciones
+NODE_COORD_SECTION con EDGE_WEIGHT_TYPE EUC_2D, CEIL_2D, MAN_2D, ATT o
+GEO) o se dan como un arreglo de coordenadas. Las distancias se calculan
+una sola vez en una matriz de float32; para instancias grandes la matriz
+vive en un archivo .npy que se abre con memoria mapeada, así que no
+ocupa RAM de más y los procesos trabajadores la comparten.
+
+Un estado es una permutación de range(n) con el orden de visita. El
+evaluador incremental da el cambio de costo de un intercambio o de un
+movimiento 2-opt en O(1).
+"""
+
+import os
+import tempfile
+import weakref
+import numpy as np
+import genetico
+
+__author__ = 'Raul Perez'
+
+# A partir de este número de ciudades la matriz de distancias se guarda en
+# un archivo con memoria mapeada (5000 ciudades son 100 MB en float32)
+LIMITE_MEMMAP = 5000
+
+TIPOS_DISTANCIA = ('EUC_2D', 'CEIL_2D', 'MAN_2D', 'ATT', 'GEO', 'EXACTA')
+
+
+def lee_tsplib(ruta):
+    """
+    Lee un archivo TSPLIB con coordenadas
+    @param ruta: Ruta del archivo
+    @return: Una tupla (nombre, tipo de distancia, coordenadas) donde
+             coordenadas es un ndarray de n x 2
+    """
+    encabezado = {}
+    coordenadas = []
+    with open(ruta) as archivo:
+        en_coordenadas = False
+        for linea in archivo:
+            linea = linea.strip()
+            if not linea:
+                continue
+            if linea == 'EOF':
+                break
+            if linea == 'NODE_COORD_SECTION':
+                en_coordenadas = True
+            elif en_coordenadas and (linea[0].isdigit() or linea[0] == '-'):
+                _, x, y = linea.split()[:3]
+                coordenadas.append((float(x), float(y)))
+            elif ':' in linea:
+                en_coordenadas = False
+                llave, valor = linea.split(':', 1)
+                encabezado[llave.strip().upper()] = valor.strip()
+            else:
+                en_coordenadas = False
+    tipo = encabezado.get('EDGE_WEIGHT_TYPE', 'EUC_2D')
+    if tipo not in TIPOS_DISTANCIA:
+        raise ValueError("Tipo de distancia no soportado: {}".format(tipo))
+    dimension = int(encabezado.get('DIMENSION', len(coordenadas)))
+    if dimension != len(coordenadas):
+        raise ValueError("Se esperaban {} ciudades y hay {}".format(
+            dimension, len(coordenadas)))
+    return (encabezado.get('NAME', os.path.basename(ruta)), tipo,
+            np.array(coordenadas, dtype=float))
+
+
+def _a_radianes(grados):
+    """
+    Convierte coordenadas GEO de TSPLIB (grados.minutos) a radianes
+    """
+    enteros = np.trunc(grados)
+    return np.pi * (enteros + 5.0 * (grados - enteros) / 3.0) / 180.0
+
+
+def distancias_bloque(origen, destino, tipo):
+    """
+    Distancias entre dos grupos de ciudades con las reglas de TSPLIB
+    @param origen: Un ndarray de m x 2
+    @param destino: Un ndarray de n x 2
+    @param tipo: Uno de TIPOS_DISTANCIA
+    @return: Un ndarray de m x n
+    """
+    if tipo == 'GEO':
+        latitud1, longitud1 = (_a_radianes(origen[:, k])[:, None]
+                               for k in (0, 1))
+        latitud2, longitud2 = (_a_radianes(destino[:, k])[None, :]
+                               for k in (0, 1))
+        q1 = np.cos(longitud1 - longitud2)
+        q2 = np.cos(latitud1 - latitud2)
+        q3 = np.cos(latitud1 + latitud2)
+        argumento = 0.5 * ((1.0 + q1) * q2 - (1.0 - q1) * q3)
+        return np.trunc(6378.388 * np.arccos(np.clip(argumento, -1, 1))
+                        + 1.0)
+    diferencia = origen[:, None, :] - destino[None, :, :]
+    if tipo == 'MAN_2D':
+        return np.floor(np.abs(diferencia).sum(axis=2) + 0.5)
+    cuadrados = (diferencia ** 2).sum(axis=2)
+    if tipo == 'ATT':
+        exacta = np.sqrt(cuadrados / 10.0)
+        redondeada = np.floor(exacta + 0.5)
+        return redondeada + (redondeada < exacta)
+    exacta = np.sqrt(cuadrados)
+    if tipo == 'EUC_2D':
+        return np.floor(exacta + 0.5)
+    if tipo == 'CEIL_2D':
+        return np.ceil(exacta)
+    return exacta
+
+
+def matriz_distancias(coordenadas, tipo='EUC_2D', archivo=None):
+    """
+    Calcula la matriz de distancias en float32, por bloques de renglones
+    para no crear arreglos intermedios de n x n x 2
+    @param coordenadas: Un ndarray de n x 2
+    @param tipo: Uno de TIPOS_DISTANCIA
+    @param archivo: Si se da, la matriz se escribe en este archivo .npy y
+                    se devuelve abierta con memoria mapeada (solo lectura).
+                    Si el archivo ya existe con el tamaño correcto se usa
+                    tal cual, sin recalcular.
+    @return: Un ndarray (o numpy.memmap) de n x n
+    """
+    if tipo not in TIPOS_DISTANCIA:
+        raise ValueError("Tipo de distancia no soportado: {}".format(tipo))
+    coordenadas = np.asarray(coordenadas, dtype=float)
+    n = len(coordenadas)
+    if archivo is not None and os.path.exists(archivo):
+        distancias = np.load(archivo, mmap_mode='r')
+        if distancias.shape == (n, n) and distancias.dtype == np.float32:
+            return distancias
+    if archivo is None:
+        distancias = np.empty((n, n), dtype=np.float32)
+    else:
+        distancias = np.lib.format.open_memmap(archivo, mode='w+',
+                                               dtype=np.float32,
+                                               shape=(n, n))
+    bloque = max(1, 2 ** 20 // max(1, n))
+    for inicio in range(0, n, bloque):
+        fin = min(n, inicio + bloque)
+        distancias[inicio:fin] = distancias_bloque(coordenadas[inicio:fin],
+                                                   coordenadas, tipo)
+    if archivo is None:
+        return distancias
+    distancias.flush()
+    del distancias
+    return np.load(archivo, mmap_mode='r')
+
+
+def borra_archivo(ruta):
+    """
+    Borra un archivo si todavía existe (para weakref.finalize, que no
+    debe fallar si ya lo borró alguien más)
+    """
+    try:
+        os.remove(ruta)
+    except OSError:
+        pass
+
+
+class ProblemaTSP(genetico.Problema):
+    """
+    El problema del agente viajero (simétrico, con recorrido cerrado)
+    """
+    def __init__(self, coordenadas=None, tipo='EUC_2D', distancias=None,
+                 archivo_distancias=None, nombre='tsp', aleatorio=None):
+        """
+        @param coordenadas: Un arreglo de n x 2 con las ciudades
+        @param tipo: Tipo de distancia de TSPLIB (ver TIPOS_DISTANCIA)
+        @param distancias: Una matriz de n x n ya calculada, en lugar de
+                           las coordenadas
+        @param archivo_distancias: Archivo .npy para la matriz con memoria
+                                   mapeada. Si es None y hay al menos
+                                   LIMITE_MEMMAP ciudades se usa un archivo
+                                   temporal, que se borra cuando ya nadie
+                                   usa la matriz (o al terminar el
+                                   programa). Un archivo que se da aquí
+                                   nunca se borra.
+        @param nombre: Nombre de la instancia
+        @param aleatorio: Semilla o generador para los estados aleatorios
+                          (ver genetico.genera_aleatorio)
+        """
+        if distancias is None:
+            if coordenadas is None:
+                raise ValueError("Se necesitan coordenadas o distancias")
+            temporal = (archivo_distancias is None and
+                        len(coordenadas) >= LIMITE_MEMMAP)
+            if temporal:
+                descriptor, archivo_distancias = tempfile.mkstemp(
+                    prefix='distancias_', suffix='.npy')
+                os.close(descriptor)
+                os.remove(archivo_distancias)
+            distancias = matriz_distancias(coordenadas, tipo,
+                                           archivo_distancias)
+            if temporal:
+                weakref.finalize(distancias, borra_archivo,
+                                 archivo_distancias)
+        self.nombre = nombre
+        self.coordenadas = coordenadas
+        self.distancias = distancias
+        self.n = len(distancias)
+        self.aleatorio = genetico.genera_aleatorio(aleatorio)
+
+    @classmethod
+    def desde_tsplib(cls, ruta, archivo_distancias=None, aleatorio=None):
+        """
+        Crea el problema a partir de un archivo TSPLIB
+        @param ruta: Ruta del archivo .tsp
+        @param archivo_distancias: Ver __init__
+        """
+        nombre, tipo, coordenadas = lee_tsplib(ruta)
+        return cls(coordenadas, tipo, archivo_distancias=archivo_distancias,
+                   nombre=nombre, aleatorio=aleatorio)
+
+    def __getstate__(self):
+        """
+        Si la matriz está en un archivo, al serializar (por ejemplo para
+        los procesos trabajadores) solo se guarda la ruta
+        """
+        estado = super().__getstate__()
+        archivo = getattr(self.distancias, 'filename', None)
+        if archivo is not None:
+            estado['distancias'] = archivo
+        return estado
+
+    def __setstate__(self, estado):
+        if isinstance(estado['distancias'], str):
+            estado['distancias'] = np.load(estado['distancias'],
+                                           mmap_mode='r')
+        self.__dict__.update(estado)
+
+    def estado_aleatorio(self):
+        estado = list(range(self.n))
+        self.aleatorio.shuffle(estado)
+        return tuple(estado)
+
+    def costo(self, estado):
+        """
+        Longitud del recorrido cerrado
+        @param estado: Una tupla con el orden de visita de las ciudades
+        @return: Un flotante
+        """
+        ciudades = np.asarray(estado)
+        return float(self.distancias[ciudades, np.roll(ciudades, -1)]
+                     .sum(dtype=float))
+
+    def costo_lote(self, estados):
+        """
+        Longitud de muchos recorridos a la vez, con un solo acceso
+        indexado a la matriz de distancias
+        @param estados: Un arreglo de n_estados x n (o lista de tuplas)
+        @return: Un ndarray de flotantes con el costo de cada estado
+        """
+        estados = np.asarray(estados)
+        return self.distancias[estados, np.roll(estados, -1, axis=1)].sum(
+            axis=1, dtype=float)
+
+    def evaluador_incremental(self, estado):
+        return EvaluadorTSP(self, estado)
+
+
+class EvaluadorTSP(genetico.EvaluadorIncremental):
+    """
+    Evaluador incremental del agente viajero. Un intercambio o un
+    movimiento 2-opt solo cambia cuatro aristas, así que su costo se
+    obtiene en O(1) leyendo ocho distancias.
+    """
+    def __init__(self, problema, estado):
+        self.problema = problema
+        self.estado = list(estado)
+        self.costo = problema.costo(estado)
+        self.distancia = problema.distancias.item
+
+    def delta_intercambio(self, i, j):
+        estado, d = self.estado, self.distancia
+        n = len(estado)
+        if i == j or n <= 3:
+            return 0.0
+        if (i + 1) % n == j or (j + 1) % n == i:
+            if (j + 1) % n == i:
+                i, j = j, i
+            # Vecinos: ... p a b s ... pasa a ... p b a s ...
+            p, a, b, s = (estado[i - 1], estado[i], estado[j],
+                          estado[(j + 1) % n])
+            return d(p, b) + d(a, s) - d(p, a) - d(b, s)
+        a, b = estado[i], estado[j]
+        pa, sa = estado[i - 1], estado[(i + 1) % n]
+        pb, sb = estado[j - 1], estado[(j + 1) % n]
+        return (d(pa, b) + d(b, sa) + d(pb, a) + d(a, sb) -
+                d(pa, a) - d(a, sa) - d(pb, b) - d(b, sb))
+
+    def intercambia(self, i, j):
+        self.costo += self.delta_intercambio(i, j)
+        self.estado[i], self.estado[j] = self.estado[j], self.estado[i]
+        return self.costo
+
+    def delta_2opt(self, i, j):
+        """
+        Cambio en el costo si se invierte el tramo estado[i + 1:j + 1],
+        es decir, si las aristas (estado[i], estado[i + 1]) y
+        (estado[j], estado[j + 1]) se cambian por (estado[i], estado[j])
+        y (estado[i + 1], estado[j + 1])
+        @param i: Entero, con i < j
+        @param j: Entero
+        @return: El cambio en la longitud del recorrido
+        """
+        estado, d = self.estado, self.distancia
+        n = len(estado)
+        if j - i < 2 or (i == 0 and j == n - 1):
+            return 0.0
+        a, b = estado[i], estado[i + 1]
+        c, e = estado[j], estado[(j + 1) % n]
+        return d(a, c) + d(b, e) - d(a, b) - d(c, e)
+
+    def aplica_2opt(self, i, j):
+        """
+        Hace el movimiento 2-opt (i, j), la inversión cuesta O(j - i)
+        @return: El nuevo costo del estado
+        """
+        self.costo += self.delta_2opt(i, j)
+        self.estado[i + 1:j + 1] = self.estado[j:i:-1]
+        return self.costo
+
+
+def mejora_2opt(problema, estado=None, max_pasos=None, aleatorio=None):
+    """
+    Descenso por movimientos 2-opt escogidos al azar: se prueba un par de
+    posiciones y se aplica el movimiento si acorta el recorrido
+    @param problema: Un objeto ProblemaTSP
+    @param estado: Estado inicial (None para uno aleatorio)
+    @param max_pasos: Número de pares a probar (por default 100 veces el
+                      número de ciudades)
+    @param aleatorio: Semilla o generador (ver genetico.genera_aleatorio)
+    @return: El estado final, como tupla
+    """
+    aleatorio = genetico.genera_aleatorio(aleatorio)
+    if estado is None:
+        estado = problema.estado_aleatorio()
+    evaluador = problema.evaluador_incremental(estado)
+    n = len(evaluador.estado)
+    max_pasos = 100 * n if max_pasos is None else max_pasos
+    for _ in range(max_pasos):
+        i, j = aleatorio.randrange(n), aleatorio.randrange(n)
+        if i > j:
+            i, j = j, i
+        if evaluador.delta_2opt(i, j) < 0:
+            evaluador.aplica_2opt(i, j)
+    return tuple(evaluador.estado)
+
+
+if __name__ == "__main__":
+
+    import sys
+    from time import time
+
+    if len(sys.argv) > 1:
+        problema = ProblemaTSP.desde_tsplib(sys.argv[1], aleatorio=0)
+    else:
+        generador = np.random.default_rng(0)
+        problema = ProblemaTSP(generador.uniform(0, 1000, (500, 2)),
+                               nombre='aleatorio500', aleatorio=0)
+    print("Instancia {} con {} ciudades".format(problema.nombre, problema.n))
+
+    t_inicial = time()
+    algoritmo = genetico.GeneticoPermutaciones(problema, 100, 0.001,
+                                               operador_cruza='ox',
+                                               aleatorio=1)
+    solucion = algoritmo.busqueda(200)
+    print("AG: longitud {:.0f} en {:.2f} segundos".format(
+        problema.costo(solucion), time() - t_inicial))
+
+    t_inicial = time()
+    solucion = mejora_2opt(problema, solucion, aleatorio=1)
+    print("AG + 2-opt: longitud {:.0f} en {:.2f} segundos más".format(
+        problema.costo(solucion), time() - t_inicial))
+
+    t_inicial = time()
+    solucion = mejora_2opt(problema, aleatorio=1)
+    print("Solo 2-opt: longitud {:.0f} en {:.2f} segundos".format(
+        problema.costo(solucion), time() - t_inicial))
@@ -0,0 +1,365 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Pruebas de regresión de genetico.py (se corren con pytest)
+"""
+
+import pickle
+import random
+import genetico
+from genetico_nreinas import ProblemaNreinas
+
+__author__ = 'Raul Perez'
+
+
+def test_problema_por_default_se_serializa():
+    for problema in (ProblemaNreinas(8), genetico.ProblemaTonto(8)):
+        copia = pickle.loads(pickle.dumps(problema))
+        assert copia.aleatorio is random
+        assert sorted(copia.estado_aleatorio()) == list(range(copia.n))
+
+
+def test_genetico_por_default_se_serializa():
+    ag = genetico.GeneticoPermutaciones(ProblemaNreinas(8), 10)
+    copia = pickle.loads(pickle.dumps(ag))
+    assert copia.aleatorio is random
+    assert copia.problema.aleatorio is random
+
+
+def test_evaluacion_en_procesos_sin_semilla():
+    ag = genetico.GeneticoPermutaciones(ProblemaNreinas(8), 10,
+                                        n_trabajadores=2)
+    try:
+        solucion = ag.busqueda(2)
+    finally:
+        ag.cierra()
+    assert sorted(solucion) == list(range(8))
+
+
+def test_cache_mas_chica_que_la_poblacion():
+    from genetico_vectorizado import GeneticoPermutacionesVectorizado
+    for clase in (genetico.GeneticoPermutaciones,
+                  GeneticoPermutacionesVectorizado):
+        ag = clase(ProblemaNreinas(16, 0), 50, 0.01, cache_aptitud=10,
+                   aleatorio=1)
+        solucion = ag.busqueda(3)
+        assert len(ag.cache) == 10
+        assert sorted(solucion) == list(range(16))
+
+
+def test_islas_distintas_con_fabrica_con_semilla():
+    from functools import partial
+    import islas
+    fabrica = partial(genetico.GeneticoPermutaciones, ProblemaNreinas(24, 0),
+                      40, 0.01, aleatorio=5)
+    _, estadisticas = islas.busqueda_islas(fabrica, n_islas=4,
+                                           n_generaciones=50, intervalo=25,
+                                           semilla=3)
+    costos = [tuple(isla['costos']) for isla in estadisticas]
+    assert len(set(costos)) > 1
+
+
+def test_adaptacion_redefinida_se_usa_en_los_lotes():
+    from genetico_vectorizado import GeneticoPermutacionesVectorizado
+    from genetico_compacto import GeneticoPermutacionesCompacto
+    for base in (genetico.GeneticoPermutaciones,
+                 GeneticoPermutacionesVectorizado,
+                 GeneticoPermutacionesCompacto):
+        class PrimerGen(base):
+            def adaptacion(self, individuo):
+                return float(individuo[0]) + 1
+
+        for cache in (None, 100):
+            ag = PrimerGen(ProblemaNreinas(8, 0), 20, cache_aptitud=cache,
+                           aleatorio=2)
+            ag.busqueda(3)
+            if hasattr(ag, 'cromosomas'):
+                aptitudes = ag.aptitudes.tolist()
+                individuos = ag.cromosomas.tolist()
+            else:
+                aptitudes = [aptitud for (aptitud, _) in ag.poblacion]
+                individuos = [individuo for (_, individuo) in ag.poblacion]
+            assert aptitudes == [float(individuo[0]) + 1
+                                 for individuo in individuos]
+
+
+def test_archivo_temporal_de_distancias_se_borra(monkeypatch):
+    import gc
+    import os
+    import numpy as np
+    import problema_tsp
+    monkeypatch.setattr(problema_tsp, 'LIMITE_MEMMAP', 10)
+    problema = problema_tsp.ProblemaTSP(np.random.default_rng(0).random(
+        (20, 2)) * 100)
+    archivo = problema.distancias.filename
+    copia = pickle.loads(pickle.dumps(problema))
+    assert os.path.exists(archivo)
+    del problema, copia
+    gc.collect()
+    assert not os.path.exists(archivo)
+
+
+def test_isla_inicializa_la_poblacion_una_sola_vez():
+    import multiprocessing
+    from functools import partial
+    import islas
+    llamadas = []
+
+    class Contado(genetico.GeneticoPermutaciones):
+        def inicializa_poblacion(self, n_poblacion):
+            llamadas.append((n_poblacion, self.ejecutor))
+            super().inicializa_poblacion(n_poblacion)
+
+    local, remota = multiprocessing.Pipe()
+    local.send(('termina',))
+    islas._proceso_isla(remota, partial(Contado, ProblemaNreinas(8), 10,
+                                        n_trabajadores=2, aleatorio=1), 3)
+    assert llamadas == [(10, None)]
+
+
+def test_error_en_una_isla_no_se_oculta():
+    import pytest
+    from functools import partial
+    import islas
+    fabrica = partial(genetico.GeneticoPermutaciones, ProblemaNreinas(8),
+                      10, modo_seleccion='no existe')
+    with pytest.raises((EOFError, OSError)) as error:
+        islas.busqueda_islas(fabrica, n_islas=2, n_generaciones=4,
+                             intervalo=2, semilla=0)
+    # El error es el de la comunicación con la isla, no uno al terminarla
+    assert error.value.__context__ is None
+
+
+def test_ejecutor_externo_recibe_el_problema_una_vez():
+    from concurrent.futures import ThreadPoolExecutor
+    envios = []
+
+    class Registro(ThreadPoolExecutor):
+        def map(self, funcion, *iterables):
+            def registra(clave, datos, estados):
+                envios.append(datos is not None)
+                return funcion(clave, datos, estados)
+            return super().map(registra, *iterables)
+
+    with Registro(2) as ejecutor:
+        ag = genetico.GeneticoPermutaciones(ProblemaNreinas(8, 0), 20,
+                                            ejecutor=ejecutor, aleatorio=1)
+        ag.busqueda(5)
+        clave = ag._clave_problema
+        assert clave in genetico._PROBLEMAS_TRABAJADOR
+        ag.cierra()
+    assert clave not in genetico._PROBLEMAS_TRABAJADOR
+    # Solo los trozos de la primera evaluación llevan el problema
+    assert 0 < sum(envios) <= 8 and len(envios) >= 6 * sum(envios)
+
+
+def test_registro_de_problemas_acotado():
+    for k in range(3 * genetico._MAX_PROBLEMAS):
+        genetico._registra_problema('prueba {}'.format(k),
+                                    pickle.dumps(ProblemaNreinas(4)))
+    assert len(genetico._PROBLEMAS_TRABAJADOR) == genetico._MAX_PROBLEMAS
+
+
+def test_minimos_conflictos_no_empeora_con_costos_reales():
+    import numpy as np
+    import busqueda_local
+    from problema_tsp import ProblemaTSP
+    problema = ProblemaTSP(np.random.default_rng(0).random((30, 2)),
+                           tipo='EXACTA')
+    inicial = problema.estado_aleatorio()
+    # Con la misma semilla, cada corrida sigue el camino de la anterior
+    costos = [problema.costo(busqueda_local.minimos_conflictos(
+        problema, inicial, max_pasos=pasos, aleatorio=1))
+        for pasos in range(120)]
+    assert all(despues <= antes + 1e-9
+               for (antes, despues) in zip(costos, costos[1:]))
+
+
+def ensayo_falso(configuracion, semilla):
+    return {'costo': configuracion['x'], 'tiempo': 0.0}
+
+
+def test_barrido_descarta_con_el_filtro(tmp_path):
+    import barrido
+    archivo = str(tmp_path / 'barrido.jsonl')
+    tabla = barrido.barrido(ensayo_falso, {'x': [0, 0.01, 0.1, 1]}, archivo,
+                            repeticiones=1, n_trabajadores=2, rondas=2,
+                            filtro=lambda resumen: resumen['costo'][0] < 0.05)
+    assert [configuracion for (configuracion, _, _) in tabla] == [{'x': 0}]
+    ensayos = barrido.lee_resultados(archivo)
+    # x = 0.1 y x = 1 no pasan el filtro y no se repiten en la ronda 2
+    assert sorted(r['configuracion']['x'] for r in ensayos.values()) == [
+        0, 0, 0.01, 0.1, 1]
+
+
+def conflictos_por_pares(estado):
+    return sum(1 for i in range(len(estado))
+               for j in range(i + 1, len(estado))
+               if abs(estado[i] - estado[j]) == j - i)
+
+
+def test_costo_nreinas_igual_al_conteo_por_pares():
+    problema = ProblemaNreinas(12, 4)
+    estados = [problema.estado_aleatorio() for _ in range(30)]
+    esperados = [conflictos_por_pares(estado) for estado in estados]
+    assert [problema.costo(estado) for estado in estados] == esperados
+    assert problema.costo_lote(estados).tolist() == esperados
+    for estado in estados[:5]:
+        for i in range(12):
+            for j in range(12):
+                evaluador = problema.evaluador_incremental(estado)
+                delta = evaluador.delta_intercambio(i, j)
+                cambiado = list(estado)
+                cambiado[i], cambiado[j] = cambiado[j], cambiado[i]
+                esperado = conflictos_por_pares(cambiado)
+                assert evaluador.costo + delta == esperado
+                assert evaluador.intercambia(i, j) == esperado
+
+
+def test_ruleta_acumulada_respeta_las_aptitudes_y_el_excluido():
+    from itertools import accumulate
+    aleatorio = random.Random(0)
+    aptitudes = [1.0, 0.0, 3.0, 6.0]
+    acumulado = list(accumulate(aptitudes))
+    ruleta = genetico.GeneticoPermutaciones.ruleta_acumulada
+    cuenta = [0] * 4
+    for _ in range(20000):
+        cuenta[ruleta(acumulado, aleatorio=aleatorio)] += 1
+    assert cuenta[1] == 0
+    for (veces, aptitud) in zip(cuenta, aptitudes):
+        assert abs(veces / 20000 - aptitud / 10) < 0.02
+    sin_ultimo = [ruleta(acumulado, 3, aleatorio) for _ in range(4000)]
+    assert 3 not in sin_ultimo
+    assert abs(sin_ultimo.count(2) / 4000 - 0.75) < 0.03
+
+
+def test_seleccion_da_parejas_distintas_en_ambos_modos():
+    for modo in ('ruleta', 'universal'):
+        ag = genetico.GeneticoPermutaciones(ProblemaNreinas(8, 0), 30,
+                                            modo_seleccion=modo,
+                                            aleatorio=1)
+        parejas = ag.seleccion()
+        assert len(parejas) == 30
+        assert all(i != j and 0 <= i < 30 and 0 <= j < 30
+                   for (i, j) in parejas)
+
+
+
+def pmx_cuadratica(cadena1, cadena2, aleatorio):
+    hijo = cadena1[:]
+    corte1 = aleatorio.randint(0, len(hijo) - 1)
+    corte2 = aleatorio.randint(corte1 + 1, len(hijo))
+    evita = hijo[:corte1] + hijo[corte2:]
+    for i in range(corte1, corte2):
+        hijo[i] = cadena2[i]
+        while hijo[i] in evita:
+            hijo[i] = cadena2[cadena1.index(hijo[i])]
+    return hijo
+
+
+def test_cruzas_dan_permutaciones_validas():
+    clase = genetico.GeneticoPermutaciones
+    aleatorio = random.Random(7)
+    for n in (1, 2, 5, 30):
+        for semilla in range(200):
+            padre, madre = list(range(n)), list(range(n))
+            aleatorio.shuffle(padre)
+            aleatorio.shuffle(madre)
+            hijo = clase.cruza_pmx(padre, madre, random.Random(semilla))
+            assert hijo == pmx_cuadratica(padre, madre,
+                                          random.Random(semilla))
+            assert sorted(clase.cruza_orden(padre, madre, aleatorio)) == \
+                list(range(n))
+            hijo = clase.cruza_ciclos(padre, madre, aleatorio)
+            assert sorted(hijo) == list(range(n))
+            assert all(valor in (padre[i], madre[i])
+                       for (i, valor) in enumerate(hijo))
+
+
+def test_criterios_de_paro_se_reportan():
+    def nuevo():
+        return genetico.GeneticoPermutaciones(ProblemaNreinas(8, 0), 40,
+                                              0.05, aleatorio=3)
+    ag = nuevo()
+    solucion = ag.busqueda(500, costo_objetivo=0)
+    assert ag.paro[0] == 'costo_objetivo' and ag.paro[1] < 500
+    assert ag.problema.costo(solucion) == 0
+    otro = nuevo()
+    assert otro.busqueda(500, costo_objetivo=0) == solucion
+    assert otro.paro == ag.paro
+
+    ag = nuevo()
+    ag.busqueda(10 ** 6, paciencia=5)
+    assert ag.paro[0] == 'estancamiento' and ag.paro[1] >= 5
+
+    ag = nuevo()
+    ag.busqueda(10 ** 6, tiempo_limite=0.05)
+    assert ag.paro[0] == 'tiempo_limite'
+
+    def despues_de_tres(algoritmo, generacion):
+        return generacion >= 3
+    ag = nuevo()
+    ag.busqueda(10, criterios=[despues_de_tres])
+    assert ag.paro == ('despues_de_tres', 3)
+    ag.busqueda(2)
+    assert ag.paro == ('generaciones', 2)
+
+
+def test_registrador_guarda_una_fila_por_generacion(tmp_path):
+    import csv
+    import numpy as np
+    from instrumentacion import COLUMNAS, FASES, Registrador
+    for extension in ('csv', 'npz'):
+        ruta = str(tmp_path / ('traza.' + extension))
+        ag = genetico.GeneticoPermutaciones(ProblemaNreinas(8, 0), 20,
+                                            aleatorio=1)
+        registrador = Registrador(ruta)
+        ag.agrega_observador(registrador)
+        ag.busqueda(6)
+        assert [fila[0] for fila in registrador.filas] == list(range(1, 7))
+        mejor, media, diversidad = ag.estadisticas()
+        assert registrador.filas[-1][-3:] == (mejor, media, diversidad)
+        assert set(registrador.tiempos_por_fase()) == set(FASES)
+        assert 'Generaciones registradas: 6' in registrador.resumen()
+        if extension == 'csv':
+            with open(ruta) as archivo:
+                filas = list(csv.reader(archivo))
+            assert tuple(filas[0]) == COLUMNAS and len(filas) == 7
+        else:
+            traza = np.load(ruta)
+            assert traza['generacion'].tolist() == list(range(1, 7))
+
+
+def test_tsp_lee_tsplib_y_deltas_iguales_al_recalculo(tmp_path):
+    import numpy as np
+    import problema_tsp
+    ruta = tmp_path / 'cuadro.tsp'
+    ruta.write_text("NAME : cuadro\nTYPE : TSP\nDIMENSION : 4\n"
+                    "EDGE_WEIGHT_TYPE : EUC_2D\nNODE_COORD_SECTION\n"
+                    "1 0 0\n2 0 3\n3 4 3\n4 4 0\nEOF\n")
+    problema = problema_tsp.ProblemaTSP.desde_tsplib(str(ruta))
+    assert problema.nombre == 'cuadro' and problema.n == 4
+    assert problema.costo((0, 1, 2, 3)) == 14
+    assert problema.costo((0, 2, 1, 3)) == 18
+    assert problema.costo_lote([(0, 1, 2, 3), (0, 2, 1, 3)]).tolist() == \
+        [14, 18]
+
+    problema = problema_tsp.ProblemaTSP(
+        np.random.default_rng(1).random((9, 2)) * 100, aleatorio=0)
+    estado = problema.estado_aleatorio()
+    for i in range(9):
+        for j in range(9):
+            evaluador = problema.evaluador_incremental(estado)
+            cambiado = list(estado)
+            cambiado[i], cambiado[j] = cambiado[j], cambiado[i]
+            assert np.isclose(evaluador.intercambia(i, j),
+                              problema.costo(cambiado))
+            if i < j:
+                evaluador = problema.evaluador_incremental(estado)
+                invertido = list(estado)
+                invertido[i + 1:j + 1] = invertido[i + 1:j + 1][::-1]
+                assert np.isclose(evaluador.aplica_2opt(i, j),
+                                  problema.costo(invertido))
+    mejorado = problema_tsp.mejora_2opt(problema, estado, aleatorio=0)
+    assert sorted(mejorado) == list(range(9))
+    assert problema.costo(mejorado) <= problema.costo(estado)
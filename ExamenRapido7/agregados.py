@@ -0,0 +1,366 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+agregados.py
+------------
+Agregados incrementales de los conteos de ciclistas por día de la semana,
+por mes y por contador.
+
+En lugar de volver a hacer groupby sobre toda la historia cada vez que
+llegan días nuevos, un AgregadorBicicletas guarda para cada grupo y cada
+contador el número de días, la suma, la media y la suma de cuadrados de
+las desviaciones (algoritmo de Welford, con la fórmula de Chan para
+juntar un lote completo o dos agregadores). Agregar filas nuevas cuesta
+O(filas nuevas), y con actualiza_archivo solo se leen los bytes que se
+agregaron al archivo desde la última vez. El estado se puede guardar en
+JSON y volver a cargar, así que las consultas (las tablas de la libreta)
+se leen de los agregados sin tocar los datos.
+
+    >>> agregador = AgregadorBicicletas()
+    >>> agregador.actualiza_archivo('bikes.csv')
+    >>> agregador.por_dia_semana()[['Berri 1']]     # paseos_por_dia
+    >>> agregador.por_mes(total=True)               # paseos_por_mes
+"""
+
+import io
+import json
+import os
+import zlib
+import numpy as np
+import pandas as pd
+import bicicletas
+
+__author__ = 'Raul Perez'
+
+DIAS = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado',
+        'Domingo']
+MESES = ['Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio', 'Julio',
+         'Agosto', 'Septiembre', 'Octubre', 'Noviembre', 'Diciembre']
+
+# Bytes del final de lo ya leído que se comparan para saber si el archivo
+# solo creció o si se reescribió
+COLA = 4096
+
+
+def dia_semana(fechas):
+    """
+    @param fechas: Un DatetimeIndex (o arreglo de datetime64)
+    @return: Un ndarray con el día de la semana (0 es lunes)
+    """
+    dias = np.asarray(fechas, dtype='datetime64[D]').astype(np.int64)
+    return (dias + 3) % 7          # el 1 de enero de 1970 fue jueves
+
+
+def mes(fechas):
+    """
+    @return: Un ndarray con el mes de cada fecha (0 es enero)
+    """
+    fechas = np.asarray(fechas)
+    meses = fechas.astype('datetime64[M]').astype(np.int64)
+    return meses % 12
+
+
+def mismo_grupo(fechas):
+    """
+    @return: Ceros, todas las fechas en un solo grupo
+    """
+    return np.zeros(len(fechas), dtype=np.int64)
+
+
+class Acumulador:
+    """
+    Número de datos, suma, media y suma de cuadrados de las desviaciones
+    (M2) para n_grupos x n_columnas series a la vez. Los valores faltantes
+    (NaN) no cuentan.
+    """
+    def __init__(self, n_grupos, n_columnas):
+        self.n = np.zeros((n_grupos, n_columnas), dtype=np.int64)
+        self.suma = np.zeros((n_grupos, n_columnas), dtype=np.int64)
+        self.media = np.zeros((n_grupos, n_columnas))
+        self.m2 = np.zeros((n_grupos, n_columnas))
+
+    def _junta(self, n, suma, media, m2):
+        """
+        Fórmula de Chan: junta las estadísticas de otro conjunto de datos
+        con las que ya se tienen
+        """
+        total = self.n + n
+        con_datos = total > 0
+        peso = np.divide(n, total, out=np.zeros(total.shape),
+                         where=con_datos)
+        delta = media - self.media
+        self.m2 += m2 + delta ** 2 * self.n * peso
+        self.media += delta * peso
+        self.n = total
+        self.suma += suma
+
+    def actualiza(self, grupos, valores):
+        """
+        Agrega un lote de filas
+        @param grupos: Un ndarray de enteros, el grupo de cada fila
+        @param valores: Un ndarray de filas x n_columnas (float, con NaN
+                        donde falta el dato)
+        """
+        n_grupos, n_columnas = self.n.shape
+        presentes = ~np.isnan(valores)
+        casillas = (grupos[:, None] * n_columnas +
+                    np.arange(n_columnas))[presentes]
+        datos = valores[presentes]
+
+        def por_casilla(pesos=None):
+            return np.bincount(casillas, pesos, n_grupos * n_columnas
+                               ).reshape(n_grupos, n_columnas)
+
+        n = por_casilla().astype(np.int64)
+        suma = por_casilla(datos)
+        media = np.divide(suma, n, out=np.zeros(n.shape), where=n > 0)
+        m2 = por_casilla((datos - media.ravel()[casillas]) ** 2)
+        self._junta(n, np.rint(suma).astype(np.int64), media, m2)
+        return self
+
+    def combina(self, otro):
+        """
+        Junta los datos de otro acumulador con la misma forma
+        """
+        self._junta(otro.n, otro.suma, otro.media, otro.m2)
+        return self
+
+    def expande(self, posiciones, n_columnas):
+        """
+        @param posiciones: La columna que le toca a cada columna actual
+        @return: Un Acumulador nuevo de n_columnas, con las columnas que no
+                 están en `posiciones` vacías
+        """
+        expandido = Acumulador(self.n.shape[0], n_columnas)
+        for atributo in ('n', 'suma', 'media', 'm2'):
+            getattr(expandido, atributo)[:, list(posiciones)] = getattr(
+                self, atributo)
+        return expandido
+
+    def varianza(self):
+        """
+        @return: La varianza muestral (como pandas, ddof=1), NaN donde hay
+                 menos de dos datos
+        """
+        return np.divide(self.m2, self.n - 1, out=np.full(self.n.shape,
+                                                          np.nan),
+                         where=self.n > 1)
+
+    def a_diccionario(self):
+        return {'n': self.n.tolist(), 'suma': self.suma.tolist(),
+                'media': self.media.tolist(), 'm2': self.m2.tolist()}
+
+    @staticmethod
+    def desde_diccionario(estado):
+        n = np.array(estado['n'], dtype=np.int64)
+        acumulador = Acumulador(*n.shape)
+        acumulador.n = n
+        acumulador.suma = np.array(estado['suma'], dtype=np.int64)
+        acumulador.media = np.array(estado['media'], dtype=float)
+        acumulador.m2 = np.array(estado['m2'], dtype=float)
+        return acumulador
+
+
+class AgregadorBicicletas:
+    """
+    Agregados por día de la semana, por mes y totales de cada contador de
+    un archivo de conteos que solo crece (se le agregan días al final)
+    """
+    # Cada agrupación: (función que da el grupo de cada fecha, número de
+    # grupos, nombres de los grupos)
+    AGRUPACIONES = {'dia_semana': (dia_semana, 7, DIAS),
+                    'mes': (mes, 12, MESES),
+                    'contador': (mismo_grupo, 1, ['Total'])}
+
+    def __init__(self, columnas=None):
+        """
+        @param columnas: Los nombres de los contadores (None para tomarlos
+                         del encabezado del primer archivo)
+        """
+        self.columnas = None
+        self.acumuladores = {}
+        self.posicion = 0          # bytes del archivo ya agregados
+        self.crc_cola = 0          # crc32 de los últimos COLA bytes leídos
+        if columnas is not None:
+            self.inicia(columnas)
+
+    def inicia(self, columnas):
+        self.columnas = list(columnas)
+        self.acumuladores = {
+            nombre: Acumulador(n_grupos, len(self.columnas))
+            for (nombre, (_, n_grupos, _)) in self.AGRUPACIONES.items()}
+        self.posicion, self.crc_cola = 0, 0
+
+    def agrega(self, datos):
+        """
+        Agrega días nuevos
+        @param datos: Un DataFrame como el de bicicletas.lee_bicicletas
+                      (índice de fechas, una columna por contador)
+        """
+        if self.columnas is None:
+            self.inicia(datos.columns)
+        self.alinea(datos.columns)
+        valores = datos.reindex(columns=self.columnas).to_numpy(
+            dtype=float, na_value=np.nan)
+        for (nombre, (grupo, _, _)) in self.AGRUPACIONES.items():
+            self.acumuladores[nombre].actualiza(grupo(datos.index), valores)
+        return self
+
+    def alinea(self, columnas):
+        """
+        Agrega al final, sin datos, los contadores de `columnas` que no se
+        tenían
+        """
+        nuevas = [c for c in columnas if c not in set(self.columnas)]
+        if nuevas:
+            posiciones = range(len(self.columnas))
+            self.columnas = self.columnas + nuevas
+            self.acumuladores = {
+                nombre: acumulador.expande(posiciones, len(self.columnas))
+                for (nombre, acumulador) in self.acumuladores.items()}
+
+    def combina(self, otro):
+        """
+        Junta los agregados de otros datos (otro archivo, u otro pedazo del
+        mismo). Los contadores que solo tiene `otro` se agregan al final.
+        Un agregador sin datos (de un archivo vacío) no cambia nada.
+        """
+        if otro.columnas is None:
+            return self
+        if self.columnas is None:
+            self.inicia(otro.columnas)
+        self.alinea(otro.columnas)
+        indice = {columna: k for (k, columna) in enumerate(self.columnas)}
+        posiciones = [indice[columna] for columna in otro.columnas]
+        for (nombre, acumulador) in otro.acumuladores.items():
+            self.acumuladores[nombre].combina(
+                acumulador.expande(posiciones, len(self.columnas)))
+        return self
+
+    def actualiza_archivo(self, ruta, encoding='utf8'):
+        """
+        Agrega las filas que se añadieron al archivo desde la última
+        llamada, leyendo solo los bytes nuevos. Si el archivo se reescribió
+        (es más chico, o cambió lo ya leído) se empieza de cero.
+        @return: El número de filas agregadas
+        """
+        with open(ruta, 'rb') as archivo:
+            if not self._solo_crecio(archivo):
+                self.columnas = None
+                self.posicion = 0
+            archivo.seek(0)
+            linea = archivo.readline()
+            columnas = linea.decode(encoding).rstrip('\r\n').split(
+                bicicletas.SEPARADOR)
+            if self.columnas is None:
+                self.inicia([c for c in columnas
+                             if c != bicicletas.COLUMNA_FECHA])
+            self.posicion = max(self.posicion, len(linea))
+            archivo.seek(self.posicion)
+            nuevo = archivo.read()
+        # Una última línea sin salto puede estar a medio escribir
+        nuevo = nuevo[:nuevo.rfind(b'\n') + 1]
+        if not nuevo.strip():
+            return 0
+        crudo = pd.read_csv(io.BytesIO(nuevo), sep=bicicletas.SEPARADOR,
+                            encoding=encoding, header=None,
+                            names=columnas,
+                            dtype={bicicletas.COLUMNA_FECHA: object})
+        self.agrega(bicicletas.limpia(crudo))
+        self.posicion += len(nuevo)
+        with open(ruta, 'rb') as archivo:
+            self.crc_cola = self._crc_cola(archivo)
+        return len(crudo)
+
+    def _crc_cola(self, archivo):
+        inicio = max(0, self.posicion - COLA)
+        archivo.seek(inicio)
+        return zlib.crc32(archivo.read(self.posicion - inicio))
+
+    def _solo_crecio(self, archivo):
+        archivo.seek(0, os.SEEK_END)
+        if archivo.tell() < self.posicion:
+            return False
+        return self._crc_cola(archivo) == self.crc_cola
+
+    def tabla(self, agrupacion, estadistico='suma'):
+        """
+        @param agrupacion: 'dia_semana', 'mes' o 'contador'
+        @param estadistico: 'suma', 'n', 'media', 'varianza' o 'desviacion'
+        @return: Un DataFrame de grupos x contadores. Los grupos sin datos
+                 (meses que no aparecen) no se incluyen, así que sin
+                 ningún dato la tabla está vacía.
+        """
+        if self.columnas is None:
+            return pd.DataFrame(dtype=float)
+        acumulador = self.acumuladores[agrupacion]
+        if estadistico == 'varianza':
+            valores = acumulador.varianza()
+        elif estadistico == 'desviacion':
+            valores = np.sqrt(acumulador.varianza())
+        elif estadistico == 'media':
+            valores = np.where(acumulador.n > 0, acumulador.media, np.nan)
+        else:
+            valores = getattr(acumulador, estadistico)
+        nombres = self.AGRUPACIONES[agrupacion][2]
+        tabla = pd.DataFrame(valores, index=nombres, columns=self.columnas)
+        return tabla[acumulador.n.any(axis=1)]
+
+    def por_dia_semana(self, estadistico='suma'):
+        """
+        La tabla paseos_por_dia de la libreta (para todos los contadores)
+        """
+        return self.tabla('dia_semana', estadistico)
+
+    def por_mes(self, estadistico='suma', total=False):
+        """
+        La tabla paseos_por_mes de la libreta
+        @param total: Si es True se agrega la columna 'Total' con la suma
+                      de todos los contadores
+        """
+        tabla = self.tabla('mes', estadistico)
+        if total:
+            tabla['Total'] = tabla.sum(axis=1)
+        return tabla
+
+    def guarda(self, ruta):
+        """
+        Guarda el estado en un archivo JSON (de forma atómica)
+        """
+        estado = {'columnas': self.columnas, 'posicion': self.posicion,
+                  'crc_cola': self.crc_cola,
+                  'acumuladores': {nombre: acumulador.a_diccionario()
+                                   for (nombre, acumulador)
+                                   in self.acumuladores.items()}}
+        temporal = ruta + '.tmp'
+        with open(temporal, 'w', encoding='utf8') as archivo:
+            json.dump(estado, archivo, ensure_ascii=False)
+        os.replace(temporal, ruta)
+
+    @staticmethod
+    def carga(ruta):
+        """
+        @return: Un AgregadorBicicletas con el estado guardado en `ruta`
+        """
+        with open(ruta, encoding='utf8') as archivo:
+            estado = json.load(archivo)
+        agregador = AgregadorBicicletas()
+        agregador.columnas = estado['columnas']
+        agregador.posicion = estado['posicion']
+        agregador.crc_cola = estado['crc_cola']
+        agregador.acumuladores = {
+            nombre: Acumulador.desde_diccionario(acumulador)
+            for (nombre, acumulador) in estado['acumuladores'].items()}
+        return agregador
+
+
+if __name__ == "__main__":
+
+    import sys
+
+    ruta = sys.argv[1] if len(sys.argv) > 1 else 'bikes.csv'
+    agregador = AgregadorBicicletas()
+    print("Filas agregadas: {}".format(agregador.actualiza_archivo(ruta)))
+    print(agregador.por_dia_semana()[['Berri 1']])
+    print(agregador.por_mes(total=True))
+    print(agregador.tabla('contador', 'desviacion').round(1))
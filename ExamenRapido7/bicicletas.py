@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+bicicletas.py
+-------------
+Carga rápida de los archivos de contadores de ciclistas (como bikes.csv).
+
+Los archivos tienen una columna Date con fechas dd/mm/aaaa y una columna
+por contador, separadas por ';'. En lugar de dejar que pandas adivine las
+fechas (parse_dates con dayfirst, que es lo lento) se usa el formato
+explícito, y los conteos se guardan con el entero más chico en que caben.
+Las columnas que vienen vacías ("données non disponibles") o con huecos se
+guardan como enteros con valores faltantes (UInt8, UInt16, ...) en vez de
+volver float64 todo.
+
+La primera vez que se lee un archivo se escribe un caché por columnas
+(un .npy por columna y un JSON con los metadatos) junto al archivo. Las
+siguientes lecturas abren los .npy con memoria mapeada, sin copiarlos,
+mientras el archivo original no cambie (se compara la fecha de
+modificación y el tamaño, y si no coinciden, el sha1 del contenido).
+
+    >>> from bicicletas import lee_bicicletas
+    >>> fixed_df = lee_bicicletas('bikes.csv')
+"""
+
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+
+__author__ = 'Raul Perez'
+
+COLUMNA_FECHA = 'Date'
+FORMATO_FECHA = '%d/%m/%Y'
+SEPARADOR = ';'
+
+# Se cambia si cambia el formato del caché, para no leer cachés viejos
+VERSION_CACHE = 1
+
+
+def sha1_archivo(ruta, tamano_bloque=2 ** 20):
+    """
+    @return: El sha1 del contenido de un archivo, en hexadecimal
+    """
+    sha1 = hashlib.sha1()
+    with open(ruta, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(tamano_bloque), b''):
+            sha1.update(bloque)
+    return sha1.hexdigest()
+
+
+def firma_archivo(ruta):
+    """
+    @return: Un diccionario con la fecha de modificación (ns) y el tamaño
+    """
+    estado = os.stat(ruta)
+    return {'mtime_ns': estado.st_mtime_ns, 'tamano': estado.st_size}
+
+
+def tipo_compacto(valores):
+    """
+    El tipo entero más chico para una columna de conteos
+    @param valores: Una serie de conteos (int64, o float64 con NaN si
+                    tiene huecos)
+    @return: Un tipo de numpy si no faltan valores, o el nombre de un tipo
+             entero de pandas con valores faltantes ('UInt16', 'Int32'...)
+    """
+    presentes = valores.dropna()
+    if len(presentes) == 0:
+        minimo = maximo = 0
+    else:
+        minimo, maximo = int(presentes.min()), int(presentes.max())
+    tipo = np.result_type(np.min_scalar_type(minimo),
+                          np.min_scalar_type(maximo))
+    if len(presentes) == len(valores):
+        return tipo
+    return tipo.name.capitalize().replace('Uint', 'UInt')
+
+
+def limpia(crudo, formato=FORMATO_FECHA):
+    """
+    Convierte lo que regresa read_csv (fechas como texto, conteos como
+    int64 o float64) en la tabla final: índice de fechas y conteos
+    compactos. Los float64 son solo de paso: los conteos son enteros
+    chicos, así que la conversión de regreso a entero es exacta.
+    @param crudo: Un DataFrame con la columna COLUMNA_FECHA
+    @param formato: Formato de las fechas (con hora si el archivo trae
+                    conteos de menos de un día)
+    @return: Un DataFrame con índice DatetimeIndex llamado COLUMNA_FECHA
+    """
+    fechas = pd.to_datetime(crudo[COLUMNA_FECHA], format=formato)
+    conteos = crudo.drop(columns=COLUMNA_FECHA)
+    conteos = conteos.astype({columna: tipo_compacto(conteos[columna])
+                              for columna in conteos.columns})
+    conteos.index = pd.DatetimeIndex(fechas, name=COLUMNA_FECHA)
+    return conteos
+
+
+def lee_csv(ruta, encoding='utf8'):
+    """
+    Lee y limpia un archivo de contadores sin usar el caché
+    @param ruta: Ruta del archivo
+    @return: Un DataFrame como el de limpia
+    """
+    # Pedir Int64 directo a read_csv es varias veces más lento que dejar
+    # que infiera int64/float64 y convertir después
+    crudo = pd.read_csv(ruta, sep=SEPARADOR, encoding=encoding,
+                        dtype={COLUMNA_FECHA: object})
+    return limpia(crudo)
+
+
+def directorio_cache(ruta):
+    """
+    @return: El directorio del caché de un archivo (junto a él)
+    """
+    directorio, nombre = os.path.split(os.path.abspath(ruta))
+    return os.path.join(directorio, '.cache_' + nombre)
+
+
+def escribe_metadatos(directorio, metadatos):
+    """
+    Escribe metadatos.json de un caché de forma atómica
+    """
+    temporal = os.path.join(directorio, 'metadatos.json.tmp')
+    with open(temporal, 'w', encoding='utf8') as archivo:
+        json.dump(metadatos, archivo, ensure_ascii=False, indent=1)
+    os.replace(temporal, os.path.join(directorio, 'metadatos.json'))
+
+
+def guarda_cache(datos, directorio, firma):
+    """
+    Escribe un DataFrame de limpia como un .npy por columna. Las columnas
+    con valores faltantes guardan los valores (con 0 en los huecos) y una
+    máscara aparte; las que vienen completamente vacías solo se anotan en
+    los metadatos. Los metadatos se escriben al final, así que un caché a
+    medio escribir nunca se toma como válido.
+    @param firma: Diccionario con mtime_ns, tamano y sha1 del original
+    """
+    os.makedirs(directorio, exist_ok=True)
+    np.save(os.path.join(directorio, 'fechas.npy'), datos.index.values)
+    columnas = []
+    for (k, nombre) in enumerate(datos.columns):
+        serie = datos[nombre]
+        columna = {'nombre': nombre, 'tipo': str(serie.dtype)}
+        if isinstance(serie.dtype, np.dtype):
+            columna['archivo'] = 'columna_{}.npy'.format(k)
+            np.save(os.path.join(directorio, columna['archivo']),
+                    serie.to_numpy())
+        elif serie.notna().any():
+            columna['archivo'] = 'columna_{}.npy'.format(k)
+            columna['mascara'] = 'mascara_{}.npy'.format(k)
+            arreglo = serie.array
+            np.save(os.path.join(directorio, columna['archivo']),
+                    arreglo.to_numpy(dtype=serie.dtype.numpy_dtype,
+                                     na_value=0))
+            np.save(os.path.join(directorio, columna['mascara']),
+                    np.asarray(arreglo.isna()))
+        columnas.append(columna)
+    metadatos = dict(firma, version=VERSION_CACHE, filas=len(datos),
+                     columnas=columnas)
+    escribe_metadatos(directorio, metadatos)
+
+
+def abre_cache(directorio, metadatos):
+    """
+    Arma el DataFrame a partir de los .npy con memoria mapeada (solo
+    lectura), sin copiar los datos
+    """
+    def carga(archivo):
+        return np.load(os.path.join(directorio, archivo), mmap_mode='r')
+
+    columnas = {}
+    for columna in metadatos['columnas']:
+        tipo = pd.api.types.pandas_dtype(columna['tipo'])
+        if 'archivo' not in columna:
+            columnas[columna['nombre']] = tipo.construct_array_type()(
+                np.zeros(metadatos['filas'], dtype=tipo.numpy_dtype),
+                np.ones(metadatos['filas'], dtype=bool))
+        elif 'mascara' in columna:
+            columnas[columna['nombre']] = tipo.construct_array_type()(
+                carga(columna['archivo']), carga(columna['mascara']))
+        else:
+            columnas[columna['nombre']] = carga(columna['archivo'])
+    indice = pd.DatetimeIndex(carga('fechas.npy'), name=COLUMNA_FECHA)
+    return pd.DataFrame(columnas, index=indice, copy=False)
+
+
+def metadatos_validos(ruta, directorio):
+    """
+    Revisa si el caché de un archivo corresponde a su contenido actual
+    @return: Los metadatos del caché, o None si no hay o no sirve
+    """
+    try:
+        with open(os.path.join(directorio, 'metadatos.json'),
+                  encoding='utf8') as archivo:
+            metadatos = json.load(archivo)
+    except (OSError, ValueError):
+        return None
+    if metadatos.get('version') != VERSION_CACHE:
+        return None
+    firma = firma_archivo(ruta)
+    if (firma['mtime_ns'] == metadatos['mtime_ns'] and
+            firma['tamano'] == metadatos['tamano']):
+        return metadatos
+    # Cambió la fecha (se copió o se tocó el archivo): se compara el sha1
+    if (firma['tamano'] != metadatos['tamano'] or
+            sha1_archivo(ruta) != metadatos['sha1']):
+        return None
+    metadatos.update(firma)
+    escribe_metadatos(directorio, metadatos)
+    return metadatos
+
+
+def lee_bicicletas(ruta='bikes.csv', cache=True, encoding='utf8'):
+    """
+    Lee un archivo de contadores de ciclistas, usando el caché si existe y
+    el archivo no ha cambiado
+    @param ruta: Ruta del archivo ';'-separado
+    @param cache: False para no leer ni escribir el caché
+    @return: Un DataFrame con índice de fechas (Date) y una columna de
+             enteros por contador. Las columnas que vienen del caché son
+             de solo lectura (usa .copy() para modificarlas).
+    """
+    if not cache:
+        return lee_csv(ruta, encoding)
+    directorio = directorio_cache(ruta)
+    metadatos = metadatos_validos(ruta, directorio)
+    if metadatos is None:
+        firma = dict(firma_archivo(ruta), sha1=sha1_archivo(ruta))
+        guarda_cache(lee_csv(ruta, encoding), directorio, firma)
+        metadatos = metadatos_validos(ruta, directorio)
+    return abre_cache(directorio, metadatos)
+
+
+if __name__ == "__main__":
+
+    import sys
+    from time import perf_counter
+
+    ruta = sys.argv[1] if len(sys.argv) > 1 else 'bikes.csv'
+    pruebas = [('read_csv (libreta)',
+                lambda: pd.read_csv(ruta, sep=';', encoding='utf8',
+                                    parse_dates=['Date'], dayfirst=True,
+                                    index_col='Date')),
+               ('lee_bicicletas sin caché',
+                lambda: lee_bicicletas(ruta, cache=False)),
+               ('lee_bicicletas con caché', lambda: lee_bicicletas(ruta))]
+    lee_bicicletas(ruta)
+    for (nombre, lectura) in pruebas:
+        mejor = float('inf')
+        for _ in range(5):
+            inicio = perf_counter()
+            datos = lectura()
+            mejor = min(mejor, perf_counter() - inicio)
+        print("{:<26}{:>10.5f} s{:>10} bytes".format(
+            nombre, mejor, datos.memory_usage(deep=True).sum()))
+    print(datos.dtypes)
@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+graficas.py
+-----------
+Preparación de los datos de las gráficas de contadores de ciclistas.
+
+Con series de muchos años, fixed_df.plot() le pasa a matplotlib todos los
+puntos de todas las columnas aunque la gráfica solo tenga unos cientos de
+pixeles de ancho. Aquí cada serie se reduce antes de graficar a lo más
+`ancho` puntos, con LTTB (Largest-Triangle-Three-Buckets, conserva la
+forma de la curva) o con el mínimo y el máximo de cada intervalo
+(conserva los picos). Las series reducidas se guardan por rango de fechas
+(el zoom), así que volver a una vista ya vista no recalcula nada.
+
+Las entradas del boxplot por día de la semana se arman con un solo
+reshape de la serie diaria a una matriz de semanas x 7, en lugar de
+reemplazar el número del día por su nombre con replace.
+
+    >>> preparador = PreparadorGraficas(lee_bicicletas('bikes.csv'))
+    >>> preparador.grafica(['Berri 1', 'du Parc'], '2012-05', '2012-08')
+    >>> cajas_por_dia(fixed_df['Berri 1']).boxplot()
+"""
+
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from agregados import DIAS, dia_semana
+
+__author__ = 'Raul Perez'
+
+
+def lttb(x, y, n_puntos):
+    """
+    Reducción Largest-Triangle-Three-Buckets. Se conservan el primer y el
+    último punto; el resto se parte en n_puntos - 2 intervalos y de cada
+    uno se escoge el punto que forma el triángulo más grande con el punto
+    escogido en el intervalo anterior y el promedio del siguiente.
+    @param x, y: ndarrays de float del mismo tamaño, sin NaN
+    @param n_puntos: Número de puntos que se quieren
+    @return: Un ndarray con los índices de los puntos que se conservan
+    """
+    n = len(y)
+    if n_puntos >= n or n_puntos < 3:
+        return np.arange(n)
+    bordes = np.linspace(1, n - 1, n_puntos - 1).astype(np.int64)
+    # Promedio de cada intervalo, más el último punto como "siguiente" del
+    # último intervalo
+    tamanos = np.diff(bordes)
+    promedio_x = np.append(np.add.reduceat(x[1:n - 1], bordes[:-1] - 1) /
+                           tamanos, x[-1])
+    promedio_y = np.append(np.add.reduceat(y[1:n - 1], bordes[:-1] - 1) /
+                           tamanos, y[-1])
+    indices = np.empty(n_puntos, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    a = 0
+    for k in range(n_puntos - 2):
+        inicio, fin = bordes[k], bordes[k + 1]
+        areas = np.abs((x[a] - promedio_x[k + 1]) * (y[inicio:fin] - y[a]) -
+                       (x[a] - x[inicio:fin]) * (promedio_y[k + 1] - y[a]))
+        a = inicio + int(np.argmax(areas))
+        indices[k + 1] = a
+    return indices
+
+
+def minimo_maximo(x, y, n_puntos):
+    """
+    Reducción por mínimo y máximo: la serie se parte en n_puntos / 2
+    intervalos iguales y de cada uno se conservan el punto más bajo y el
+    más alto, así no se pierde ningún pico
+    @param x: No se usa (los puntos se suponen en orden)
+    @return: Un ndarray ordenado con los índices que se conservan
+    """
+    n = len(y)
+    if n_puntos >= n or n_puntos < 2:
+        return np.arange(n)
+    tamano = -(-n // (n_puntos // 2))
+    faltan = (-n) % tamano
+    bajos = np.pad(y, (0, faltan), constant_values=np.inf).reshape(-1, tamano)
+    altos = np.pad(y, (0, faltan), constant_values=-np.inf).reshape(-1,
+                                                                    tamano)
+    inicios = np.arange(len(bajos)) * tamano
+    return np.unique(np.concatenate((inicios + bajos.argmin(axis=1),
+                                     inicios + altos.argmax(axis=1))))
+
+
+METODOS = {'lttb': lttb, 'minmax': minimo_maximo}
+
+
+def reduce_serie(serie, ancho=1000, metodo='lttb'):
+    """
+    @param serie: Una serie con índice de fechas ordenado
+    @param ancho: Número máximo de puntos (el ancho de la gráfica en pixeles)
+    @param metodo: 'lttb' o 'minmax'
+    @return: La serie con a lo más `ancho` puntos, sin los días sin dato
+    """
+    serie = serie.dropna()
+    x = serie.index.asi8.astype(float)
+    y = serie.to_numpy(dtype=float)
+    return serie.iloc[METODOS[metodo](x, y, ancho)]
+
+
+def cajas_por_dia(serie):
+    """
+    Entradas del boxplot por día de la semana. La serie se pasa a diaria
+    (los días que faltan quedan en NaN), se completa con NaN hasta semanas
+    enteras de lunes a domingo y se acomoda con un reshape en una matriz
+    de semanas x 7.
+    @param serie: Una serie de conteos diarios con índice de fechas
+    @return: Un DataFrame con una fila por semana y una columna por día
+             (DIAS, de lunes a domingo), listo para DataFrame.boxplot()
+    """
+    if len(serie) == 0:
+        return pd.DataFrame(columns=DIAS, dtype=float)
+    diaria = serie.asfreq('D')
+    valores = diaria.to_numpy(dtype=float, na_value=np.nan)
+    antes = int(dia_semana(diaria.index[:1])[0])
+    despues = -(antes + len(valores)) % 7
+    valores = np.pad(valores, (antes, despues), constant_values=np.nan)
+    return pd.DataFrame(valores.reshape(-1, 7), columns=DIAS)
+
+
+class PreparadorGraficas:
+    """
+    Series reducidas de un DataFrame de contadores, guardadas por columna,
+    rango de fechas y método. Guarda a lo más `tamano_cache` series y
+    desaloja la usada hace más tiempo (LRU).
+    """
+    def __init__(self, datos, ancho=1000, tamano_cache=64):
+        """
+        @param datos: Un DataFrame con índice de fechas ordenado (como el
+                      de bicicletas.lee_bicicletas)
+        @param ancho: Número máximo de puntos de cada serie
+        @param tamano_cache: Número máximo de series reducidas guardadas
+        """
+        self.datos = datos
+        self.ancho = ancho
+        self.tamano_cache = tamano_cache
+        self.cache = OrderedDict()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def serie(self, columna, inicio=None, fin=None, metodo='lttb'):
+        """
+        @param columna: Nombre del contador
+        @param inicio, fin: Rango de fechas (None para no limitarlo), como
+                            en datos.loc[inicio:fin]
+        @return: La serie reducida (una pd.Series)
+        """
+        clave = (columna, inicio, fin, self.ancho, metodo)
+        reducida = self.cache.get(clave)
+        if reducida is not None:
+            self.aciertos += 1
+            self.cache.move_to_end(clave)
+            return reducida
+        self.fallos += 1
+        reducida = reduce_serie(self.datos[columna].loc[inicio:fin],
+                                self.ancho, metodo)
+        self.cache[clave] = reducida
+        if len(self.cache) > self.tamano_cache:
+            self.cache.popitem(last=False)
+        return reducida
+
+    def grafica(self, columnas=None, inicio=None, fin=None, metodo='lttb',
+                ax=None, **opciones):
+        """
+        Como datos[columnas].loc[inicio:fin].plot(), pero con las series
+        reducidas
+        @param columnas: Lista de contadores (None para todos)
+        @param ax: Ejes de matplotlib (None para crear una figura)
+        @param opciones: Se pasan a ax.plot
+        @return: Los ejes de matplotlib
+        """
+        import matplotlib.pyplot as plt
+        if ax is None:
+            ax = plt.figure(figsize=opciones.pop('figsize', None)).gca()
+        if columnas is None:
+            columnas = list(self.datos.columns)
+        for columna in columnas:
+            reducida = self.serie(columna, inicio, fin, metodo)
+            ax.plot(reducida.index, reducida.to_numpy(dtype=float),
+                    label=columna, **opciones)
+        ax.legend()
+        return ax
+
+
+if __name__ == "__main__":
+
+    from time import perf_counter
+
+    n = 10 ** 6
+    generador = np.random.default_rng(0)
+    fechas = pd.date_range('1900-01-01', periods=n, freq='D')
+    serie = pd.Series(generador.poisson(3000, n), index=fechas)
+
+    for metodo in METODOS:
+        inicio = perf_counter()
+        reducida = reduce_serie(serie, 1000, metodo)
+        print("{:<8}{} -> {} puntos en {:.4f} s".format(
+            metodo, n, len(reducida), perf_counter() - inicio))
+
+    inicio = perf_counter()
+    cajas = cajas_por_dia(serie)
+    t_reshape = perf_counter() - inicio
+    inicio = perf_counter()
+    dias = serie.to_frame('conteo')
+    dias['Día de la semana'] = dias.index.weekday
+    dias.replace({'Día de la semana': dict(enumerate(DIAS))}, inplace=True)
+    t_replace = perf_counter() - inicio
+    print("Entradas del boxplot: reshape {:.4f} s, replace {:.4f} s".format(
+        t_reshape, t_replace))
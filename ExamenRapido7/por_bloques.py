@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+por_bloques.py
+--------------
+Procesamiento por bloques de archivos de contadores que no caben en
+memoria (muchos años, cientos de estaciones).
+
+Cada archivo se lee en bloques de un número fijo de filas y cada bloque
+pasa por el mismo camino que los datos completos en la libreta: lectura y
+limpieza (bicicletas.limpia), paso a conteos diarios, y las sumas por día
+de la semana y por mes (agregados.AgregadorBicicletas). En memoria solo
+hay un bloque a la vez más los agregados, así que la memoria no depende
+del tamaño del archivo. Los archivos se reparten en un grupo de procesos
+y los agregados de todos se juntan al final.
+
+    >>> agregador = procesa_archivos(['2012.csv', '2013.csv', '2014.csv'])
+    >>> agregador.por_dia_semana()      # paseos_por_dia
+    >>> agregador.por_mes(total=True)   # paseos_por_mes
+
+Los archivos deben venir en orden cronológico (como los exporta el
+sistema de contadores).
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import bicicletas
+from agregados import AgregadorBicicletas
+
+__author__ = 'Raul Perez'
+
+FILAS_BLOQUE = 100000
+
+
+def lee_bloques(ruta, filas=FILAS_BLOQUE, formato=bicicletas.FORMATO_FECHA,
+                encoding='utf8'):
+    """
+    Lee un archivo de contadores por bloques
+    @param filas: Número de filas de cada bloque
+    @param formato: Formato de las fechas (ver bicicletas.limpia)
+    @return: Un generador de DataFrames limpios (índice de fechas). Un
+             archivo vacío no da ningún bloque.
+    """
+    try:
+        lector = pd.read_csv(ruta, sep=bicicletas.SEPARADOR,
+                             encoding=encoding,
+                             dtype={bicicletas.COLUMNA_FECHA: object},
+                             chunksize=filas)
+    except pd.errors.EmptyDataError:
+        return
+    with lector:
+        for crudo in lector:
+            yield bicicletas.limpia(crudo, formato)
+
+
+def suma_por_dia(bloque):
+    """
+    @return: Los conteos de un bloque sumados por día. Un día sin ningún
+             dato de un contador queda como faltante, no como 0.
+    """
+    return bloque.groupby(bloque.index.normalize()).sum(min_count=1)
+
+
+def diarios(bloques):
+    """
+    Pasa los bloques a conteos por día. Como un día puede quedar partido
+    entre dos bloques, las filas del último día de cada bloque se guardan
+    y se juntan con el bloque siguiente.
+    @param bloques: Un iterable de DataFrames en orden cronológico
+    @return: Un generador de DataFrames con una fila por día
+    """
+    pendiente = None
+    for bloque in bloques:
+        if len(bloque) == 0:
+            continue
+        if pendiente is not None:
+            bloque = pd.concat([pendiente, bloque])
+        dias = bloque.index.normalize()
+        completos = dias < dias[-1]
+        if completos.any():
+            yield suma_por_dia(bloque[completos])
+        pendiente = bloque[~completos]
+    if pendiente is not None and len(pendiente) > 0:
+        yield suma_por_dia(pendiente)
+
+
+def procesa_archivo(ruta, filas=FILAS_BLOQUE,
+                    formato=bicicletas.FORMATO_FECHA):
+    """
+    Agregados de un archivo, leyéndolo por bloques
+    @return: Un agregados.AgregadorBicicletas
+    """
+    agregador = AgregadorBicicletas()
+    for dia in diarios(lee_bloques(ruta, filas, formato)):
+        agregador.agrega(dia)
+    return agregador
+
+
+def procesa_archivos(rutas, filas=FILAS_BLOQUE,
+                     formato=bicicletas.FORMATO_FECHA, n_trabajadores=None):
+    """
+    Agregados de varios archivos, procesados en paralelo
+    @param rutas: Lista de rutas de archivos
+    @param n_trabajadores: Número de procesos (por default uno por CPU,
+                           sin pasar del número de archivos)
+    @return: Un agregados.AgregadorBicicletas con los datos de todos los
+             archivos. Los contadores quedan en el orden en que aparecen
+             en los archivos. Sin archivos, o si todos están vacíos, los
+             agregados quedan vacíos.
+    """
+    rutas = list(rutas)
+    n_trabajadores = min(n_trabajadores or os.cpu_count(), len(rutas))
+    if n_trabajadores <= 1:
+        parciales = (procesa_archivo(ruta, filas, formato) for ruta in rutas)
+    else:
+        ejecutor = ProcessPoolExecutor(n_trabajadores)
+        parciales = ejecutor.map(procesa_archivo, rutas,
+                                 [filas] * len(rutas),
+                                 [formato] * len(rutas))
+    total = AgregadorBicicletas()
+    try:
+        for parcial in parciales:
+            total.combina(parcial)
+    finally:
+        if n_trabajadores > 1:
+            ejecutor.shutdown()
+    return total
+
+
+if __name__ == "__main__":
+
+    import sys
+    from time import perf_counter
+
+    rutas = sys.argv[1:] or ['bikes.csv']
+    inicio = perf_counter()
+    agregador = procesa_archivos(rutas)
+    print("{} archivo(s) en {:.2f} segundos".format(
+        len(rutas), perf_counter() - inicio))
+    print(agregador.por_dia_semana())
+    print(agregador.por_mes(total=True))
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Pruebas de regresión de los módulos de contadores de ciclistas (se corren
+con pytest)
+"""
+
+import os
+import shutil
+import numpy as np
+import pandas as pd
+import bicicletas
+import por_bloques
+
+__author__ = 'Raul Perez'
+
+AQUI = os.path.dirname(os.path.abspath(__file__))
+
+
+def copia_bicicletas(directorio):
+    """
+    Copia bikes.csv a un directorio temporal (el caché se escribe junto
+    al archivo)
+    """
+    ruta = os.path.join(str(directorio), 'bikes.csv')
+    shutil.copy(os.path.join(AQUI, 'bikes.csv'), ruta)
+    return ruta
+
+
+def test_por_bloques_sin_datos(tmp_path):
+    vacio = tmp_path / 'vacio.csv'
+    vacio.write_text('')
+    encabezado = tmp_path / 'encabezado.csv'
+    with open(os.path.join(AQUI, 'bikes.csv'), encoding='utf8') as archivo:
+        encabezado.write_text(archivo.readline(), encoding='utf8')
+    for rutas in ([], [str(vacio)], [str(encabezado)]):
+        agregador = por_bloques.procesa_archivos(rutas, n_trabajadores=1)
+        assert agregador.por_dia_semana().empty
+        assert agregador.por_mes(total=True).empty
+    completo = por_bloques.procesa_archivos(
+        [copia_bicicletas(tmp_path)], n_trabajadores=1)
+    con_vacios = por_bloques.procesa_archivos(
+        [str(vacio), copia_bicicletas(tmp_path), str(encabezado)],
+        n_trabajadores=2)
+    pd.testing.assert_frame_equal(con_vacios.por_mes(), completo.por_mes())
+
+
+def lee_como_la_libreta(ruta):
+    return pd.read_csv(ruta, sep=';', encoding='utf8', parse_dates=['Date'],
+                       dayfirst=True, index_col='Date')
+
+
+def test_cache_por_columnas_ida_y_vuelta(tmp_path):
+    ruta = copia_bicicletas(tmp_path)
+    libreta = lee_como_la_libreta(ruta)
+    primera = bicicletas.lee_bicicletas(ruta)
+    directorio = bicicletas.directorio_cache(ruta)
+    assert os.path.exists(os.path.join(directorio, 'metadatos.json'))
+    assert primera['Brébeuf (données non disponibles)'].isna().all()
+    pd.testing.assert_frame_equal(primera.copy(), libreta,
+                                  check_dtype=False)
+    segunda = bicicletas.lee_bicicletas(ruta)
+    pd.testing.assert_frame_equal(segunda.copy(), primera.copy())
+    assert isinstance(segunda['Berri 1'].values.base, np.memmap)
+    # Tocar el archivo sin cambiarlo no invalida el caché
+    os.utime(ruta, ns=(0, 0))
+    pd.testing.assert_frame_equal(bicicletas.lee_bicicletas(ruta).copy(),
+                                  primera.copy())
+    # Agregar un renglón sí
+    with open(ruta, 'a', encoding='utf8') as archivo:
+        archivo.write('06/11/2012;1;;2;3;4;5;6;7;\n')
+    tercera = bicicletas.lee_bicicletas(ruta)
+    assert len(tercera) == len(primera) + 1
+    assert tercera['Rachel1'].iloc[-1] == 7
+
+
+def test_agregados_incrementales_igual_que_groupby(tmp_path):
+    from agregados import AgregadorBicicletas
+    with open(os.path.join(AQUI, 'bikes.csv'), encoding='utf8') as archivo:
+        lineas = archivo.readlines()
+    ruta = str(tmp_path / 'bikes.csv')
+    with open(ruta, 'w', encoding='utf8') as archivo:
+        archivo.writelines(lineas[:150])
+    agregador = AgregadorBicicletas()
+    assert agregador.actualiza_archivo(ruta) == 149
+    agregador.guarda(str(tmp_path / 'estado.json'))
+    with open(ruta, 'a', encoding='utf8') as archivo:
+        archivo.writelines(lineas[150:])
+    agregador = AgregadorBicicletas.carga(str(tmp_path / 'estado.json'))
+    assert agregador.actualiza_archivo(ruta) == len(lineas) - 150
+    assert agregador.actualiza_archivo(ruta) == 0
+
+    datos = lee_como_la_libreta(os.path.join(AQUI, 'bikes.csv'))
+    for (agrupacion, grupos) in (('dia_semana', datos.index.weekday),
+                                 ('mes', datos.index.month)):
+        directo = datos.groupby(grupos)
+        for (estadistico, esperado) in (('suma', directo.sum()),
+                                        ('n', directo.count()),
+                                        ('media', directo.mean()),
+                                        ('varianza', directo.var())):
+            tabla = agregador.tabla(agrupacion, estadistico)
+            assert list(tabla.columns) == list(datos.columns)
+            np.testing.assert_allclose(tabla.to_numpy(dtype=float),
+                                       esperado.to_numpy(dtype=float),
+                                       rtol=1e-9)
+
+
+def test_por_bloques_igual_que_en_memoria(tmp_path):
+    with open(os.path.join(AQUI, 'bikes.csv'), encoding='utf8') as archivo:
+        encabezado, *lineas = archivo.readlines()
+    rutas = []
+    for (k, (inicio, fin)) in enumerate(((0, 100), (100, 200),
+                                         (200, len(lineas)))):
+        ruta = str(tmp_path / 'parte_{}.csv'.format(k))
+        with open(ruta, 'w', encoding='utf8') as archivo:
+            archivo.write(encabezado)
+            # Cada día dos veces: con bloques de 5 filas hay días partidos
+            for linea in lineas[inicio:fin]:
+                archivo.write(linea.rstrip('\n') + '\n')
+                archivo.write(linea.rstrip('\n') + '\n')
+        rutas.append(ruta)
+    agregador = por_bloques.procesa_archivos(rutas, filas=5,
+                                             n_trabajadores=2)
+
+    datos = 2 * lee_como_la_libreta(os.path.join(AQUI, 'bikes.csv'))
+    por_dia = datos.groupby(datos.index.weekday).sum()
+    por_mes = datos.groupby(datos.index.month).sum()
+    por_mes['Total'] = por_mes.sum(axis=1)
+    np.testing.assert_array_equal(agregador.por_dia_semana().to_numpy(),
+                                  por_dia.to_numpy())
+    np.testing.assert_array_equal(agregador.por_mes(total=True).to_numpy(),
+                                  por_mes.to_numpy())
+    assert agregador.tabla('contador', 'n').iloc[0, 0] == len(datos)
+
+
+def test_reduccion_y_cajas_para_graficas():
+    import graficas
+    from agregados import DIAS
+    generador = np.random.default_rng(0)
+    fechas = pd.date_range('2001-01-03', periods=5000, freq='D')
+    serie = pd.Series(generador.poisson(100, 5000).astype(float),
+                      index=fechas)
+    serie.iloc[1234], serie.iloc[4321] = 10 ** 4, -10 ** 4
+    serie.iloc[77] = np.nan
+    for metodo in graficas.METODOS:
+        reducida = graficas.reduce_serie(serie, 200, metodo)
+        assert len(reducida) <= 200 and reducida.index.is_monotonic_increasing
+        assert reducida.notna().all()
+        assert {fechas[1234], fechas[4321]} <= set(reducida.index)
+    reducida = graficas.reduce_serie(serie, 200, 'lttb')
+    assert len(reducida) == 200
+    assert reducida.index[0] == fechas[0] and reducida.index[-1] == fechas[-1]
+    pd.testing.assert_series_equal(graficas.reduce_serie(serie[:50], 200),
+                                   serie[:50].dropna())
+
+    datos = lee_como_la_libreta(os.path.join(AQUI, 'bikes.csv'))
+    cajas = graficas.cajas_por_dia(datos['Berri 1'])
+    assert list(cajas.columns) == DIAS
+    for (k, dia) in enumerate(DIAS):
+        directo = datos['Berri 1'][datos.index.weekday == k]
+        assert sorted(cajas[dia].dropna()) == sorted(directo)
+
+    preparador = graficas.PreparadorGraficas(datos, ancho=50, tamano_cache=2)
+    primera = preparador.serie('Berri 1', '2012-03', '2012-06')
+    assert preparador.serie('Berri 1', '2012-03', '2012-06') is primera
+    preparador.serie('du Parc')
+    preparador.serie('Rachel1')
+    preparador.serie('Berri 1', '2012-03', '2012-06')
+    assert (preparador.aciertos, preparador.fallos) == (1, 4)
+    assert len(preparador.cache) == 2